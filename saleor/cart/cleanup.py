@@ -0,0 +1,77 @@
+"""Deletion of carts that are past their expiration age."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from .models import Cart, CartLine, CartUserFieldEntry
+
+CLEANUP_CHUNK_SIZE = 1000
+# lines and userfield entries go in the same statement as their carts,
+# carts locked by running requests are left for the next run
+DELETE_EXPIRED_CARTS_SQL = """
+    WITH expired AS (
+        SELECT id FROM {cart_table}
+        WHERE status = %s AND last_activity < %s
+        ORDER BY last_activity
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED),
+    deleted_lines AS (
+        DELETE FROM {line_table} WHERE cart_id IN (SELECT id FROM expired)),
+    deleted_entries AS (
+        DELETE FROM {entry_table} WHERE cart_id IN (SELECT id FROM expired))
+    DELETE FROM {cart_table} WHERE id IN (SELECT id FROM expired)
+"""
+
+
+def get_expiration_dates(expiration_days=None):
+    """Return `[(status, date)]` of statuses whose carts expire, carts
+    last active before the date are expired.
+
+    Adding, changing or removing lines and changing the status count as
+    activity, so carts still being filled in are kept.
+    """
+    if expiration_days is None:
+        expiration_days = settings.CART_EXPIRATION_DAYS
+    current_time = now()
+    return [
+        (status, current_time - timedelta(days=days))
+        for status, days in sorted(expiration_days.items())]
+
+
+def count_expired_carts(status, before):
+    return Cart.objects.filter(
+        status=status, last_activity__lt=before).count()
+
+
+def delete_expired_chunk(status, before, chunk_size=CLEANUP_CHUNK_SIZE):
+    """Delete up to `chunk_size` expired carts of a status in a single
+    transaction and return how many were deleted."""
+    sql = DELETE_EXPIRED_CARTS_SQL.format(
+        cart_table=Cart._meta.db_table, line_table=CartLine._meta.db_table,
+        entry_table=CartUserFieldEntry._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [status, before, chunk_size])
+        return cursor.rowcount
+
+
+def delete_expired_carts(expiration_days=None, chunk_size=CLEANUP_CHUNK_SIZE,
+                         max_chunks=None):
+    """Delete expired carts chunk by chunk.
+
+    Yields `(status, deleted)` after every chunk. Every chunk is committed
+    on its own, so locks are held briefly and an interrupted run loses no
+    work. At most `max_chunks` chunks are deleted if given, the rest is
+    left for the next run.
+    """
+    chunks = 0
+    for status, before in get_expiration_dates(expiration_days):
+        deleted = chunk_size
+        while deleted == chunk_size:
+            if max_chunks is not None and chunks >= max_chunks:
+                return
+            deleted = delete_expired_chunk(status, before, chunk_size)
+            chunks += 1
+            if deleted:
+                yield status, deleted
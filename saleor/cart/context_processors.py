@@ -1,14 +1,12 @@
 """Cart-related context processors."""
-from .utils import get_or_create_user_cart
+from .utils import get_cart_state
 
 
 def cart_counter(request):
     """Expose the number of items in cart."""
+    state = get_cart_state(request.user, request)
 
-    # the first time this is called (upon login) it will create the session's cart
-    cart = get_or_create_user_cart(request.user, request)
-
-    if not cart:
+    if not state:
       return {'cart_counter': 0}
 
-    return {'cart_counter': cart.quantity}
+    return {'cart_counter': state['quantity']}
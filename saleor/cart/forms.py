@@ -7,6 +7,7 @@ from django.utils.translation import npgettext_lazy, pgettext_lazy
 from satchless.item import InsufficientStock
 
 from ..cart.models import CartUserFieldEntry
+from ..product.models import ProductVariant
 
 class QuantityField(forms.IntegerField):
     """A specialized integer field with initial quantity and min/max values."""
@@ -194,3 +195,55 @@ class ReplaceCartLineForm(AddToCartForm):
         product_variant = self.get_variant(self.cleaned_data)
         return self.cart.add(product_variant, self.cleaned_data['quantity'],
                              replace=True)
+
+
+class ReplaceCartLinesForm(forms.Form):
+    """Replace quantities of many cart lines at once.
+
+    Every submitted `quantity-<variant_id>` value becomes a quantity field,
+    zero removing the line. All variants are fetched with a single query.
+    """
+
+    prefix_name = 'quantity-'
+    error_messages = AddToCartForm.error_messages
+
+    def __init__(self, *args, **kwargs):
+        self.cart = kwargs.pop('cart')
+        super(ReplaceCartLinesForm, self).__init__(*args, **kwargs)
+        for name in self.data:
+            variant_id = name[len(self.prefix_name):]
+            if name.startswith(self.prefix_name) and variant_id.isdigit():
+                self.fields[name] = QuantityField()
+        self.variants = {}
+
+    def clean(self):
+        """Check that all variants exist and are in stock."""
+        cleaned_data = super(ReplaceCartLinesForm, self).clean()
+        if not self.fields:
+            raise forms.ValidationError(
+                self.error_messages['variant-does-not-exists'])
+        variant_ids = [
+            int(name[len(self.prefix_name):]) for name in self.fields]
+        self.variants = ProductVariant.objects.in_bulk(variant_ids)
+        for name, quantity in list(cleaned_data.items()):
+            variant = self.variants.get(int(name[len(self.prefix_name):]))
+            if variant is None:
+                self.add_error(
+                    name, self.error_messages['variant-does-not-exists'])
+                continue
+            try:
+                variant.check_quantity(quantity)
+            except InsufficientStock as e:
+                msg = self.error_messages['insufficient-stock']
+                self.add_error(name, msg % e.item.get_stock_quantity())
+        return cleaned_data
+
+    def get_quantities(self):
+        """Return the submitted quantities keyed by product variant."""
+        return {
+            self.variants[int(name[len(self.prefix_name):])]: quantity
+            for name, quantity in self.cleaned_data.items()}
+
+    def save(self):
+        """Replace the quantities in cart."""
+        return self.cart.update_lines(self.get_quantities())
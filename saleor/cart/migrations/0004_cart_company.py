@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_cart_status_last_change_idx'),
+        ('product', '0006_attributes_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='carts', to='product.Category', verbose_name='company'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['company', 'created'], name='cart_company_created_idx'),
+        ),
+    ]
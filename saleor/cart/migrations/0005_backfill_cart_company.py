@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+from saleor.core.backfill import execute_in_batches
+
+BATCH_SIZE = 5000
+
+UPDATE_COMPANIES_SQL = """
+    UPDATE {cart_table} AS cart SET company_id = usr.company_id
+    FROM {user_table} AS usr
+    WHERE cart.user_id = usr.id AND cart.company_id IS NULL
+        AND cart.id >= %s AND cart.id < %s
+"""
+
+
+def backfill_cart_company(apps, schema_editor):
+    """Link carts of signed in users to the users' companies.
+
+    Anonymous carts have no company. Carts of users who moved to another
+    company since follow the user, as their new carts would.
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    sql = UPDATE_COMPANIES_SQL.format(
+        cart_table=Cart._meta.db_table, user_table=User._meta.db_table)
+    execute_in_batches(schema_editor, Cart, [sql], BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cart', '0004_cart_company'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_cart_company, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_backfill_cart_company'),
+    ]
+
+    # added without a default first, so existing carts are left empty for
+    # the backfill instead of all becoming active now
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(null=True, verbose_name='last activity'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, null=True, verbose_name='last activity'),
+        ),
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_status_last_change_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['status', 'last_activity'], name='cart_status_last_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from saleor.core.backfill import execute_in_batches
+
+BATCH_SIZE = 5000
+
+UPDATE_ACTIVITY_SQL = """
+    UPDATE {cart_table} SET last_activity = last_status_change
+    WHERE last_activity IS NULL AND id >= %s AND id < %s
+"""
+
+
+def backfill_cart_last_activity(apps, schema_editor):
+    """Start the activity of existing carts at their last status change.
+
+    Until a cart is reached its activity stays empty, and the cleanup
+    leaves it alone rather than deleting a cart still in use.
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    sql = UPDATE_ACTIVITY_SQL.format(cart_table=Cart._meta.db_table)
+    execute_in_batches(schema_editor, Cart, [sql], BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('cart', '0006_cart_last_activity'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_cart_last_activity, migrations.RunPython.noop),
+    ]
@@ -1,21 +1,37 @@
 """Cart-related ORM models."""
+import json
 from collections import namedtuple
 from decimal import Decimal
 from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
 from django.utils.encoding import smart_str
 from django.utils.timezone import now
 from django.utils.translation import pgettext_lazy
 from jsonfield import JSONField
 from satchless.item import ItemLine, ItemList, partition
-from ..product.models import UserField
+from ..product.models import Category, UserField
 
 from . import CartStatus, logger
 
 CENTS = Decimal('0.01')
+CART_STATE_CACHE_KEY = 'cart:state:%s'
+UPSERT_LINE_SQL = """
+    INSERT INTO {line_table} (cart_id, variant_id, quantity, data)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (cart_id, variant_id, data) DO UPDATE
+    SET quantity = {line_table}.quantity + excluded.quantity
+    RETURNING id, quantity, (SELECT quantity FROM {cart_table} WHERE id = %s)
+"""
+REPLACE_LINES_SQL = """
+    INSERT INTO {line_table} (cart_id, variant_id, quantity, data)
+    VALUES {values}
+    ON CONFLICT (cart_id, variant_id, data) DO UPDATE
+    SET quantity = excluded.quantity
+"""
 SimpleCart = namedtuple('SimpleCart', ('quantity', 'total', 'token'))
 
 
@@ -55,8 +71,12 @@ class CartQueryset(models.QuerySet):
         return self.prefetch_related(
             'lines__variant__product__categories',
             'lines__variant__product__images',
-            'lines__variant__product__product_class__product_attributes__values',  # noqa
-            'lines__variant__product__product_class__variant_attributes__values',)  # noqa
+            'lines__variant__images')
+
+
+def get_line_key(variant_id, data):
+    """Return a key identifying a line by its variant and canonical data."""
+    return variant_id, json.dumps(data or {}, sort_keys=True)
 
 
 class Cart(models.Model):
@@ -69,6 +89,10 @@ class Cart(models.Model):
         pgettext_lazy('Cart field', 'created'), auto_now_add=True)
     last_status_change = models.DateTimeField(
         pgettext_lazy('Cart field', 'last status change'), auto_now_add=True)
+    # changed along with lines and status, carts expire after inactivity
+    last_activity = models.DateTimeField(
+        pgettext_lazy('Cart field', 'last activity'), default=now, null=True,
+        editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, blank=True, null=True, related_name='carts',
         verbose_name=pgettext_lazy('Cart field', 'user'),
@@ -81,14 +105,29 @@ class Cart(models.Model):
         editable=False,)
     quantity = models.PositiveIntegerField(
         pgettext_lazy('Cart field', 'quantity'), default=0)
+    company = models.ForeignKey(
+        Category, blank=True, null=True, related_name='carts',
+        verbose_name=pgettext_lazy('Cart field', 'company'),
+        on_delete=models.CASCADE)
 
     objects = CartQueryset.as_manager()
 
     class Meta:
         ordering = ('-last_status_change',)
+        indexes = [
+            models.Index(
+                fields=['user', 'token', 'status'],
+                name='cart_user_token_status_idx'),
+            models.Index(
+                fields=['status', 'last_activity'],
+                name='cart_status_last_activity_idx'),
+            models.Index(
+                fields=['company', 'created'],
+                name='cart_company_created_idx')]
 
     def __init__(self, *args, **kwargs):
         super(Cart, self).__init__(*args, **kwargs)
+        self._line_index = None
 
     def update_quantity(self):
         """Recalculate cart quantity based on lines."""
@@ -96,7 +135,28 @@ class Cart(models.Model):
         if not total_lines:
             total_lines = 0
         self.quantity = total_lines
-        self.save(update_fields=['quantity'])
+        self.last_activity = now()
+        self.save(update_fields=['quantity', 'last_activity'])
+        self.store_state()
+
+    def store_state(self):
+        """Remember the cart's id and quantity for the session it belongs to.
+
+        This lets pages display the cart counter without touching the
+        database.
+        """
+        if not settings.CART_STATE_CACHED:
+            return
+        cache.set(
+            CART_STATE_CACHE_KEY % (self.token,),
+            {'cart_id': self.pk, 'quantity': self.quantity},
+            settings.CART_STATE_TIMEOUT)
+
+    def forget_state(self):
+        """Drop the remembered state of the session this cart belongs to."""
+        if not settings.CART_STATE_CACHED:
+            return
+        cache.delete(CART_STATE_CACHE_KEY % (self.token,))
 
     def change_status(self, status):
         """Change cart status."""
@@ -105,8 +165,10 @@ class Cart(models.Model):
             raise ValueError('Not expected status')
         if status != self.status:
             self.status = status
-            self.last_status_change = now()
+            self.last_status_change = self.last_activity = now()
             self.save()
+            if status != CartStatus.OPEN:
+                self.forget_state()
 
     def __repr__(self):
         return 'Cart(quantity=%s)' % (self.quantity,)
@@ -119,8 +181,27 @@ class Cart(models.Model):
         lines = self.lines.all()
         return lines.aggregate(total_quantity=models.Sum('quantity'))
 
+    def get_total_price(self):
+        """Return the total price of all lines."""
+        total = self.lines.aggregate(total=models.Sum(
+            models.F('variant__product__price') * models.F('quantity'),
+            output_field=models.DecimalField(
+                max_digits=12, decimal_places=2)))['total']
+        return total or Decimal(0)
+
+    def get_line_totals(self, variant_ids):
+        """Return `{variant_id: price}` of the lines of given variants that
+        have no customization data, the ones `update_lines` changes."""
+        lines = self.lines.filter(
+            variant_id__in=variant_ids, data={}).values_list(
+                'variant_id', 'quantity', 'variant__product__price')
+        return {
+            variant_id: price * quantity
+            for variant_id, quantity, price in lines}
+
     def clear(self):
         """Remove the cart."""
+        self.forget_state()
         self.delete()
 
     def create_line(self, variant, quantity, data):
@@ -129,18 +210,28 @@ class Cart(models.Model):
         The `data` parameter may be used to differentiate between items with
         different customization options.
         """
-        return self.lines.create(
+        line = self.lines.create(
             variant=variant, quantity=quantity, data=data or {})
+        self._index_line(line)
+        return line
 
     def get_line(self, variant, data=None):
         """Return a line matching the given variant and data if any."""
-        all_lines = self.lines.all()
-        if data is None:
-            data = {}
-        line = [line for line in all_lines
-                if line.variant_id == variant.id and line.data == data]
-        if line:
-            return line[0]
+        if self._line_index is None:
+            self._line_index = {
+                get_line_key(line.variant_id, line.data): line
+                for line in self.lines.all()}
+        return self._line_index.get(get_line_key(variant.pk, data))
+
+    def _index_line(self, line):
+        """Keep an already built line index in sync with a saved line."""
+        if self._line_index is None:
+            return
+        key = get_line_key(line.variant_id, line.data)
+        if line.quantity:
+            self._line_index[key] = line
+        else:
+            self._line_index.pop(key, None)
 
     def add(self, variant, quantity=1, data=None, replace=False,
             check_quantity=True):
@@ -151,28 +242,156 @@ class Cart(models.Model):
 
         If `replace` is truthy then any previous quantity is discarded instead
         of added to.
+
+        Lines and `quantity` are changed with atomic updates so concurrent
+        adds to the same cart never lose each other's changes.
         """
-        cart_line, dummy_created = self.lines.get_or_create(
-            variant=variant, defaults={'quantity': 0, 'data': data or {}})
-        if replace:
-            new_quantity = quantity
+        data = data or {}
+        if connection.vendor == 'postgresql' and not replace and quantity > 0:
+            self._upsert_line(variant, quantity, data, check_quantity)
         else:
-            new_quantity = cart_line.quantity + quantity
+            self._update_line(variant, quantity, data, replace, check_quantity)
+        self.store_state()
 
-        if new_quantity < 0:
-            raise ValueError('%r is not a valid quantity (results in %r)' % (
-                quantity, new_quantity))
+    def _upsert_line(self, variant, quantity, data, check_quantity):
+        """Increment a line with a single `INSERT ... ON CONFLICT` statement.
 
-        if check_quantity:
-            variant.check_quantity(new_quantity)
-
-        cart_line.quantity = new_quantity
+        The cart row is updated first so concurrent adds to the same cart
+        always take their locks in the same order.
+        """
+        line_table = CartLine._meta.db_table
+        prepared_data = CartLine._meta.get_field('data').get_prep_value(data)
+        with transaction.atomic():
+            last_activity = now()
+            Cart.objects.filter(pk=self.pk).update(
+                quantity=models.F('quantity') + quantity,
+                last_activity=last_activity)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    UPSERT_LINE_SQL.format(
+                        line_table=line_table,
+                        cart_table=Cart._meta.db_table),
+                    [self.pk, variant.pk, quantity, prepared_data, self.pk])
+                line_id, new_quantity, cart_quantity = cursor.fetchone()
+            if check_quantity:
+                variant.check_quantity(new_quantity)
+        self.quantity = cart_quantity
+        self.last_activity = last_activity
+        self._index_line(CartLine(
+            pk=line_id, cart=self, variant=variant, quantity=new_quantity,
+            data=data))
+
+    def _update_line(self, variant, quantity, data, replace, check_quantity):
+        """Change a line while holding a lock on the cart row."""
+        with transaction.atomic():
+            cart_quantity = Cart.objects.select_for_update().values_list(
+                'quantity', flat=True).get(pk=self.pk)
+            cart_line = self.lines.filter(variant=variant, data=data).first()
+            old_quantity = cart_line.quantity if cart_line else 0
+            if replace:
+                new_quantity = quantity
+            else:
+                new_quantity = old_quantity + quantity
+
+            if new_quantity < 0:
+                raise ValueError(
+                    '%r is not a valid quantity (results in %r)' % (
+                        quantity, new_quantity))
+
+            if check_quantity:
+                variant.check_quantity(new_quantity)
+
+            if not new_quantity:
+                if cart_line:
+                    cart_line.delete()
+                    cart_line.quantity = 0
+                    self._index_line(cart_line)
+            elif cart_line:
+                cart_line.quantity = new_quantity
+                cart_line.save(update_fields=['quantity'])
+                self._index_line(cart_line)
+            else:
+                self.create_line(variant, new_quantity, data)
+
+            delta = new_quantity - old_quantity
+            self.last_activity = now()
+            Cart.objects.filter(pk=self.pk).update(
+                quantity=models.F('quantity') + delta,
+                last_activity=self.last_activity)
+            self.quantity = cart_quantity + delta
+
+    def update_lines(self, quantities):
+        """Replace the quantities of many lines in one transaction.
+
+        `quantities` maps product variants to their new quantities, zero
+        removing the line. Lines without customization data are affected,
+        the same ones `add` replaces. Returns the new cart quantity.
+        """
+        if not quantities:
+            return self.quantity
+        variant_ids = {variant.pk: quantity
+                       for variant, quantity in quantities.items()}
+        with transaction.atomic():
+            cart_quantity = Cart.objects.select_for_update().values_list(
+                'quantity', flat=True).get(pk=self.pk)
+            lines = {
+                line.variant_id: line for line in self.lines.filter(
+                    variant_id__in=variant_ids, data={})}
+            removed = [
+                variant_id for variant_id, quantity in variant_ids.items()
+                if not quantity and variant_id in lines]
+            changed = {
+                variant_id: quantity
+                for variant_id, quantity in variant_ids.items()
+                if quantity and (
+                    variant_id not in lines or
+                    lines[variant_id].quantity != quantity)}
+            if removed:
+                self.lines.filter(
+                    pk__in=[lines[variant_id].pk for variant_id in removed]
+                ).delete()
+            if changed:
+                self._replace_lines(changed, lines)
+            # lines created by the bulk upsert are not known here
+            self._line_index = None
+            delta = sum(
+                quantity - (lines[variant_id].quantity
+                            if variant_id in lines else 0)
+                for variant_id, quantity in variant_ids.items()
+                if variant_id in changed or variant_id in removed)
+            self.last_activity = now()
+            Cart.objects.filter(pk=self.pk).update(
+                quantity=models.F('quantity') + delta,
+                last_activity=self.last_activity)
+            self.quantity = cart_quantity + delta
+        self.store_state()
+        return self.quantity
 
-        if not cart_line.quantity:
-            cart_line.delete()
-        else:
-            cart_line.save(update_fields=['quantity'])
-        self.update_quantity()
+    def _replace_lines(self, quantities, lines):
+        """Write new quantities of the lines keyed by variant id."""
+        if connection.vendor == 'postgresql':
+            prepared_data = CartLine._meta.get_field('data').get_prep_value(
+                {})
+            values = []
+            for variant_id, quantity in quantities.items():
+                values.extend([self.pk, variant_id, quantity, prepared_data])
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    REPLACE_LINES_SQL.format(
+                        line_table=CartLine._meta.db_table,
+                        values=', '.join(
+                            ['(%s, %s, %s, %s)'] * len(quantities))),
+                    values)
+            return
+        for variant_id, quantity in quantities.items():
+            if variant_id in lines:
+                lines[variant_id].quantity = quantity
+                lines[variant_id].save(update_fields=['quantity'])
+        CartLine.objects.bulk_create([
+            CartLine(cart=self, variant_id=variant_id, quantity=quantity,
+                     data={})
+            for variant_id, quantity in quantities.items()
+            if variant_id not in lines])
 
 
 class CartLine(models.Model, ItemLine):
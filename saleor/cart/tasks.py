@@ -0,0 +1,17 @@
+from collections import Counter
+
+from celery import shared_task
+from django.conf import settings
+
+from .cleanup import delete_expired_carts
+
+
+@shared_task
+def cleanup_carts(max_chunks=None):
+    """Delete expired carts, at most `max_chunks` chunks of them."""
+    if max_chunks is None:
+        max_chunks = settings.CART_CLEANUP_MAX_CHUNKS
+    deleted = Counter()
+    for status, count in delete_expired_carts(max_chunks=max_chunks):
+        deleted[status] += count
+    return dict(deleted)
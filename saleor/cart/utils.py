@@ -1,9 +1,11 @@
 """Cart-related utility functions."""
 from functools import wraps
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import pgettext_lazy
 
-from .models import Cart
+from .models import CART_STATE_CACHE_KEY, Cart
 
 
 def get_or_create_user_cart(user, request, cart_queryset=Cart.objects.all()):
@@ -11,7 +13,13 @@ def get_or_create_user_cart(user, request, cart_queryset=Cart.objects.all()):
     if not user.is_authenticated():
       return None
 
-    return cart_queryset.open().get_or_create(user=user, token=request.session.session_key)[0]
+    if request.session.session_key is None:
+        # carts are bound to the session key, which messages kept in cookies
+        # no longer create as a side effect
+        request.session.save()
+    return cart_queryset.open().get_or_create(
+        user=user, token=request.session.session_key,
+        defaults={'company_id': user.company_id})[0]
 
 
 def get_user_cart(user, request, cart_queryset=Cart.objects.all()):
@@ -22,6 +30,34 @@ def get_user_cart(user, request, cart_queryset=Cart.objects.all()):
     return cart_queryset.open().filter(user=user, token=request.session.session_key).first()
 
 
+def get_cart_state(user, request):
+    """Return the remembered `cart_id` and `quantity` of the session's cart.
+
+    The state is kept in the cache and refreshed by the cart whenever its
+    quantity changes, so it normally costs no database queries. Without a
+    shared cache (`CART_STATE_CACHED`) it is read from the database every
+    time. Carts are never created here.
+    """
+    if not user.is_authenticated():
+        return None
+
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+
+    key = CART_STATE_CACHE_KEY % (session_key,)
+    state = cache.get(key) if settings.CART_STATE_CACHED else None
+    if state is None:
+        cart = get_user_cart(user, request)
+        if cart is None:
+            state = {'cart_id': None, 'quantity': 0}
+        else:
+            state = {'cart_id': cart.pk, 'quantity': cart.quantity}
+        if settings.CART_STATE_CACHED:
+            cache.set(key, state, settings.CART_STATE_TIMEOUT)
+    return state
+
+
 def get_or_create_db_cart(cart_queryset=Cart.objects.all()):
     """Decorate view to always receive a saved cart instance.
 
@@ -55,6 +91,8 @@ def get_or_empty_db_cart(cart_queryset=Cart.objects.all()):
         @wraps(view)
         def func(request, *args, **kwargs):
             cart = get_user_cart(request.user, request, cart_queryset)
+            if cart is None:
+                cart = Cart()
             return view(request, cart, *args, **kwargs)
         return func
     return get_cart
@@ -1,5 +1,6 @@
 """Cart-related views."""
 from django.conf import settings
+from django.db import IntegrityError
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.response import TemplateResponse
@@ -7,11 +8,12 @@ from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import auth, messages
 
-from .forms import ReplaceCartLineForm, UpdateUserFields
-from ..order.models import Order, OrderStatus, OrderLine, OrderUserFieldEntry
+from .forms import ReplaceCartLineForm, ReplaceCartLinesForm, UpdateUserFields
+from ..order.models import Order
+from ..order.utils import create_order_from_cart
 from ..product.models import ProductVariant, UserField, Category
 from .models import Cart, CartUserFieldEntry
-from .utils import get_or_empty_db_cart
+from .utils import get_or_create_db_cart, get_or_empty_db_cart
 
 
 @login_required
@@ -25,7 +27,7 @@ def index(request, cart):
 
     # refresh required to get updated cart lines and it's quantity
     try:
-        cart = Cart.objects.get(pk=cart.pk)
+        cart = Cart.objects.for_display().get(pk=cart.pk)
     except Cart.DoesNotExist:
         pass
 
@@ -35,11 +37,13 @@ def index(request, cart):
         initial = {'quantity': line.get_quantity()}
         form = ReplaceCartLineForm(None, cart=cart, variant=line.variant,
                                    initial=initial)
+        line_total = line.variant.product.price * line.quantity
         cart_lines.append({
             'variant': line.variant,
-            'form': form})
+            'form': form,
+            'total': line_total})
 
-        total_price += line.variant.product.price * line.quantity
+        total_price += line_total
 
     userfields = UserField.objects.filter(company_id=request.user.company_id)
     uf_entries = CartUserFieldEntry.objects.filter(cart=cart)
@@ -59,7 +63,7 @@ def index(request, cart):
 
 
 @login_required
-@get_or_empty_db_cart()
+@get_or_create_db_cart()
 def update(request, cart, variant_id):
     """Update the line quantities."""
     if not request.is_ajax():
@@ -75,7 +79,6 @@ def update(request, cart, variant_id):
             'cart': {
                 'numItems': cart.quantity,
                 'numLines': len(cart)}}
-        updated_line = cart.get_line(form.cart_line.variant)
         status = 200
     elif request.POST is not None:
         response = {'error': form.errors}
@@ -83,19 +86,44 @@ def update(request, cart, variant_id):
     return JsonResponse(response, status=status)
 
 
+@login_required
+@get_or_create_db_cart()
+def update_lines(request, cart):
+    """Replace quantities of many lines with a single request."""
+    if not request.is_ajax():
+        return redirect('cart:index')
+    form = ReplaceCartLinesForm(request.POST, cart=cart)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+    form.save()
+    quantities = form.get_quantities()
+    line_totals = cart.get_line_totals(
+        [variant.pk for variant in quantities])
+    response = {
+        'lines': {
+            variant.pk: quantity
+            for variant, quantity in quantities.items()},
+        'lineTotals': {
+            variant_id: '%.2f' % (total,)
+            for variant_id, total in line_totals.items()},
+        'total': '%.2f' % (cart.get_total_price(),),
+        'cart': {
+            'numItems': cart.quantity,
+            'numLines': len(cart)}}
+    return JsonResponse(response)
+
+
 @login_required
 @get_or_empty_db_cart(cart_queryset=Cart.objects.for_display())
 def summary(request, cart):
     """Display a cart summary suitable for displaying on all pages."""
     def prepare_line_data(line):
-        product_class = line.variant.product.product_class
-        attributes = product_class.variant_attributes.all()
         first_image = line.variant.get_first_image()
         return {
             'product': line.variant.product,
             'variant': line.variant,
             'quantity': line.quantity,
-            'attributes': line.variant.display_variant(attributes),
+            'attributes': line.variant.display_variant(),
             'image': first_image,
             'update_url': reverse(
                 'cart:update-line', kwargs={'variant_id': line.variant_id}),}
@@ -109,51 +137,35 @@ def summary(request, cart):
     return render(request, 'cart-dropdown.html', data)
 
 @login_required
-@get_or_empty_db_cart(cart_queryset=Cart.objects.for_display())
+@get_or_empty_db_cart()
 def checkout(request, cart):
-    # make sure this cart hasn't already been submit
-    prev_order = Order.objects.filter(token=cart.token)
-
-    if prev_order:
-        auth.logout(request)
-        messages.success(request, ('This session has already checked out.\n\nOrder number was: %s.' % prev_order[0].id))
-        return redirect(settings.LOGIN_REDIRECT_URL)
+    # nothing was ever added to the cart
+    if not cart.pk:
+        messages.error(request, ('Your cart is empty.'))
+        return redirect('cart:index')
 
     # make sure all company-specific fields have been filled out
-    ufs = UserField.objects.filter(company_id=request.user.company_id)
-    cart_ufes = CartUserFieldEntry.objects.filter(cart=cart)
-    cart_ufe_uf_ids = [c_ufe.userfield.id for c_ufe in cart_ufes]
+    cart_ufes = list(cart.userfields.all())
+    missing_ufs = UserField.objects.filter(
+        company_id=request.user.company_id).exclude(
+            id__in=[c_ufe.userfield_id for c_ufe in cart_ufes])
 
-    for uf in ufs:
-        if uf.id not in cart_ufe_uf_ids:
-            messages.error(request, ('Please fill in all the required fields in the blue box above your cart.'))
-            return redirect('cart:index')
-
-    order_data = {'user': request.user,
-                  'token': cart.token}
-
-    order = Order.objects.create(**order_data)
-
-    order.create_history_entry(
-        status=OrderStatus.NEW, user=request.user, comment="Order was placed")
-
-    # iterate through all the items in the cart and create order lines
-    for l in cart.lines.all():
-        ol_data = {'product_name': l.variant.product.name,
-                   'product_sku': l.variant.sku,
-                   'quantity': l.quantity,
-                   'product_id': l.variant.product.id,
-                   'order_id': order.id}
-
-        ol = OrderLine.objects.create(**ol_data)
-
-    # iterate through all cart userfields and create order userfields
-    for c_ufe in cart_ufes:
-        o_ufe_data = {'order': order,
-                      'userfield': c_ufe.userfield,
-                      'data': c_ufe.data}
+    if missing_ufs.exists():
+        messages.error(request, ('Please fill in all the required fields in the blue box above your cart.'))
+        return redirect('cart:index')
 
-        o_ufe = OrderUserFieldEntry.objects.create(**o_ufe_data)
+    # the order shares the unique cart token, so a cart that has already
+    # been submitted cannot be placed again
+    try:
+        order = create_order_from_cart(cart, request.user, cart_ufes)
+    except IntegrityError:
+        prev_order = Order.objects.filter(token=cart.token).first()
+        if prev_order is None:
+            # not the token conflict of a cart placed twice
+            raise
+        auth.logout(request)
+        messages.success(request, ('This session has already checked out.\n\nOrder number was: %s.' % prev_order.id))
+        return redirect(settings.LOGIN_REDIRECT_URL)
 
     # log the user out and display a confirmation page
     auth.logout(request)
@@ -161,7 +173,7 @@ def checkout(request, cart):
     return redirect(settings.LOGIN_REDIRECT_URL)
 
 @login_required
-@get_or_empty_db_cart(cart_queryset=Cart.objects.for_display())
+@get_or_create_db_cart()
 def userfield_update(request, cart):
     if not request.is_ajax():
         return redirect('home', permanent=True)
@@ -10,7 +10,8 @@ def check_session_caching(app_configs, **kwargs):  # pragma: no cover
     errors = []
     cached_engines = {
         'django.contrib.sessions.backends.cache',
-        'django.contrib.sessions.backends.cached_db'}
+        'django.contrib.sessions.backends.cached_db',
+        'saleor.core.sessions'}
     if ('locmem' in settings.CACHES['default']['BACKEND'] and
             settings.SESSION_ENGINE in cached_engines):
         errors.append(
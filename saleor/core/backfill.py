@@ -0,0 +1,22 @@
+"""Batched data backfills run by migrations."""
+from django.db import transaction
+
+
+def execute_in_batches(schema_editor, model, statements, batch_size):
+    """Run SQL statements over consecutive ranges of `model` ids.
+
+    Every statement takes the first and the past-the-end id of a range as
+    its two parameters. Each range is committed on its own, so rows stay
+    locked briefly and an interrupted migration keeps the ranges already
+    done. Migrations calling it must not be atomic.
+    """
+    connection = schema_editor.connection
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last is None:
+        return
+    for start in range(0, last + 1, batch_size):
+        params = [start, start + batch_size]
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql, params)
@@ -0,0 +1,237 @@
+"""Accounting of SQL queries, cache lookups and latency of requests."""
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import connection
+
+logger = logging.getLogger('saleor.requests')
+
+# upper bounds of latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+NUMBER_RE = re.compile(r'\b\d+(\.\d+)?\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+PARAMETERS_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+
+
+def get_fingerprint(sql):
+    """Return SQL with literals and parameter lists collapsed, so that
+    queries differing only in values share a fingerprint."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return PARAMETERS_RE.sub('(...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.fingerprints = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_query(self, sql, duration):
+        self.sql_count += 1
+        self.sql_time += duration
+        self.fingerprints[get_fingerprint(sql)] += 1
+
+    def get_duplicates(self, min_count=2):
+        """Return `[(fingerprint, count)]` of queries repeated in a request,
+        most frequent first."""
+        return [
+            (fingerprint, count)
+            for fingerprint, count in self.fingerprints.most_common()
+            if count >= min_count]
+
+
+class QueryRecorder:
+    """Execution wrapper passing every query to `RequestMetrics`."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.record_query(sql, time.perf_counter() - start)
+
+
+@contextmanager
+def record_queries(metrics):
+    """Record queries of the default database run within the block."""
+    if hasattr(connection, 'execute_wrapper'):
+        with connection.execute_wrapper(QueryRecorder(metrics)):
+            yield
+        return
+    # Django < 2.0 has no execution wrappers, read the query log instead
+    force_debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    start = len(connection.queries_log)
+    try:
+        yield
+    finally:
+        connection.force_debug_cursor = force_debug_cursor
+        for query in list(connection.queries_log)[start:]:
+            metrics.record_query(query['sql'], float(query['time']))
+
+
+_missing = object()
+
+
+@contextmanager
+def record_cache_lookups(metrics, alias='default'):
+    """Count hits and misses of cache lookups made within the block."""
+    # cache backends are per thread, so patching the instance is safe
+    backend = caches[alias]
+    get, get_many = backend.get, backend.get_many
+
+    def counting_get(key, default=None, version=None):
+        value = get(key, _missing, version=version)
+        if value is _missing:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def counting_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        metrics.cache_hits += len(values)
+        metrics.cache_misses += len(keys) - len(values)
+        return values
+
+    backend.get = counting_get
+    backend.get_many = counting_get_many
+    try:
+        yield
+    finally:
+        del backend.get
+        del backend.get_many
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.duplicated = 0
+
+    def add(self, wall_time, metrics, has_duplicates):
+        milliseconds = wall_time * 1000
+        self.requests += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, milliseconds)] += 1
+        self.total_time += milliseconds
+        self.max_time = max(self.max_time, milliseconds)
+        self.sql_count += metrics.sql_count
+        self.sql_time += metrics.sql_time * 1000
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        self.duplicated += has_duplicates
+
+    def get_percentile(self, percentile):
+        """Return the upper bound of the bucket holding a percentile, in
+        milliseconds, or None if it falls into the open-ended bucket."""
+        rank = self.requests * percentile / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        requests = self.requests or 1
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'requests': self.requests,
+            'buckets': list(zip(LATENCY_BUCKETS + [None], self.buckets)),
+            'avg_time': self.total_time / requests,
+            'max_time': self.max_time,
+            'p50': self.get_percentile(50),
+            'p95': self.get_percentile(95),
+            'avg_sql_count': self.sql_count / requests,
+            'avg_sql_time': self.sql_time / requests,
+            'cache_hit_ratio': self.cache_hits / lookups if lookups else None,
+            'duplicated': self.duplicated}
+
+
+class LatencyHistogram:
+    """Aggregated statistics of sampled requests of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view_name, wall_time, metrics, has_duplicates):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats()
+            stats.add(wall_time, metrics, has_duplicates)
+
+    def snapshot(self):
+        """Return statistics of every view, slowest on average first."""
+        with self.lock:
+            views = [
+                (view_name, stats.as_dict())
+                for view_name, stats in self.views.items()]
+        views.sort(key=lambda item: item[1]['avg_time'], reverse=True)
+        return OrderedDict(views)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+histogram = LatencyHistogram()
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+def get_server_timing(wall_time, metrics):
+    return ', '.join([
+        'app;dur=%.1f' % (wall_time * 1000,),
+        'sql;desc="%d queries";dur=%.1f' % (
+            metrics.sql_count, metrics.sql_time * 1000),
+        'cache;desc="%d hits, %d misses"' % (
+            metrics.cache_hits, metrics.cache_misses)])
+
+
+def report_request(request, response, wall_time, metrics, min_duplicates):
+    """Add `Server-Timing` to the response, log the request and add it to
+    the histogram."""
+    view_name = get_view_name(request)
+    duplicates = metrics.get_duplicates(min_duplicates)
+    response['Server-Timing'] = get_server_timing(wall_time, metrics)
+    histogram.add(view_name, wall_time, metrics, bool(duplicates))
+    logger.info(json.dumps({
+        'view': view_name,
+        'method': request.method,
+        'status': response.status_code,
+        'time': round(wall_time * 1000, 1),
+        'sql_count': metrics.sql_count,
+        'sql_time': round(metrics.sql_time * 1000, 1),
+        'duplicates': [
+            {'sql': fingerprint, 'count': count}
+            for fingerprint, count in duplicates],
+        'cache_hits': metrics.cache_hits,
+        'cache_misses': metrics.cache_misses}))
@@ -0,0 +1,138 @@
+import math
+import random
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.text import slugify
+
+from ....product.models import Category, ProductVariant, UserField
+from ....userprofile.models import User
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of sorted values, or None if
+    there are none."""
+    if not values:
+        return None
+    rank = max(int(math.ceil(percent / 100 * len(values))), 1)
+    return values[rank - 1]
+
+
+def consume(response):
+    if response.streaming:
+        for dummy in response.streaming_content:
+            pass
+    return response
+
+
+class Scenario:
+    """Replays one kind of request and records its latency and queries."""
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = []
+        self.queries = []
+
+    def measure(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = consume(request())
+            self.timings.append((time.perf_counter() - start) * 1000)
+        self.queries.append(len(queries))
+        if response.status_code >= 400:
+            raise CommandError('%s returned %d' % (
+                self.name, response.status_code))
+        return response
+
+    def format(self):
+        timings = sorted(self.timings)
+        if not timings:
+            return '%-14s no requests' % (self.name,)
+        return (
+            '%-14s %6d requests %10.2f ms p50 %10.2f ms p95 '
+            '%8.1f queries' % (
+                self.name, len(timings), percentile(timings, 50),
+                percentile(timings, 95),
+                sum(self.queries) / len(self.queries)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay category page, cart update, checkout and export requests '
+        'through the test client and report their latency and query counts')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Number of requests of every kind')
+        parser.add_argument(
+            '--company', type=int, help='ID of the benchmarked company')
+
+    def get_company(self, company_id):
+        companies = Category.objects.annotate(
+            user_count=Count('user', distinct=True),
+            product_count=Count('products', distinct=True)).filter(
+                user_count__gt=0, product_count__gt=0)
+        if company_id:
+            companies = companies.filter(pk=company_id)
+        company = companies.order_by('-product_count').first()
+        if company is None:
+            raise CommandError(
+                'No company with users and products, run populatedb first.')
+        return company
+
+    def handle(self, *args, **options):
+        company = self.get_company(options['company'])
+        # every request is rolled back, so the data can be replayed again
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            with transaction.atomic():
+                scenarios = self.replay(company, options['requests'])
+                transaction.set_rollback(True)
+        self.stdout.write('Company %s (%d products)' % (
+            company, company.product_count))
+        for scenario in scenarios:
+            self.stdout.write(scenario.format())
+
+    def replay(self, company, how_many):
+        user = User.objects.filter(company=company).first()
+        staff = User.objects.create_user(
+            'benchmark-%s' % (uuid4().hex,), is_staff=True)
+        variant_ids = list(ProductVariant.objects.filter(
+            product__categories=company).values_list('pk', flat=True))
+        userfields = {
+            slugify(userfield.name).replace('-', '_'): 'benchmark'
+            for userfield in UserField.objects.filter(company=company)}
+        client, staff_client = Client(), Client()
+        client.force_login(user)
+        staff_client.force_login(staff)
+
+        category = Scenario('category page')
+        cart_update = Scenario('cart update')
+        checkout = Scenario('checkout')
+        export = Scenario('export')
+        for dummy in range(how_many):
+            category.measure(lambda: client.get(reverse('product:category')))
+            quantities = {
+                'quantity-%d' % (variant_id,): random.randint(1, 5)
+                for variant_id in random.sample(
+                    variant_ids, min(3, len(variant_ids)))}
+            cart_update.measure(lambda: client.post(
+                reverse('cart:update-lines'), quantities, **AJAX))
+            if userfields:
+                client.post(
+                    reverse('cart:userfield-update'), userfields, **AJAX)
+            checkout.measure(
+                lambda: client.post(reverse('cart:cart-checkout')))
+            # checking out logs the user out
+            client.force_login(user)
+            export.measure(lambda: staff_client.get(reverse(
+                'dashboard:order-export', kwargs={'company_id': company.pk})))
+        return [category, cart_update, checkout, export]
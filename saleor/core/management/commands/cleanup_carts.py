@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from ....cart.cleanup import (
+    CLEANUP_CHUNK_SIZE, count_expired_carts, delete_expired_carts,
+    get_expiration_dates)
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete carts inactive for longer than CART_EXPIRATION_DAYS of '
+        'their status in small chunks, the command can be interrupted and '
+        'run again')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CLEANUP_CHUNK_SIZE,
+            dest='chunk_size', help='Number of carts deleted at once')
+        parser.add_argument(
+            '--max-chunks', type=int, default=None, dest='max_chunks',
+            help='Stop after deleting this many chunks')
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Only count the expired carts')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for status, before in get_expiration_dates():
+                self.stdout.write('%s: %d carts inactive since %s' % (
+                    status, count_expired_carts(status, before),
+                    before.isoformat()))
+            return
+        totals = {}
+        for status, deleted in delete_expired_carts(
+                chunk_size=options['chunk_size'],
+                max_chunks=options['max_chunks']):
+            totals[status] = totals.get(status, 0) + deleted
+            self.stdout.write('%s: deleted %d carts' % (
+                status, totals[status]))
+        self.stdout.write('Deleted %d carts' % (sum(totals.values()),))
@@ -0,0 +1,191 @@
+import json
+import random
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.encoding import smart_text
+
+from ....cart import CartStatus
+from ....cart.models import Cart, CartLine
+from ....order import OrderStatus
+from ....order.export import get_company_orders
+from ....order.models import Order
+from ....product.facets import filter_products_by_attributes
+from ....product.models import (
+    AttributeChoiceValue, Category, Product, ProductAttribute, ProductClass,
+    ProductVariant, UserField)
+from ....userprofile.models import User
+
+ANALYZED_MODELS = [
+    Category, UserField, Product, Product.categories.through, ProductVariant,
+    User, Cart, CartLine, Order]
+
+
+def create_dataset(size):
+    """Bulk create `size` products, variants, carts and orders."""
+    companies = [
+        Category.objects.create(
+            name='Explain company %d' % (index,),
+            slug='explain-company-%d' % (index,))
+        for index in range(10)]
+    UserField.objects.bulk_create([
+        UserField(name='Field %d' % (index,), company=company)
+        for company in companies for index in range(3)])
+    attribute = ProductAttribute.objects.create(
+        slug='explain-size', name='Size')
+    values = [
+        AttributeChoiceValue.objects.create(
+            attribute=attribute, name=name, slug=name)
+        for name in ['xs', 's', 'm', 'l', 'xl']]
+    product_class = ProductClass.objects.create(name='Explain class')
+    product_class.variant_attributes.add(attribute)
+
+    products = Product.objects.bulk_create([
+        Product(
+            name='Product %d' % (index,), price=10,
+            product_class=product_class, is_published=index % 10 != 0,
+            attributes={
+                smart_text(attribute.pk): smart_text(
+                    random.choice(values).pk)})
+        for index in range(size)])
+    Product.categories.through.objects.bulk_create([
+        Product.categories.through(
+            product_id=product.pk, category_id=random.choice(companies).pk)
+        for product in products])
+    variants = ProductVariant.objects.bulk_create([
+        ProductVariant(
+            product=product, sku=uuid4().hex[:32],
+            attributes={
+                smart_text(attribute.pk): smart_text(
+                    random.choice(values).pk)})
+        for product in products])
+
+    users = User.objects.bulk_create([
+        User(username=uuid4().hex, company=random.choice(companies))
+        for dummy in range(max(size // 10, 1))])
+    carts = Cart.objects.bulk_create([
+        Cart(
+            user=user, company_id=user.company_id, token=uuid4().hex,
+            status=random.choice(CartStatus.CHOICES)[0])
+        for user in (random.choice(users) for dummy in range(size))])
+    CartLine.objects.bulk_create([
+        CartLine(cart=cart, variant=random.choice(variants), quantity=1)
+        for cart in carts])
+    Order.objects.bulk_create([
+        Order(
+            user=user, company_id=user.company_id, token=str(uuid4()),
+            status=random.choice(OrderStatus.CHOICES)[0])
+        for user in (random.choice(users) for dummy in range(size))])
+
+    with connection.cursor() as cursor:
+        for model in ANALYZED_MODELS:
+            cursor.execute(
+                'ANALYZE %s' % (connection.ops.quote_name(
+                    model._meta.db_table),))
+
+
+def get_queries():
+    """Return `(name, queryset)` of the hot lookups of the shop."""
+    cart = Cart.objects.filter(user__isnull=False).first()
+    line = CartLine.objects.first()
+    company = Category.objects.filter(products__isnull=False).first()
+    variant = ProductVariant.objects.exclude(attributes={}).first()
+    if None in (cart, line, company, variant):
+        raise CommandError(
+            'Not enough data to explain queries, use --size to create it.')
+    selection = {
+        key: [value] for key, value in variant.attributes.items()}
+    return [
+        ('open user cart', Cart.objects.open().filter(
+            user=cart.user_id, token=cart.token)),
+        ('cart line', CartLine.objects.filter(
+            cart=line.cart_id, variant=line.variant_id)),
+        ('company orders', get_company_orders(company.pk)),
+        ('latest orders', Order.objects.all()[:30]),
+        ('company userfields', UserField.objects.filter(company=company)),
+        ('published company products', Product.objects.filter(
+            is_published=True, categories=company)),
+        ('products by attribute', filter_products_by_attributes(
+            Product.objects.all(), selection))]
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def iter_plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def get_sequential_scans(plan, min_rows):
+    """Return sequential scans reading at least `min_rows` rows."""
+    scans = []
+    for node in iter_plan_nodes(plan['Plan']):
+        if node['Node Type'] != 'Seq Scan':
+            continue
+        rows = node.get('Actual Rows', 0) + node.get(
+            'Rows Removed by Filter', 0)
+        if rows >= min_rows:
+            scans.append((node['Relation Name'], rows))
+    return scans
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN (ANALYZE, BUFFERS) on the hot queries of the shop and '
+        'flag sequential scans')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=0,
+            help='Create a synthetic dataset of this size first, it is '
+                 'rolled back afterwards unless --keep-data is given')
+        parser.add_argument(
+            '--keep-data', action='store_true', dest='keep_data',
+            default=False, help='Keep the synthetic dataset')
+        parser.add_argument(
+            '--min-rows', type=int, default=1000, dest='min_rows',
+            help='Ignore sequential scans of tables smaller than this')
+        parser.add_argument(
+            '--fail-on-seq-scan', action='store_true', dest='fail',
+            default=False,
+            help='Exit with an error when a sequential scan is flagged')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plans require PostgreSQL.')
+        with transaction.atomic():
+            if options['size']:
+                create_dataset(options['size'])
+            flagged = self.explain_queries(options['min_rows'])
+            if not options['keep_data']:
+                transaction.set_rollback(True)
+        if flagged and options['fail']:
+            raise CommandError(
+                'Sequential scans in: %s' % (', '.join(flagged),))
+
+    def explain_queries(self, min_rows):
+        flagged = []
+        for name, queryset in get_queries():
+            plan = explain(queryset)
+            root = plan['Plan']
+            self.stdout.write(
+                '%s: %.2f ms, %d shared buffers hit, %d read' % (
+                    name, plan['Execution Time'],
+                    root.get('Shared Hit Blocks', 0),
+                    root.get('Shared Read Blocks', 0)))
+            for relation, rows in get_sequential_scans(plan, min_rows):
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(
+                    '  sequential scan of %s (%d rows)' % (relation, rows)))
+        return flagged
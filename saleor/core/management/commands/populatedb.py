@@ -1,13 +1,15 @@
-from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.conf import settings
 from django.db import connection
 
-from ...utils.random_data import (
-    create_orders, create_users, create_shipping_methods,
-    create_products_by_schema, create_product_sales, create_vouchers,
-    create_groups, set_featured_products, add_address_to_admin)
 from ...utils import create_superuser
+from ...utils.random_data import (
+    create_carts, create_companies, create_orders, create_product_classes,
+    create_products, create_userfields, create_users)
+
+
+def count(value):
+    """Parse counts given as integers or in scientific notation."""
+    return int(float(value))
 
 
 class Command(BaseCommand):
@@ -28,11 +30,28 @@ class Command(BaseCommand):
             default=False,
             help='Don\'t create product images')
         parser.add_argument(
-            '--withoutsearch',
-            action='store_true',
-            dest='withoutsearch',
-            default=False,
-            help='Don\'t update search index')
+            '--companies', type=count, default=5,
+            help='Number of companies')
+        parser.add_argument(
+            '--userfields-per-company', type=count, default=2,
+            dest='userfields_per_company',
+            help='Number of checkout fields of every company')
+        parser.add_argument(
+            '--products-per-company', type=count, default=20,
+            dest='products_per_company',
+            help='Number of products of every company')
+        parser.add_argument(
+            '--variants-per-product', type=count, default=3,
+            dest='variants_per_product',
+            help='Number of variants of every product')
+        parser.add_argument(
+            '--users-per-company', type=count, default=5,
+            dest='users_per_company',
+            help='Number of users of every company')
+        parser.add_argument(
+            '--carts', type=count, default=20, help='Number of open carts')
+        parser.add_argument(
+            '--orders', type=count, default=20, help='Number of orders')
 
     def make_database_faster(self):
         '''Sacrifices some of the safeguards of sqlite3 for speed
@@ -45,33 +64,26 @@ class Command(BaseCommand):
             cursor.execute('PRAGMA temp_store = MEMORY;')
             cursor.execute('PRAGMA synchronous = OFF;')
 
-    def populate_search_index(self):
-        if settings.ES_URL:
-            call_command('search_index', '--rebuild', force=True)
-
     def handle(self, *args, **options):
         self.make_database_faster()
-        create_images = not options['withoutimages']
-        for msg in create_shipping_methods():
-            self.stdout.write(msg)
-        create_products_by_schema(self.placeholders_dir, 10, create_images,
-                                  stdout=self.stdout)
-        for msg in create_product_sales(5):
-            self.stdout.write(msg)
-        for msg in create_vouchers():
+        placeholders_dir = (
+            None if options['withoutimages'] else self.placeholders_dir)
+        companies = create_companies(options['companies'])
+        self.stdout.write('Created %d companies' % (len(companies),))
+        create_userfields(companies, options['userfields_per_company'])
+        product_classes = create_product_classes()
+        for msg in create_products(
+                companies, options['products_per_company'], product_classes,
+                options['variants_per_product'], placeholders_dir):
             self.stdout.write(msg)
-        for msg in create_users(20):
+        for msg in create_users(companies, options['users_per_company']):
             self.stdout.write(msg)
-        for msg in create_orders(20):
+        for msg in create_carts(options['carts'], companies):
             self.stdout.write(msg)
-        for msg in set_featured_products(16):
+        for msg in create_orders(options['orders'], companies):
             self.stdout.write(msg)
-        self.stdout.write(create_groups())
 
         if options['createsuperuser']:
             credentials = {'email': 'admin@example.com', 'password': 'admin'}
             msg = create_superuser(credentials)
             self.stdout.write(msg)
-            add_address_to_admin(credentials['email'])
-        if not options['withoutsearch']:
-            self.populate_search_index()
@@ -0,0 +1,35 @@
+import random
+import time
+
+from django.conf import settings
+
+from ..product.attributes import enter_request_scope, exit_request_scope
+from .instrumentation import (
+    RequestMetrics, record_cache_lookups, record_queries, report_request)
+
+
+def attribute_catalog(get_response):
+    """Share one product attribute catalog between all code of a request."""
+    def middleware(request):
+        enter_request_scope()
+        try:
+            return get_response(request)
+        finally:
+            exit_request_scope()
+    return middleware
+
+
+def request_metrics(get_response):
+    """Record time, SQL queries and cache lookups of sampled requests."""
+    def middleware(request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return get_response(request)
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with record_queries(metrics), record_cache_lookups(metrics):
+            response = get_response(request)
+        report_request(
+            request, response, time.perf_counter() - start, metrics,
+            settings.REQUEST_METRICS_MIN_DUPLICATES)
+        return response
+    return middleware
@@ -0,0 +1,125 @@
+"""Sessions kept in the cache and written to the database behind it.
+
+A session lives in the cache only until it is `SESSION_PERSIST_AFTER`
+seconds old. From then on it is also written to the database, at most once
+every `SESSION_PERSIST_INTERVAL` seconds, so a long-lived session survives
+the cache being flushed with at most the changes of the last interval
+lost. Short sessions never reach the database and requests of long-lived
+ones update it once per interval instead of on every change.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+KEY_PREFIX = 'saleor.core.sessions'
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._created_at = None
+        self._persisted_at = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def should_persist(self, current_time):
+        if current_time - self._created_at < settings.SESSION_PERSIST_AFTER:
+            return False
+        return (
+            self._persisted_at is None or
+            current_time - self._persisted_at >=
+            settings.SESSION_PERSIST_INTERVAL)
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # some backends raise on invalid keys, the session is reset then
+            entry = None
+        if entry is None:
+            data = super().load()
+            if self.session_key is None:
+                return data
+            # a session found in the database is long-lived and up to date
+            self._created_at = 0
+            self._persisted_at = time.time()
+            self.set_cache_entry(data)
+            return data
+        self._created_at = entry['created']
+        self._persisted_at = entry['persisted']
+        if self.should_persist(time.time()):
+            # make the middleware save the session, which writes it through
+            self.modified = True
+        return entry['data']
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        if (self.cache_key_prefix + session_key) in self._cache:
+            return True
+        return super().exists(session_key)
+
+    def set_cache_entry(self, data, must_create=False):
+        entry = {
+            'data': data, 'created': self._created_at,
+            'persisted': self._persisted_at}
+        if must_create:
+            if not self._cache.add(
+                    self.cache_key, entry, self.get_expiry_age()):
+                raise CreateError
+        else:
+            self._cache.set(self.cache_key, entry, self.get_expiry_age())
+
+    def persist(self, must_create):
+        """Write the session to the database, inserting or updating it."""
+        try:
+            super().save(must_create=must_create or self._persisted_at is None)
+        except CreateError:
+            if must_create:
+                raise
+            # saved by a concurrent request
+            super().save()
+        except UpdateError:
+            # removed by `clearsessions` since it was last written
+            super().save(must_create=True)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create:
+            # a new key, possibly of a cycled session, is not in the database
+            self._persisted_at = None
+        data = self._get_session(no_load=must_create)
+        current_time = time.time()
+        if self._created_at is None:
+            self._created_at = current_time
+        if self.should_persist(current_time):
+            self.persist(must_create)
+            self._persisted_at = current_time
+        self.set_cache_entry(data, must_create=must_create)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        if session_key == self.session_key and self._persisted_at is None:
+            # the session never reached the database
+            return
+        super().delete(session_key)
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+        self._created_at = None
+        self._persisted_at = None
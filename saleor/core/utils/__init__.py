@@ -65,8 +65,8 @@ def serialize_decimal(obj):
 
 def create_superuser(credentials):
     user, created = User.objects.get_or_create(
-        email=credentials['email'], defaults={
-            'is_active': True, 'is_staff': True, 'is_superuser': True})
+        username=credentials['email'], defaults={
+            'is_active': True, 'is_staff': True})
     if created:
         user.set_password(credentials['password'])
         user.save()
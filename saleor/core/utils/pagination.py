@@ -0,0 +1,257 @@
+"""Keyset pagination of querysets ordered by any fields followed by pk."""
+import base64
+import datetime
+import functools
+import json
+import operator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# below this estimate counting rows exactly is cheap enough
+EXACT_COUNT_THRESHOLD = 1000
+
+
+def get_ordering_field(model, path):
+    """Return the model field a lookup path of an ordering points to."""
+    field = None
+    for name in path.split('__'):
+        if field is not None:
+            model = field.related_model
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    return field
+
+
+def is_nullable(model, path):
+    """Return whether the value of a lookup path may be NULL."""
+    for name in path.split('__'):
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        if field.null or not field.concrete:
+            return True
+        if field.is_relation:
+            model = field.related_model
+    return False
+
+
+def get_keyset_ordering(queryset):
+    """Return the ordering of a queryset as `[(path, descending, nullable)]`.
+
+    The ordering always ends with the primary key, so every row has a
+    unique position. Relations are ordered by their primary keys.
+    """
+    query = queryset.query
+    order_by = query.order_by
+    if not order_by and query.default_ordering:
+        order_by = query.get_meta().ordering
+    model = queryset.model
+    ordering = []
+    for field in order_by:
+        if not isinstance(field, str) or field == '?':
+            raise TypeError(
+                'Keyset pagination requires ordering by field names, '
+                'got %r.' % (field,))
+        descending = field.startswith('-')
+        path = field.lstrip('-')
+        if path in ('pk', model._meta.pk.name):
+            ordering.append(('pk', descending, False))
+            return ordering
+        model_field = get_ordering_field(model, path)
+        if model_field.is_relation:
+            if model_field.related_model._meta.ordering:
+                raise TypeError(
+                    'Keyset pagination cannot order by %r, its model has '
+                    'a default ordering.' % (path,))
+            path += '__pk'
+        ordering.append((path, descending, is_nullable(model, path)))
+    descending = ordering[-1][1] if ordering else False
+    ordering.append(('pk', descending, False))
+    return ordering
+
+
+def get_value(obj, path):
+    for name in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, name)
+    return obj
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder truncates microseconds, cursors must be exact
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=CursorEncoder).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor, length):
+    """Return values encoded in a cursor, raising ValueError if invalid."""
+    values = json.loads(
+        base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('Cursor does not match the ordering.')
+    return values
+
+
+def get_keyset_lookup(ordering, values):
+    """Return a lookup matching rows placed after `values` in the ordering.
+
+    Follows PostgreSQL, which sorts NULLs as if they were larger than any
+    other value.
+    """
+    alternatives = []
+    equal = Q()
+    for (path, descending, nullable), value in zip(ordering, values):
+        if value is None:
+            same = Q(**{path + '__isnull': True})
+            after = Q(**{path + '__isnull': False}) if descending else None
+        else:
+            same = Q(**{path: value})
+            after = Q(**{path + ('__lt' if descending else '__gt'): value})
+            if nullable and not descending:
+                after |= Q(**{path + '__isnull': True})
+        if after is not None:
+            alternatives.append(equal & after)
+        equal &= same
+    return functools.reduce(operator.or_, alternatives)
+
+
+def estimate_count(queryset):
+    """Return an estimated number of rows in a queryset.
+
+    On PostgreSQL unfiltered tables are sized from `pg_class.reltuples`
+    and filtered querysets from the planner estimate. Small results and
+    other databases are counted exactly.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    query = queryset.query
+    with connection.cursor() as cursor:
+        if not query.where and not query.distinct:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            estimate = int(row[0]) if row else 0
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count()
+    return estimate
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset with cursors instead of page numbers.
+
+    Pages are fetched with a `WHERE` condition on the ordering columns
+    rather than `OFFSET`, so any page costs as much as the first one. The
+    total count is estimated unless `exact_count` is set.
+    """
+
+    def __init__(self, queryset, per_page, exact_count=False):
+        self.ordering = get_keyset_ordering(queryset)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.exact_count = exact_count
+
+    @cached_property
+    def count(self):
+        if self.exact_count:
+            return self.queryset.count()
+        return estimate_count(self.queryset)
+
+    def get_cursor(self, obj):
+        return encode_cursor([
+            get_value(obj, path) for path, dummy_descending, dummy_nullable
+            in self.ordering])
+
+    def page(self, after=None, before=None):
+        """Return the page following `after` or preceding `before`.
+
+        Raises ValueError when a cursor is invalid.
+        """
+        cursor, backwards = (before, True) if before else (after, False)
+        ordering = [
+            (path, descending != backwards, nullable)
+            for path, descending, nullable in self.ordering]
+        queryset = self.queryset.order_by(*[
+            ('-' if descending else '') + path
+            for path, descending, dummy_nullable in ordering])
+        if cursor:
+            values = decode_cursor(cursor, len(ordering))
+            queryset = queryset.filter(get_keyset_lookup(ordering, values))
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if backwards:
+            object_list.reverse()
+            return KeysetPage(
+                object_list, self, has_next=True, has_previous=has_more)
+        return KeysetPage(
+            object_list, self, has_next=has_more, has_previous=bool(cursor))
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<KeysetPage of %d objects>' % (len(self),)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.get_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.get_cursor(self.object_list[0])
+
+
+def get_keyset_page(items, paginate_by, params, exact_count=False):
+    """Return the page of `items` requested by `after` or `before` params."""
+    paginator = KeysetPaginator(items, paginate_by, exact_count=exact_count)
+    try:
+        return paginator.page(
+            after=params.get('after'), before=params.get('before'))
+    except ValueError as err:
+        raise Http404('Invalid cursor: %s' % (err,))
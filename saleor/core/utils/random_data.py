@@ -0,0 +1,307 @@
+"""Synthetic shop data in any volume, for development and benchmarks.
+
+Every generator inserts rows with `bulk_create` in batches and yields
+progress messages. Signals are not sent, so cached catalogs are
+invalidated once at the end instead of once per row.
+"""
+import os
+import random
+from decimal import Decimal
+from itertools import islice
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils.encoding import smart_text
+from django.utils.text import slugify
+from django.utils.timezone import utc
+from faker import Factory
+
+from ...cart import CartStatus
+from ...cart.models import Cart, CartLine, CartUserFieldEntry
+from ...order import OrderStatus
+from ...order.models import Order, OrderLine, OrderUserFieldEntry
+from ...product.attributes import invalidate_attribute_catalog
+from ...product.cache import invalidate_catalog
+from ...product.models import (
+    AttributeChoiceValue, Category, Product, ProductAttribute, ProductClass,
+    ProductImage, ProductVariant, UserField)
+from ...userprofile.models import User
+
+fake = Factory.create()
+
+BATCH_SIZE = 1000
+DEFAULT_PASSWORD = 'password'
+
+PRODUCT_CLASSES = {
+    'T-Shirt': {
+        'product_attributes': {'Cotton': ['50%', '80%', '100%']},
+        'variant_attributes': {
+            'Size': ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
+            'Color': ['White', 'Black', 'Navy', 'Red']},
+        'images_dir': 't-shirts'},
+    'Mug': {
+        'product_attributes': {'Volume': ['250ml', '330ml', '500ml']},
+        'variant_attributes': {'Color': ['White', 'Black', 'Navy', 'Red']},
+        'images_dir': 'mugs'},
+    'Coffee': {
+        'product_attributes': {
+            'Origin': ['Brazil', 'Ethiopia', 'Colombia', 'Kenya']},
+        'variant_attributes': {'Grind': ['Beans', 'Coarse', 'Fine']},
+        'images_dir': 'coffee'},
+    'Book': {
+        'product_attributes': {'Cover': ['Soft', 'Hard']},
+        'variant_attributes': {'Language': ['English', 'German', 'Polish']},
+        'images_dir': 'books'}}
+
+
+def batched(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def bulk_create(model, objects, batch_size=BATCH_SIZE):
+    """Insert objects in batches and return them with primary keys set."""
+    created = []
+    for batch in batched(objects, batch_size):
+        created += model.objects.bulk_create(batch)
+    return created
+
+
+def create_companies(how_many):
+    """Create root categories, which stand for companies in the shop."""
+    # MPTT fields are not set by bulk_create, every company is its own tree
+    last_tree_id = Category.objects.aggregate(
+        last=Max('tree_id'))['last'] or 0
+    companies = []
+    for index in range(how_many):
+        name = fake.company()
+        companies.append(Category(
+            name=name, slug=slugify(name)[:40] or 'company',
+            prices=random.random() < 0.8, tree_id=last_tree_id + index + 1,
+            lft=1, rght=2, level=0))
+    return bulk_create(Category, companies)
+
+
+def create_userfields(companies, per_company):
+    names = ['Cost center', 'Purchase order', 'Department', 'Project']
+    return bulk_create(UserField, [
+        UserField(
+            name=names[index % len(names)], company=company,
+            description=fake.sentence())
+        for company in companies
+        for index in range(min(per_company, len(names)))])
+
+
+def create_attribute(name, values):
+    attribute = ProductAttribute.objects.get_or_create(
+        slug=slugify(name), defaults={'name': name})[0]
+    for value in values:
+        AttributeChoiceValue.objects.get_or_create(
+            attribute=attribute, name=value,
+            defaults={'slug': slugify(value)})
+    return attribute
+
+
+def create_product_classes(schema=PRODUCT_CLASSES):
+    """Return `[(product class, class schema)]` of classes in the schema."""
+    product_classes = []
+    for name, class_schema in schema.items():
+        product_class = ProductClass.objects.get_or_create(
+            name=name, defaults={'has_variants': True})[0]
+        product_class.product_attributes.set([
+            create_attribute(attribute_name, values)
+            for attribute_name, values in
+            class_schema['product_attributes'].items()])
+        product_class.variant_attributes.set([
+            create_attribute(attribute_name, values)
+            for attribute_name, values in
+            class_schema['variant_attributes'].items()])
+        product_classes.append((product_class, class_schema))
+    return product_classes
+
+
+def get_random_attributes(attributes):
+    return {
+        smart_text(attribute.pk): smart_text(
+            random.choice(attribute.values.all()).pk)
+        for attribute in attributes}
+
+
+def store_placeholders(placeholder_dir, images_dir):
+    """Store placeholder images once and return their storage names."""
+    path = os.path.join(placeholder_dir, images_dir)
+    names = []
+    for filename in sorted(os.listdir(path)):
+        with open(os.path.join(path, filename), 'rb') as image_file:
+            names.append(default_storage.save(
+                'products/%s' % (filename,), File(image_file)))
+    return names
+
+
+def create_products(companies, per_company, product_classes,
+                    variants_per_product=3, placeholder_dir=None):
+    """Create products with variants, and images if `placeholder_dir` is
+    given, in every company."""
+    attributes = {
+        product_class.pk: (
+            list(product_class.product_attributes.prefetch_related(
+                'values')),
+            list(product_class.variant_attributes.prefetch_related(
+                'values')))
+        for product_class, dummy_schema in product_classes}
+    images = {}
+    if placeholder_dir:
+        images = {
+            product_class.pk: store_placeholders(
+                placeholder_dir, class_schema['images_dir'])
+            for product_class, class_schema in product_classes}
+    through = Product.categories.through
+    for company in companies:
+        for batch in batched(range(per_company)):
+            products = []
+            for dummy in batch:
+                product_class = random.choice(product_classes)[0]
+                products.append(Product(
+                    name=fake.catch_phrase()[:128],
+                    price=Decimal(random.randint(100, 10000)) / 100,
+                    product_class=product_class, is_published=True,
+                    attributes=get_random_attributes(
+                        attributes[product_class.pk][0])))
+            products = Product.objects.bulk_create(products)
+            through.objects.bulk_create([
+                through(product_id=product.pk, category_id=company.pk)
+                for product in products])
+            bulk_create(ProductVariant, [
+                ProductVariant(
+                    product=product, sku=uuid4().hex[:32],
+                    name=smart_text(index),
+                    attributes=get_random_attributes(
+                        attributes[product.product_class_id][1]))
+                for product in products
+                for index in range(variants_per_product)])
+            if images:
+                bulk_create(ProductImage, [
+                    ProductImage(
+                        product=product, order=0,
+                        image=random.choice(images[product.product_class_id]))
+                    for product in products
+                    if images[product.product_class_id]])
+        yield 'Company %s: %d products' % (company, per_company)
+    invalidate_catalog([company.pk for company in companies])
+    invalidate_attribute_catalog()
+
+
+def create_users(companies, per_company, password=DEFAULT_PASSWORD):
+    """Create users of every company, all sharing the same password."""
+    # hashing is slow on purpose, so it is done once for all users
+    password = make_password(password)
+    for company in companies:
+        bulk_create(User, [
+            User(username=uuid4().hex, company=company, password=password)
+            for dummy in range(per_company)])
+    yield 'Created %d users' % (len(companies) * per_company,)
+
+
+def get_company_data(companies):
+    """Return users, variant ids and userfields of every company."""
+    data = {}
+    for company in companies:
+        user_ids = list(
+            User.objects.filter(company=company).values_list('pk', flat=True))
+        variants = list(
+            ProductVariant.objects.filter(
+                product__categories=company).values_list(
+                    'pk', 'product_id', 'product__name', 'sku',
+                    'product__price'))
+        userfield_ids = list(
+            UserField.objects.filter(company=company).values_list(
+                'pk', flat=True))
+        if user_ids and variants:
+            data[company.pk] = (user_ids, variants, userfield_ids)
+    return data
+
+
+def create_carts(how_many, companies, lines_per_cart=3):
+    """Create open carts of random company users."""
+    company_data = list(get_company_data(companies).items())
+    if not company_data:
+        return
+    for batch in batched(range(how_many)):
+        carts, picked = [], []
+        for dummy in batch:
+            company_id, (user_ids, variants, userfield_ids) = random.choice(
+                company_data)
+            quantities = [
+                (variant[0], random.randint(1, 5)) for variant in
+                random.sample(variants, min(lines_per_cart, len(variants)))]
+            carts.append(Cart(
+                user_id=random.choice(user_ids), company_id=company_id,
+                token=uuid4().hex,
+                status=CartStatus.OPEN,
+                quantity=sum(quantity for dummy_id, quantity in quantities)))
+            picked.append((quantities, userfield_ids))
+        carts = Cart.objects.bulk_create(carts)
+        lines, entries = [], []
+        for cart, (quantities, userfield_ids) in zip(carts, picked):
+            lines += [
+                CartLine(cart=cart, variant_id=variant_id, quantity=quantity)
+                for variant_id, quantity in quantities]
+            entries += [
+                CartUserFieldEntry(
+                    cart=cart, userfield_id=userfield_id, data=fake.word())
+                for userfield_id in userfield_ids]
+        CartLine.objects.bulk_create(lines)
+        CartUserFieldEntry.objects.bulk_create(entries)
+        yield 'Created %d carts' % (len(carts),)
+
+
+def create_orders(how_many, companies, lines_per_order=3):
+    """Create orders with lines and userfield entries of company users."""
+    company_data = list(get_company_data(companies).items())
+    if not company_data:
+        return
+    statuses = [status for status, dummy_label in OrderStatus.CHOICES]
+    for batch in batched(range(how_many)):
+        orders, picked = [], []
+        for dummy in batch:
+            company_id, (user_ids, variants, userfield_ids) = random.choice(
+                company_data)
+            created = fake.date_time_this_year(tzinfo=utc)
+            quantities = [
+                (variant, random.randint(1, 5)) for variant in
+                random.sample(variants, min(lines_per_order, len(variants)))]
+            total = sum(
+                (variant[4] * quantity for variant, quantity in quantities),
+                Decimal(0))
+            orders.append(Order(
+                user_id=random.choice(user_ids), company_id=company_id,
+                token=str(uuid4()),
+                status=random.choice(statuses), created=created,
+                last_status_change=created, total=total,
+                total_quantity=sum(
+                    quantity for dummy_variant, quantity in quantities)))
+            picked.append((quantities, userfield_ids))
+        orders = Order.objects.bulk_create(orders)
+        lines, entries = [], []
+        for order, (quantities, userfield_ids) in zip(orders, picked):
+            lines += [
+                OrderLine(
+                    order=order, product_id=product_id,
+                    product_name=name[:128], product_sku=sku,
+                    quantity=quantity, unit_price=price)
+                for (dummy_variant_id, product_id, name, sku, price), quantity
+                in quantities]
+            entries += [
+                OrderUserFieldEntry(
+                    order=order, userfield_id=userfield_id,
+                    data=fake.word())
+                for userfield_id in userfield_ids]
+        OrderLine.objects.bulk_create(lines)
+        OrderUserFieldEntry.objects.bulk_create(entries)
+        yield 'Created %d orders' % (len(orders),)
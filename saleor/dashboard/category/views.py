@@ -7,6 +7,7 @@ from django.urls import reverse
 from django.utils.translation import pgettext_lazy
 
 from ...core.utils import get_paginator_items
+from ...core.utils.pagination import get_keyset_page
 from ...product.models import Category, UserField
 from ..views import staff_member_required
 from .filters import CategoryFilter
@@ -17,9 +18,8 @@ from .forms import CategoryForm, UserFieldForm
 def category_list(request):
     categories = Category.tree.root_nodes().order_by('name')
     category_filter = CategoryFilter(request.GET, queryset=categories)
-    categories = get_paginator_items(
-        category_filter.qs, settings.DASHBOARD_PAGINATE_BY,
-        request.GET.get('page'))
+    categories = get_keyset_page(
+        category_filter.qs, settings.DASHBOARD_PAGINATE_BY, request.GET)
     ctx = {'categories': categories, 'filter': category_filter}
     return TemplateResponse(request, 'dashboard/category/list.html', ctx)
 
@@ -2,12 +2,13 @@ from django import forms
 from django.db.models import Q
 from django.utils.translation import pgettext_lazy
 from django_filters import (
-    CharFilter, ChoiceFilter, DateFromToRangeFilter, NumberFilter, RangeFilter,
-    OrderingFilter)
+    CharFilter, ChoiceFilter, DateFromToRangeFilter, ModelChoiceFilter,
+    NumberFilter, RangeFilter, OrderingFilter)
 
 from ...core.filters import SortedFilterSet
 from ...order import OrderStatus
 from ...order.models import Order
+from ...product.models import Category
 from ..widgets import DateRangeWidget
 
 
@@ -16,13 +17,15 @@ SORT_BY_FIELDS = (
     ('status', 'status'),
     ('user__email', 'email'),
     ('created', 'created'),
+    ('total', 'total'),
 )
 
 SORT_BY_FIELDS_LABELS = {
     'pk': pgettext_lazy('Order list sorting option', '#'),
     'status': pgettext_lazy('Order list sorting option', 'status'),
     'user__email': pgettext_lazy('Order list sorting option', 'email'),
-    'created': pgettext_lazy('Order list sorting option', 'created'),}
+    'created': pgettext_lazy('Order list sorting option', 'created'),
+    'total': pgettext_lazy('Order list sorting option', 'total')}
 
 
 class OrderFilter(SortedFilterSet):
@@ -35,6 +38,9 @@ class OrderFilter(SortedFilterSet):
     created = DateFromToRangeFilter(
         label=pgettext_lazy('Order list filter label', 'Placed on'),
         name='created', widget=DateRangeWidget)
+    company = ModelChoiceFilter(
+        label=pgettext_lazy('Order list filter label', 'Company'),
+        queryset=Category.objects.all())
     status = ChoiceFilter(
         label=pgettext_lazy(
             'Order list filter label', 'Order status'),
@@ -8,12 +8,13 @@ from ...cart.forms import QuantityField
 from ...core.forms import AjaxSelect2ChoiceField
 from ...order import OrderStatus
 from ...order.models import OrderLine, OrderNote
+from ...order.tasks import export_orders
 from ...order.utils import (
     cancel_order,
     change_order_line_quantity, merge_duplicates_into_order_line,
     recalculate_order, remove_empty_groups
 )
-from ...product.models import Product, ProductVariant
+from ...product.models import Category
 
 
 class OrderNoteForm(forms.ModelForm):
@@ -87,3 +88,27 @@ ORDER_STATUS_CHOICES = [
 ] + OrderStatus.CHOICES
 
 
+class OrderExportForm(forms.Form):
+    company = forms.ModelChoiceField(
+        queryset=Category.objects.all(),
+        label=pgettext_lazy('Order export form label', 'Company'))
+    date_from = forms.DateField(
+        required=False,
+        label=pgettext_lazy('Order export form label', 'Placed from'))
+    date_to = forms.DateField(
+        required=False,
+        label=pgettext_lazy('Order export form label', 'Placed to'))
+    status = forms.ChoiceField(
+        choices=ORDER_STATUS_CHOICES, required=False,
+        label=pgettext_lazy('Order export form label', 'Order status'))
+
+    def start_export(self):
+        """Schedule the export and return its task id."""
+        date_from, date_to = map(
+            self.cleaned_data.get, ['date_from', 'date_to'])
+        result = export_orders.delay(
+            self.cleaned_data['company'].pk,
+            date_from=date_from.isoformat() if date_from else None,
+            date_to=date_to.isoformat() if date_to else None,
+            status=self.cleaned_data['status'] or None)
+        return result.id
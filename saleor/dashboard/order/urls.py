@@ -7,6 +7,10 @@ urlpatterns = [
     url(r'^$', views.order_list, name='orders'),
     url(r'^export/$', views.order_export_list, name='order-export-list'),
     url(r'^export/(?P<company_id>\d+)/$', views.order_export, name='order-export'),
+    url(r'^export/jobs/(?P<job_id>[0-9a-f-]+)/$',
+        views.order_export_job, name='order-export-job'),
+    url(r'^export/jobs/(?P<job_id>[0-9a-f-]+)/download/$',
+        views.order_export_download, name='order-export-download'),
     url(r'^(?P<order_pk>\d+)/$',
         views.order_details, name='order-details'),
     url(r'^(?P<order_pk>\d+)/add-note/$',
@@ -1,24 +1,28 @@
 from django.conf import settings
 from django.contrib import messages
 from django.db import transaction
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.context_processors import csrf
 from django.template.response import TemplateResponse
 from django.utils.translation import pgettext_lazy
 from django.utils.text import slugify
+from celery.result import AsyncResult
 
 from .filters import OrderFilter
 from .forms import (
     CancelLinesForm,
     CancelOrderForm, ChangeQuantityForm,
-    OrderNoteForm)
+    OrderExportForm, OrderNoteForm)
 
 from ..views import staff_member_required
-from ...core.utils import get_paginator_items
+from ...core.utils.pagination import get_keyset_page
 from ...order import OrderStatus
+from ...order.export import Echo, OrderExport
 from ...order.models import Order, OrderLine, OrderNote, OrderUserFieldEntry
-from ...product.models import Product, UserField, Category
+from ...order.tasks import get_export_manifest, get_export_progress
+from ...product.models import Category
 
 import csv
 
@@ -27,91 +31,71 @@ import csv
 def order_list(request):
     orders = (Order.objects.prefetch_related('user').order_by('-pk'))
     order_filter = OrderFilter(request.GET, queryset=orders)
-    orders = get_paginator_items(
-        order_filter.qs, settings.DASHBOARD_PAGINATE_BY,
-        request.GET.get('page'))
+    orders = get_keyset_page(
+        order_filter.qs, settings.DASHBOARD_PAGINATE_BY, request.GET)
     ctx = {'orders': orders, 'filter': order_filter}
     return TemplateResponse(request, 'dashboard/order/list.html', ctx)
 
 
 @staff_member_required
 def order_export_list(request):
-    ctx = {'companies': Category.objects.all()}
+    form = OrderExportForm(request.POST or None)
+    if form.is_valid():
+        job_id = form.start_export()
+        return redirect('dashboard:order-export-job', job_id=job_id)
+    ctx = {'companies': Category.objects.all(), 'form': form}
     return TemplateResponse(request, 'dashboard/order/export_list.html', ctx)
 
- 
-@staff_member_required
-def order_export(request, company_id):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="%s_export.csv"' % \
-        (slugify(get_object_or_404(Category.objects.all(), id=company_id)))
-
-    # get all skus in this company
-    skus = []
-
-    for p in Product.objects.all().filter(categories__id=company_id):
-      for v in p.variants.all():
-        skus.append(v.sku)
-
-    # get all userfields in this company
-    userfields = []
-
-    for uf in UserField.objects.all().filter(company__id=company_id):
-      userfields.append(uf.name)
-
-    outfile = []
-
-    # build the header
-    header = ["Order ID", "Date", "Status", "Total Price"] + userfields + skus
-
-    # entries to index dictionary
-    entry_to_idx = dict([(y, x) for x, y in enumerate(header)])
-
-    # iterate through all orders in this company
-    for o in Order.objects.all().filter(user__company__id=company_id):
-      my_line = [o.id, o.created, o.status, 0.00] + ([""] * len(userfields)) + ([0] * len(skus))
-
-      # insert quantities into line and keep track of total
-      total = 0
 
-      for ol in o.get_lines():
-        # if this SKU was deleted at some point, manually add a column for it
-        if ol.product_id == None or ol.product_sku not in entry_to_idx:
-          my_sku = "DELETED:%s" % ol.product_sku
-
-          if my_sku not in header:
-            header.append(my_sku)
-            skus.append(my_sku)
-            my_line.append(0)
-            entry_to_idx = dict([(y, x) for x, y in enumerate(header)])
-        else:
-          my_sku = ol.product_sku
-
-          # we can only add to the total items that have prices (ie havent been deleted)
-          total += ol.quantity * ol.product.price
-
-        my_line[entry_to_idx[my_sku]] = ol.quantity
-
-      my_line[3] = total
-
-      # insert userfields into line
-      for uf in o.get_userfields():
-        my_line[entry_to_idx[uf.userfield.name]] = uf.data
-
-      outfile.append(my_line)
-
-    # prepend the header on to the output list
-    outfile.insert(0, header)
+@staff_member_required
+def order_export_job(request, job_id):
+    manifest = get_export_manifest(job_id)
+    if manifest:
+        job = {'state': 'SUCCESS', 'processed': manifest['rows'],
+               'total': manifest['rows']}
+    else:
+        result = AsyncResult(job_id)
+        # retried jobs carry their exception instead of the progress
+        info = result.info if isinstance(result.info, dict) else (
+            get_export_progress(job_id) or {})
+        job = {'state': result.state,
+               'processed': info.get('processed', 0),
+               'total': info.get('total')}
+    if request.is_ajax():
+        return JsonResponse(job)
+    ctx = {'job': job, 'job_id': job_id}
+    return TemplateResponse(request, 'dashboard/order/export_job.html', ctx)
 
-    # then write the contents
-    writer = csv.writer(response)
 
-    for line in outfile:
-      if len(line) < len(header):
-        line.extend([0] * (len(header) - len(line)))
+@staff_member_required
+def order_export_download(request, job_id):
+    manifest = get_export_manifest(job_id)
+    if not manifest:
+        raise Http404('Export is not finished')
+    company = get_object_or_404(Category, pk=manifest['company_id'])
+
+    def read_parts():
+        for part in manifest['parts']:
+            with default_storage.open(part) as part_file:
+                for chunk in part_file.chunks():
+                    yield chunk
+
+    response = StreamingHttpResponse(read_parts(), content_type='text/csv')
+    response['Content-Disposition'] = (
+        'attachment; filename="%s_export.csv"' % (slugify(company),))
+    return response
 
-      writer.writerow(line)
 
+@staff_member_required
+def order_export(request, company_id):
+    company = get_object_or_404(Category.objects.all(), id=company_id)
+    export = OrderExport(company.pk)
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in export.get_rows()),
+        content_type='text/csv')
+    response['Content-Disposition'] = (
+        'attachment; filename="%s_export.csv"' % (slugify(company),))
     return response
 
 @staff_member_required
@@ -123,7 +107,8 @@ def order_details(request, order_pk):
     notes = order.notes.all()
     lines = order.get_lines()
 
-    ufes = OrderUserFieldEntry.objects.filter(order=order)
+    ufes = OrderUserFieldEntry.objects.filter(
+        order=order).select_related('userfield')
 
     ctx = {'order': order, 'lines': lines, 'notes': notes, 'userfields': ufes}
     return TemplateResponse(request, 'dashboard/order/detail.html', ctx)
@@ -8,6 +8,7 @@ from django.utils.translation import npgettext_lazy, pgettext_lazy
 from django.views.decorators.http import require_POST
 
 from ...core.utils import get_paginator_items
+from ...core.utils.pagination import get_keyset_page
 from ...product.models import (
     AttributeChoiceValue, Product, ProductAttribute, ProductClass,
     ProductImage, ProductVariant)
@@ -108,9 +109,8 @@ def product_list(request):
         return redirect(
             'dashboard:product-add', class_pk=form.cleaned_data['product_cls'])
     product_filter = ProductFilter(request.GET, queryset=products)
-    products = get_paginator_items(
-        product_filter.qs, settings.DASHBOARD_PAGINATE_BY,
-        request.GET.get('page'))
+    products = get_keyset_page(
+        product_filter.qs, settings.DASHBOARD_PAGINATE_BY, request.GET)
     ctx = {
         'bulk_action_form': forms.ProductBulkUpdate(), 'form': form,
         'products': products, 'product_classes': product_classes,
@@ -7,7 +7,7 @@ from django.utils.translation import pgettext_lazy
 from .filters import StaffFilter
 from .forms import StaffForm
 from ..views import staff_member_required
-from ...core.utils import get_paginator_items
+from ...core.utils.pagination import get_keyset_page
 from ...userprofile.models import User
 
 
@@ -16,9 +16,8 @@ def staff_list(request):
     staff_members = (User.objects.all()
                      .order_by('username'))
     staff_filter = StaffFilter(request.GET, queryset=staff_members)
-    staff_members = get_paginator_items(
-        staff_filter.qs, settings.DASHBOARD_PAGINATE_BY,
-        request.GET.get('page'))
+    staff_members = get_keyset_page(
+        staff_filter.qs, settings.DASHBOARD_PAGINATE_BY, request.GET)
     ctx = {'staff': staff_members, 'filter': staff_filter}
     return TemplateResponse(request, 'dashboard/staff/list.html', ctx)
 
@@ -69,6 +69,28 @@ def paginate(context, page_obj, num_of_pages=5):
     return context
 
 
+@register.inclusion_tag('dashboard/includes/_keyset_pagination.html',
+                        takes_context=True)
+def paginate_keyset(context, page_obj):
+    params = context['request'].GET.copy()
+    for name in ['after', 'before', 'page']:
+        params.pop(name, None)
+
+    def get_url(name, cursor):
+        query = params.copy()
+        query[name] = cursor
+        return '?' + query.urlencode()
+
+    context['page_obj'] = page_obj
+    context['previous_url'] = (
+        get_url('before', page_obj.previous_cursor)
+        if page_obj.has_previous() else None)
+    context['next_url'] = (
+        get_url('after', page_obj.next_cursor)
+        if page_obj.has_next() else None)
+    return context
+
+
 @register.inclusion_tag('dashboard/includes/_filters.html', takes_context=True)
 def add_filters(context, filter_set, sort_by_filter_name='sort_by'):
     chips = []
@@ -13,5 +13,7 @@ urlpatterns = [
     url(r'^orders/', include(order_urls)),
     url(r'^products/', include(product_urls)),
     url(r'^users/', include(staff_urls)),
+    url(r'^request-metrics/$', core_views.request_metrics,
+        name='request-metrics'),
     url(r'^style-guide/', core_views.styleguide, name='styleguide'),
 ]
@@ -6,6 +6,7 @@ from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.db.models import Q, Sum
 from django.template.response import TemplateResponse
 
+from ..core.instrumentation import histogram
 from ..order.models import Order
 from ..order import OrderStatus
 from ..product.models import Product
@@ -36,6 +37,16 @@ def index(request):
     return TemplateResponse(request, 'dashboard/index.html')
 
 
+@staff_member_required
+def request_metrics(request):
+    if request.method == 'POST':
+        histogram.reset()
+    ctx = {
+        'views': histogram.snapshot(),
+        'sample_rate': settings.REQUEST_METRICS_SAMPLE_RATE}
+    return TemplateResponse(request, 'dashboard/request_metrics.html', ctx)
+
+
 @staff_member_required
 def styleguide(request):
     return TemplateResponse(request, 'dashboard/styleguide/index.html', {})
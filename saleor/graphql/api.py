@@ -1,17 +1,18 @@
-import functools
-import operator
-
 from django.db.models import Q
 import graphene
 from graphene import relay
 from graphene_django import DjangoConnectionField, DjangoObjectType
 from graphene_django.debug import DjangoDebug
 
+from ..product.facets import (
+    filter_products_by_attributes, get_attribute_facets,
+    get_attribute_selection, get_facet_counts)
 from ..product.models import (
     AttributeChoiceValue, Category, Product, ProductAttribute, ProductImage,
     ProductVariant)
-from ..product.templatetags.product_images import product_first_image
-from ..product.utils import get_availability, products_visible_to_user
+from ..product.templatetags.product_images import get_thumbnail
+from ..product.utils import can_view_unpublished, products_visible_to_user
+from .loaders import get_loaders
 from .scalars import AttributesFilterScalar
 from .utils import CategoryAncestorsCache, DjangoPkInterface
 
@@ -31,8 +32,18 @@ class ProductAvailabilityType(graphene.ObjectType):
     available = graphene.Boolean()
 
 
+class AttributeValueFacetType(graphene.ObjectType):
+    value = graphene.Field(lambda: ProductAttributeValue)
+    count = graphene.Int(
+        description="The number of products matching the value.")
+
+
+class AttributeFacetType(graphene.ObjectType):
+    attribute = graphene.Field(lambda: ProductAttributeType)
+    values = graphene.List(AttributeValueFacetType)
+
+
 class ProductType(DjangoObjectType):
-    url = graphene.String()
     thumbnail_url = graphene.String(
         size=graphene.Argument(
             graphene.String,
@@ -49,21 +60,22 @@ class ProductType(DjangoObjectType):
         size = args.get('size')
         if not size:
             size = '255x255'
-        return product_first_image(self, size)
+
+        def get_first_thumbnail(images):
+            main_image = images[0].image if images else None
+            return get_thumbnail(main_image, size)
+
+        return get_loaders(info.context).images_by_product.load(
+            self.pk).then(get_first_thumbnail)
 
     def resolve_images(self, info):
-        return self.images.all()
+        return get_loaders(info.context).images_by_product.load(self.pk)
 
     def resolve_variants(self, info):
-        return self.variants.all()
-
-    def resolve_url(self, info):
-        return self.get_absolute_url()
+        return get_loaders(info.context).variants_by_product.load(self.pk)
 
     def resolve_availability(self, info):
-        context = info.context
-        a = get_availability(self, context.discounts, context.currency)
-        return ProductAvailabilityType(**a._asdict())
+        return ProductAvailabilityType(available=self.is_available())
 
 
 class CategoryType(DjangoObjectType):
@@ -76,9 +88,15 @@ class CategoryType(DjangoObjectType):
         order_by=graphene.Argument(
             graphene.String,
             description="""A name of field to sort the products by. The negative
-                sign in front of name implies descending order."""),
+                sign in front of name implies descending order."""))
     products_count = graphene.Int()
-    url = graphene.String()
+    facets = graphene.List(
+        AttributeFacetType,
+        attributes=graphene.Argument(
+            graphene.List(AttributesFilterScalar),
+            description="""A list of attribute:value pairs the products are
+                filtered by"""))
+    parent = graphene.Field(lambda: CategoryType)
     ancestors = graphene.List(lambda: CategoryType)
     children = graphene.List(lambda: CategoryType)
     siblings = graphene.List(lambda: CategoryType)
@@ -87,6 +105,11 @@ class CategoryType(DjangoObjectType):
         model = Category
         interfaces = (relay.Node, DjangoPkInterface)
 
+    def resolve_parent(self, info):
+        if self.parent_id is None:
+            return None
+        return get_loaders(info.context).category.load(self.parent_id)
+
     def resolve_ancestors(self, info):
         return get_ancestors_from_cache(self, info.context)
 
@@ -99,53 +122,28 @@ class CategoryType(DjangoObjectType):
     def resolve_products_count(self, info):
         return self.products.count()
 
-    def resolve_url(self, info):
-        ancestors = get_ancestors_from_cache(self, info.context)
-        return self.get_absolute_url(ancestors)
+    def resolve_facets(self, info, **args):
+        selection = get_attribute_selection(args.get('attributes') or [])
+        counts = get_facet_counts(
+            self, selection,
+            published_only=not can_view_unpublished(info.context.user))
+        return [
+            AttributeFacetType(attribute=attribute, values=[
+                AttributeValueFacetType(value=value, count=count)
+                for value, count in values])
+            for attribute, values in get_attribute_facets(counts, selection)]
 
     def resolve_products(self, info, **args):
         context = info.context
         qs = products_visible_to_user(context.user)
-        qs = qs.prefetch_related('images', 'categories')
         qs = qs.filter(categories=self)
 
         attributes_filter, order_by, price_lte, price_gte = map(
             args.get, ['attributes', 'order_by', 'price_lte', 'price_gte'])
 
         if attributes_filter:
-            attributes = ProductAttribute.objects.prefetch_related('values')
-            attributes_map = {attribute.slug: attribute.pk
-                              for attribute in attributes}
-            values_map = {attr.slug: {value.slug: value.pk
-                                      for value in attr.values.all()}
-                          for attr in attributes}
-            queries = {}
-            # Convert attribute:value pairs into a dictionary where
-            # attributes are keys and values are grouped in lists
-            for attr_name, val_slug in attributes_filter:
-                try:
-                    attr_pk = attributes_map[attr_name]
-                except KeyError:
-                    attr_pk = None
-                else:
-                    try:
-                        attr_val_pk = values_map[attr_name][val_slug]
-                    except KeyError:
-                        attr_val_pk = None
-                    else:
-                        if attr_val_pk is not None and attr_pk not in queries:
-                            queries[attr_pk] = [attr_val_pk]
-                        else:
-                            queries[attr_pk].append(attr_val_pk)
-            if queries:
-                # Combine filters of the same attribute with OR operator
-                # and then combine full query with AND operator.
-                combine_and = [functools.reduce(operator.or_, [
-                    Q(**{'variants__attributes__%s' % key: v}) |
-                    Q(**{'attributes__%s' % key: v})
-                    for v in values]) for key, values in queries.items()]
-                query = functools.reduce(operator.and_, combine_and)
-                qs = qs.filter(query).distinct()
+            selection = get_attribute_selection(attributes_filter)
+            qs = filter_products_by_attributes(qs, selection)
 
         if order_by:
             qs = qs.order_by(order_by)
@@ -154,16 +152,10 @@ class CategoryType(DjangoObjectType):
 
 
 class ProductVariantType(DjangoObjectType):
-    stock_quantity = graphene.Int()
-    price_override = graphene.Field(lambda: PriceType)
-
     class Meta:
         model = ProductVariant
         interfaces = (relay.Node, DjangoPkInterface)
 
-    def resolve_stock_quantity(self, info):
-        return self.get_stock_quantity()
-
 
 class ProductImageType(DjangoObjectType):
     url = graphene.String(size=graphene.String())
@@ -193,7 +185,7 @@ class ProductAttributeType(DjangoObjectType):
         interfaces = (relay.Node, DjangoPkInterface)
 
     def resolve_values(self, info):
-        return self.values.all()
+        return get_loaders(info.context).values_by_attribute.load(self.pk)
 
 
 class Query(graphene.ObjectType):
@@ -219,7 +211,7 @@ class Query(graphene.ObjectType):
 
     def resolve_attributes(self, info, **args):
         category_pk = args.get('category_pk')
-        queryset = ProductAttribute.objects.prefetch_related('values')
+        queryset = ProductAttribute.objects.all()
         if category_pk:
             # Get attributes that are used with product classes
             # within the given category.
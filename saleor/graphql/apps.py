@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class GraphQLAppConfig(AppConfig):
+    name = 'saleor.graphql'
+
+    def ready(self):
+        manifest = settings.GRAPHQL_PERSISTED_QUERIES_MANIFEST
+        if manifest:
+            from graphene_django.settings import graphene_settings
+            from graphql.validation.rules import specified_rules
+            from .documents import get_document_cache
+            get_document_cache().load_manifest(
+                graphene_settings.SCHEMA, manifest, specified_rules)
@@ -0,0 +1,145 @@
+from graphql.error import GraphQLError
+from graphql.language import ast
+from graphql.type.definition import (
+    GraphQLList, GraphQLNonNull, GraphQLObjectType, GraphQLInterfaceType)
+from graphql.validation.rules.base import ValidationRule
+
+
+def unwrap_type(graphql_type):
+    """Return the named type and whether it is wrapped in a list."""
+    is_list = False
+    while isinstance(graphql_type, (GraphQLList, GraphQLNonNull)):
+        if isinstance(graphql_type, GraphQLList):
+            is_list = True
+        graphql_type = graphql_type.of_type
+    return graphql_type, is_list
+
+
+def is_connection(graphql_type):
+    fields = getattr(graphql_type, 'fields', {})
+    return 'edges' in fields and 'pageInfo' in fields
+
+
+class QueryCost:
+    """
+    Estimates how many fields a query resolves before it is executed.
+
+    The cost of a field is the number of times it is resolved: the product of
+    the estimated sizes of all lists above it. Connections are sized by their
+    `first` or `last` argument and fall back to `connection_size`, plain lists
+    to `list_size`.
+    """
+
+    def __init__(self, context, variables, list_size, connection_size):
+        self.context = context
+        self.variables = variables or {}
+        self.list_size = list_size
+        self.connection_size = connection_size
+
+    def get_argument(self, field, name):
+        for argument in field.arguments or []:
+            if argument.name.value != name:
+                continue
+            value = argument.value
+            if isinstance(value, ast.Variable):
+                return self.variables.get(value.name.value)
+            if isinstance(value, ast.IntValue):
+                return int(value.value)
+        return None
+
+    def get_size(self, field, parent_type, field_type, is_list):
+        size = self.get_argument(field, 'first') or self.get_argument(
+            field, 'last')
+        if size is not None:
+            return max(int(size), 0)
+        if is_connection(field_type):
+            return self.connection_size
+        if is_list and not (
+                is_connection(parent_type) and field.name.value == 'edges'):
+            return self.list_size
+        return 1
+
+    def get_fields(self, selection_set, parent_type, visited):
+        """Yield fields selected on the type, expanding fragments."""
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield selection, parent_type
+            elif isinstance(selection, ast.InlineFragment):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.context.get_schema().get_type(
+                        selection.type_condition.name.value)
+                yield from self.get_fields(
+                    selection.selection_set, fragment_type, visited)
+            elif isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.context.get_schema().get_type(
+                    fragment.type_condition.name.value)
+                yield from self.get_fields(
+                    fragment.selection_set, fragment_type, visited | {name})
+
+    def measure(self, selection_set, parent_type, multiplier=1, depth=1,
+                visited=frozenset()):
+        """Return the `(cost, depth)` of a selection set."""
+        cost, max_depth = 0, depth - 1
+        for field, field_parent in self.get_fields(
+                selection_set, parent_type, visited):
+            name = field.name.value
+            if name.startswith('__'):
+                continue
+            cost += multiplier
+            max_depth = max(max_depth, depth)
+            definition = None
+            if isinstance(field_parent, (
+                    GraphQLObjectType, GraphQLInterfaceType)):
+                definition = field_parent.fields.get(name)
+            if definition is None or not field.selection_set:
+                continue
+            field_type, is_list = unwrap_type(definition.type)
+            size = self.get_size(field, field_parent, field_type, is_list)
+            child_cost, child_depth = self.measure(
+                field.selection_set, field_type, multiplier * size,
+                depth + 1, visited)
+            cost += child_cost
+            max_depth = max(max_depth, child_depth)
+        return cost, max_depth
+
+    def measure_operation(self, operation):
+        schema = self.context.get_schema()
+        root_type = {
+            'query': schema.get_query_type,
+            'mutation': schema.get_mutation_type,
+            'subscription': schema.get_subscription_type,
+        }[operation.operation]()
+        return self.measure(operation.selection_set, root_type)
+
+
+def cost_analysis_rule(variables, max_cost, max_depth, list_size,
+                       connection_size, report):
+    """Return a validation rule rejecting queries that are too expensive.
+
+    `report` is called with the cost and depth of every operation, so the
+    caller can expose them to the client.
+    """
+
+    class QueryCostRule(ValidationRule):
+        def enter_OperationDefinition(self, node, key, parent, path,
+                                      ancestors):
+            analysis = QueryCost(
+                self.context, variables, list_size, connection_size)
+            cost, depth = analysis.measure_operation(node)
+            report(cost, depth)
+            if depth > max_depth:
+                self.context.report_error(GraphQLError(
+                    'Query depth %d exceeds the maximum of %d.' % (
+                        depth, max_depth), [node]))
+            if cost > max_cost:
+                self.context.report_error(GraphQLError(
+                    'Query cost %d exceeds the maximum of %d.' % (
+                        cost, max_cost), [node]))
+            return False
+
+    return QueryCostRule
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import Source, parse, validate
+
+logger = logging.getLogger(__name__)
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def get_persisted_query_hash(data):
+    """Return the hash of a persisted query sent in the request, if any.
+
+    Clients follow the automatic persisted queries convention and send
+    `{"extensions": {"persistedQuery": {"sha256Hash": "..."}}}`.
+    """
+    extensions = data.get('extensions') or {}
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            return None
+    persisted_query = extensions.get('persistedQuery') or {}
+    return persisted_query.get('sha256Hash')
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU cache of parsed and validated GraphQL documents keyed
+    by the SHA-256 hash of their source. Only documents that passed
+    validation are stored. Documents loaded from the persisted queries
+    manifest are never evicted.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._persisted = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents) + len(self._persisted)
+
+    def get(self, query_hash):
+        with self._lock:
+            document = self._persisted.get(query_hash)
+            if document is None:
+                document = self._documents.get(query_hash)
+                if document is not None:
+                    self._documents.move_to_end(query_hash)
+            return document
+
+    def set(self, query_hash, document, persisted=False):
+        with self._lock:
+            if persisted:
+                self._persisted[query_hash] = document
+                return
+            self._documents[query_hash] = document
+            self._documents.move_to_end(query_hash)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._persisted.clear()
+
+    def compile(self, schema, query, rules, persisted=False):
+        """Return `(document_ast, errors)` for the query, using the cache.
+
+        Parsing errors propagate to the caller.
+        """
+        query_hash = get_query_hash(query)
+        document = self.get(query_hash)
+        if document is not None:
+            return document, []
+        document = parse(Source(query, name='GraphQL request'))
+        errors = validate(schema, document, rules)
+        if not errors:
+            self.set(query_hash, document, persisted=persisted)
+        return document, errors
+
+    def load_manifest(self, schema, path, rules):
+        """Pre-seed the cache with queries of a `{hash: query}` manifest."""
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+        for query_hash, query in manifest.items():
+            if get_query_hash(query) != query_hash:
+                logger.warning(
+                    'Skipping persisted query %s, its hash does not match',
+                    query_hash)
+                continue
+            dummy_document, errors = self.compile(
+                schema, query, rules, persisted=True)
+            if errors:
+                logger.warning(
+                    'Skipping invalid persisted query %s: %s', query_hash,
+                    '; '.join(str(error) for error in errors))
+
+
+_document_cache = None
+
+
+def get_document_cache():
+    """Return the document cache shared by the whole process."""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+    return _document_cache
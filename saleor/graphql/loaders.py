@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from ..product.models import (
+    AttributeChoiceValue, Category, ProductImage, ProductVariant)
+
+CONTEXT_LOADERS_NAME = '__loaders__'
+
+
+def group_by(objects, attname):
+    grouped = defaultdict(list)
+    for obj in objects:
+        grouped[getattr(obj, attname)].append(obj)
+    return grouped
+
+
+class VariantsByProductLoader(DataLoader):
+    def batch_load_fn(self, product_ids):
+        variants = group_by(
+            ProductVariant.objects.filter(product_id__in=product_ids),
+            'product_id')
+        return Promise.resolve([variants[pk] for pk in product_ids])
+
+
+class ImagesByProductLoader(DataLoader):
+    def batch_load_fn(self, product_ids):
+        images = group_by(
+            ProductImage.objects.filter(product_id__in=product_ids),
+            'product_id')
+        return Promise.resolve([images[pk] for pk in product_ids])
+
+
+class ValuesByAttributeLoader(DataLoader):
+    def batch_load_fn(self, attribute_ids):
+        values = group_by(
+            AttributeChoiceValue.objects.filter(
+                attribute_id__in=attribute_ids),
+            'attribute_id')
+        return Promise.resolve([values[pk] for pk in attribute_ids])
+
+
+class CategoryLoader(DataLoader):
+    def batch_load_fn(self, category_ids):
+        categories = Category.objects.in_bulk(category_ids)
+        return Promise.resolve([categories.get(pk) for pk in category_ids])
+
+
+class Loaders:
+    """
+    DataLoaders of a single GraphQL request. Every loader batches the keys
+    requested by sibling resolvers into one query and caches the results
+    for the rest of the request.
+    """
+
+    def __init__(self):
+        self.variants_by_product = VariantsByProductLoader()
+        self.images_by_product = ImagesByProductLoader()
+        self.values_by_attribute = ValuesByAttributeLoader()
+        self.category = CategoryLoader()
+
+
+def get_loaders(context):
+    loaders = getattr(context, CONTEXT_LOADERS_NAME, None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, CONTEXT_LOADERS_NAME, loaders)
+    return loaders
@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponseNotAllowed
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+from graphql import validate
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql.validation.rules import specified_rules
+
+from .cost import cost_analysis_rule
+from .documents import (
+    get_document_cache, get_persisted_query_hash, get_query_hash)
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+PERSISTED_QUERY_HASH_MISMATCH = 'Provided sha256Hash does not match query'
+
+
+class GraphQLView(BaseGraphQLView):
+    """
+    GraphQL view rejecting queries above the configured cost and depth
+    limits. The estimated cost is reported in the `extensions` of every
+    response.
+
+    Parsed documents are cached, and clients may send the hash of a known
+    document instead of its source.
+    """
+
+    def get_cost_rule(self, variables):
+        def report(cost, depth):
+            self.query_costs.append((cost, depth))
+
+        return cost_analysis_rule(
+            variables, max_cost=settings.GRAPHQL_MAX_QUERY_COST,
+            max_depth=settings.GRAPHQL_MAX_QUERY_DEPTH,
+            list_size=settings.GRAPHQL_DEFAULT_LIST_SIZE,
+            connection_size=graphene_settings.RELAY_CONNECTION_MAX_LIMIT,
+            report=report)
+
+    def get_document(self, data, query):
+        """Return `(document_ast, errors)` of the requested document.
+
+        Parsed and validated documents are cached by the hash of their
+        source. A client may send just the hash of a document it sent
+        before or one listed in the persisted queries manifest.
+        """
+        document_cache = get_document_cache()
+        query_hash = get_persisted_query_hash(data)
+        if query_hash and not query:
+            document = document_cache.get(query_hash)
+            if document is None:
+                return None, [GraphQLError(PERSISTED_QUERY_NOT_FOUND)]
+            return document, []
+        if query_hash and query_hash != get_query_hash(query):
+            return None, [GraphQLError(PERSISTED_QUERY_HASH_MISMATCH)]
+        return document_cache.compile(self.schema, query, specified_rules)
+
+    def execute_graphql_request(self, request, data, query, variables,
+                                operation_name, show_graphiql=False):
+        if not query and not get_persisted_query_hash(data):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest(
+                'Must provide query string.'))
+
+        # views are instantiated per request, so this is request scoped
+        self.query_costs = []
+
+        try:
+            document_ast, validation_errors = self.get_document(data, query)
+            if not validation_errors:
+                # costs depend on variables, so they are never cached
+                validation_errors = validate(
+                    self.schema, document_ast,
+                    [self.get_cost_rule(variables)])
+            if validation_errors:
+                return ExecutionResult(
+                    errors=validation_errors,
+                    invalid=True,
+                )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        if request.method.lower() == 'get':
+            operation_ast = get_operation_ast(document_ast, operation_name)
+            if operation_ast and operation_ast.operation != 'query':
+                if show_graphiql:
+                    return None
+
+                raise HttpError(HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST '
+                    'request.'.format(operation_ast.operation)))
+
+        try:
+            return self.execute(
+                document_ast,
+                root_value=self.get_root_value(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                context_value=self.get_context(request),
+                middleware=self.get_middleware(request),
+                executor=self.executor,
+            )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(
+            request, data)
+
+        execution_result = self.execute_graphql_request(
+            request,
+            data,
+            query,
+            variables,
+            operation_name,
+            show_graphiql
+        )
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                response['errors'] = [self.format_error(
+                    e) for e in execution_result.errors]
+
+            if execution_result.invalid:
+                status_code = 400
+            else:
+                response['data'] = execution_result.data
+
+            costs = getattr(self, 'query_costs', None)
+            if costs:
+                response['extensions'] = {'cost': {
+                    'requestedQueryCost': max(cost for cost, _ in costs),
+                    'requestedQueryDepth': max(depth for _, depth in costs),
+                    'maximumAvailable': settings.GRAPHQL_MAX_QUERY_COST}}
+
+            if self.batch:
+                response['id'] = id
+                response['status'] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
@@ -0,0 +1,150 @@
+"""Export of company orders as CSV rows."""
+from django.db.models import Q
+
+from ..product.models import ProductVariant, UserField
+from .models import Order, OrderLine, OrderUserFieldEntry
+
+EXPORT_CHUNK_SIZE = 500
+BASE_COLUMNS = ['Order ID', 'Date', 'Status', 'Total Price']
+DELETED_SKU_COLUMN = 'DELETED:%s'
+
+
+class Echo:
+    """Pseudo-buffer returning what is written instead of storing it.
+
+    Lets `csv.writer` produce lines one by one for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_company_orders(company_id, date_from=None, date_to=None,
+                       status=None):
+    orders = Order.objects.filter(company_id=company_id)
+    if date_from:
+        orders = orders.filter(created__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(created__date__lte=date_to)
+    if status:
+        orders = orders.filter(status=status)
+    return orders
+
+
+class OrderExport:
+    """Rows of a company order export, read in bounded chunks.
+
+    Columns are computed up front: userfields of the company, SKUs of its
+    live variants and SKUs that appear in its orders but were deleted since.
+    Orders are then read chunk by chunk together with their lines and
+    userfields, so memory use does not depend on the number of orders.
+    """
+
+    def __init__(self, company_id, orders=None, columns=None,
+                 chunk_size=EXPORT_CHUNK_SIZE):
+        self.company_id = company_id
+        if orders is None:
+            orders = get_company_orders(company_id)
+        self.orders = orders
+        self.chunk_size = chunk_size
+        if columns is None:
+            columns = self.get_columns()
+        self.columns = columns
+        self.userfields = [tuple(uf) for uf in columns['userfields']]
+        self.skus = columns['skus']
+        self.deleted_skus = columns['deleted_skus']
+        self.header = (
+            BASE_COLUMNS + [name for _, name in self.userfields] +
+            self.skus + [DELETED_SKU_COLUMN % (sku,)
+                         for sku in self.deleted_skus])
+        offset = len(BASE_COLUMNS)
+        self.userfield_columns = {
+            pk: offset + index for index, (pk, _) in enumerate(
+                self.userfields)}
+        offset += len(self.userfields)
+        self.sku_columns = {
+            sku: offset + index for index, sku in enumerate(self.skus)}
+        offset += len(self.skus)
+        self.deleted_sku_columns = {
+            sku: offset + index for index, sku in enumerate(
+                self.deleted_skus)}
+
+    def get_columns(self):
+        """Compute userfields, live SKUs and deleted SKUs of the export.
+
+        The result is JSON serializable so an interrupted export can be
+        resumed with exactly the same columns.
+        """
+        userfields = list(
+            UserField.objects.filter(company__id=self.company_id)
+            .order_by('pk').values_list('pk', 'name'))
+        live_variants = ProductVariant.objects.filter(
+            product__categories__id=self.company_id)
+        skus = list(
+            live_variants.order_by('product_id', 'pk')
+            .values_list('sku', flat=True))
+        deleted_skus = list(
+            OrderLine.objects.filter(order__in=self.orders)
+            .filter(
+                Q(product=None) |
+                ~Q(product_sku__in=live_variants.values('sku')))
+            .order_by('product_sku')
+            .values_list('product_sku', flat=True).distinct())
+        return {
+            'userfields': userfields, 'skus': skus,
+            'deleted_skus': deleted_skus}
+
+    def get_order_chunks(self, last_pk=0):
+        """Yield lists of `(pk, created, status, total)` of consecutive
+        orders.
+
+        Orders up to `last_pk` are skipped.
+        """
+        orders = self.orders.order_by('pk').values_list(
+            'pk', 'created', 'status', 'total')
+        while True:
+            chunk = list(orders.filter(pk__gt=last_pk)[:self.chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1][0]
+
+    def get_chunk_rows(self, chunk):
+        """Return export rows of a chunk of orders."""
+        empty_row = (
+            [''] * len(self.userfields) +
+            [0] * (len(self.skus) + len(self.deleted_skus)))
+        order_pks = [pk for pk, _, _, _ in chunk]
+        rows = {
+            pk: [pk, created, status, total] + empty_row
+            for pk, created, status, total in chunk}
+
+        lines = OrderLine.objects.filter(order_id__in=order_pks).values_list(
+            'order_id', 'product_id', 'product_sku', 'quantity')
+        for order_id, product_id, sku, quantity in lines.iterator():
+            row = rows[order_id]
+            if product_id is None or sku not in self.sku_columns:
+                # lines of orders placed after the columns were computed
+                # may refer to SKUs deleted in the meantime
+                column = self.deleted_sku_columns.get(sku)
+                if column is not None:
+                    row[column] = quantity
+            else:
+                row[self.sku_columns[sku]] = quantity
+
+        userfields = OrderUserFieldEntry.objects.filter(
+            order_id__in=order_pks).values_list(
+                'order_id', 'userfield_id', 'data')
+        for order_id, userfield_id, data in userfields.iterator():
+            column = self.userfield_columns.get(userfield_id)
+            if column is not None:
+                rows[order_id][column] = data
+
+        return [rows[pk] for pk in order_pks]
+
+    def get_rows(self):
+        """Yield the header followed by a row for every order."""
+        yield self.header
+        for chunk in self.get_order_chunks():
+            for row in self.get_chunk_rows(chunk):
+                yield row
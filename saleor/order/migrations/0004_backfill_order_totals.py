@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from saleor.core.backfill import execute_in_batches
+
+BATCH_SIZE = 1000
+
+UPDATE_UNIT_PRICES_SQL = """
+    UPDATE {line_table} AS line SET unit_price = product.price
+    FROM {product_table} AS product
+    WHERE line.product_id = product.id AND line.unit_price IS NULL
+        AND line.order_id >= %s AND line.order_id < %s
+"""
+UPDATE_TOTALS_SQL = """
+    UPDATE {order_table} AS ord
+    SET total = totals.total, total_quantity = totals.total_quantity
+    FROM (
+        SELECT order_id, COALESCE(SUM(unit_price * quantity), 0) AS total,
+            SUM(quantity) AS total_quantity
+        FROM {line_table}
+        WHERE order_id >= %s AND order_id < %s
+        GROUP BY order_id) AS totals
+    WHERE ord.id = totals.order_id
+"""
+
+
+def backfill_order_totals(apps, schema_editor):
+    """Price lines at current product prices and store order totals.
+
+    Lines whose product was already deleted keep an unknown price and do
+    not count towards the total. Work is split by order ids, so the lines
+    and the total of an order always change in the same transaction.
+    """
+    Order = apps.get_model('order', 'Order')
+    OrderLine = apps.get_model('order', 'OrderLine')
+    Product = apps.get_model('product', 'Product')
+    tables = {
+        'order_table': Order._meta.db_table,
+        'line_table': OrderLine._meta.db_table,
+        'product_table': Product._meta.db_table}
+    execute_in_batches(schema_editor, Order, [
+        UPDATE_UNIT_PRICES_SQL.format(**tables),
+        UPDATE_TOTALS_SQL.format(**tables)], BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('order', '0003_order_totals'),
+        ('product', '0006_attributes_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+from saleor.core.backfill import execute_in_batches
+
+BATCH_SIZE = 5000
+
+UPDATE_COMPANIES_SQL = """
+    UPDATE {order_table} AS ord SET company_id = usr.company_id
+    FROM {user_table} AS usr
+    WHERE ord.user_id = usr.id AND ord.company_id IS NULL
+        AND ord.id >= %s AND ord.id < %s
+"""
+
+
+def backfill_order_company(apps, schema_editor):
+    """Store the company the user of an order belongs to now on the order.
+
+    Orders of deleted or anonymous users, and of users without a company,
+    keep no company.
+    """
+    Order = apps.get_model('order', 'Order')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    sql = UPDATE_COMPANIES_SQL.format(
+        order_table=Order._meta.db_table, user_table=User._meta.db_table)
+    execute_in_batches(schema_editor, Order, [sql], BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('order', '0005_order_company'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_order_company, migrations.RunPython.noop),
+    ]
@@ -9,7 +9,7 @@ from django.utils.translation import pgettext_lazy
 from satchless.item import ItemLine, ItemSet
 
 from . import OrderStatus
-from ..product.models import Product, UserField
+from ..product.models import Category, Product, UserField
 
 
 class Order(models.Model, ItemSet):
@@ -28,9 +28,29 @@ class Order(models.Model, ItemSet):
         on_delete=models.SET_NULL)
     token = models.CharField(
         pgettext_lazy('Order field', 'token'), max_length=36, unique=True)
+    # the company of the user when the order was placed
+    company = models.ForeignKey(
+        Category, blank=True, null=True, related_name='orders',
+        verbose_name=pgettext_lazy('Order field', 'company'),
+        on_delete=models.SET_NULL)
+    total = models.DecimalField(
+        pgettext_lazy('Order field', 'total'), max_digits=12,
+        decimal_places=2, default=0, editable=False)
+    total_quantity = models.PositiveIntegerField(
+        pgettext_lazy('Order field', 'total quantity'), default=0,
+        editable=False)
 
     class Meta:
         ordering = ('-last_status_change',)
+        indexes = [
+            models.Index(
+                fields=['last_status_change', 'id'],
+                name='order_last_status_change_idx'),
+            models.Index(
+                fields=['user', 'created'], name='order_user_created_idx'),
+            models.Index(
+                fields=['company', 'created'],
+                name='order_company_created_idx')]
 
     def save(self, *args, **kwargs):
         if not self.token:
@@ -76,6 +96,11 @@ class OrderLine(models.Model, ItemLine):
     quantity = models.IntegerField(
         pgettext_lazy('Ordered line field', 'quantity'),
         validators=[MinValueValidator(0), MaxValueValidator(999)])
+    # price of the product when the order was placed, unknown for lines
+    # whose product was deleted before prices were recorded
+    unit_price = models.DecimalField(
+        pgettext_lazy('Ordered line field', 'unit price'), max_digits=12,
+        decimal_places=2, blank=True, null=True)
 
     def __str__(self):
         return self.product_name
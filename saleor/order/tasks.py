@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+
+from celery import shared_task
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
+
+from .export import OrderExport, get_company_orders
+
+EXPORT_DIR = 'order-exports/%s/'
+EXPORT_COLUMNS_FILE = EXPORT_DIR + 'columns.json'
+EXPORT_MANIFEST_FILE = EXPORT_DIR + 'manifest.json'
+EXPORT_PART_FILE = EXPORT_DIR + 'part-%05d.csv'
+EXPORT_PROGRESS_FILE = EXPORT_DIR + 'progress.json'
+EXPORT_PROGRESS = 'PROGRESS'
+
+
+def write_file(name, content):
+    # a part left behind by an interrupted run is overwritten
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def write_csv_part(name, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerows(rows)
+    return write_file(name, output.getvalue().encode('utf-8'))
+
+
+def read_json_file(name):
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name) as json_file:
+        return json.loads(json_file.read().decode('utf-8'))
+
+
+def get_export_manifest(job_id):
+    """Return the manifest of a finished export job or None."""
+    return read_json_file(EXPORT_MANIFEST_FILE % (job_id,))
+
+
+def get_export_progress(job_id):
+    """Return the progress stored by an export job after its last part or
+    None if it has not written any."""
+    return read_json_file(EXPORT_PROGRESS_FILE % (job_id,))
+
+
+def save_progress(task, job_id, progress):
+    write_file(
+        EXPORT_PROGRESS_FILE % (job_id,), json.dumps(progress).encode())
+    task.update_state(state=EXPORT_PROGRESS, meta=progress)
+
+
+@shared_task(bind=True, autoretry_for=(DatabaseError,),
+             retry_kwargs={'max_retries': 3})
+def export_orders(self, company_id, date_from=None, date_to=None,
+                  status=None):
+    """Export company orders to CSV parts in the default file storage.
+
+    Every chunk of orders is written as a separate part, followed by the
+    progress file recording the parts written so far. Progress is stored
+    next to the columns rather than read from the result backend, which
+    replaces it with the exception when the task is retried. A retried task
+    picks up after the last part written, using the columns stored by the
+    first run.
+    """
+    job_id = self.request.id
+    orders = get_company_orders(company_id, date_from, date_to, status)
+
+    progress = get_export_progress(job_id)
+    columns = read_json_file(EXPORT_COLUMNS_FILE % (job_id,))
+    if progress and columns:
+        export = OrderExport(company_id, orders=orders, columns=columns)
+        self.update_state(state=EXPORT_PROGRESS, meta=progress)
+    else:
+        export = OrderExport(company_id, orders=orders)
+        write_file(
+            EXPORT_COLUMNS_FILE % (job_id,),
+            json.dumps(export.columns).encode())
+        header = write_csv_part(EXPORT_PART_FILE % (job_id, 0), [
+            export.header])
+        progress = {
+            'processed': 0, 'total': orders.count(), 'last_pk': 0,
+            'parts': [header]}
+        save_progress(self, job_id, progress)
+
+    for chunk in export.get_order_chunks(last_pk=progress['last_pk']):
+        name = EXPORT_PART_FILE % (job_id, len(progress['parts']))
+        part = write_csv_part(name, export.get_chunk_rows(chunk))
+        progress['parts'].append(part)
+        progress['processed'] += len(chunk)
+        progress['last_pk'] = chunk[-1][0]
+        save_progress(self, job_id, progress)
+
+    manifest = {
+        'company_id': company_id, 'rows': progress['processed'],
+        'parts': progress['parts']}
+    write_file(
+        EXPORT_MANIFEST_FILE % (job_id,), json.dumps(manifest).encode())
+    return manifest
@@ -1,14 +1,57 @@
+from decimal import Decimal
 from functools import wraps
 
 from django.conf import settings
-from django.db.models import F
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.translation import pgettext_lazy
 
-from .models import Order, OrderLine
+from ..cart import CartStatus
+from .models import Order, OrderLine, OrderUserFieldEntry
 from . import OrderStatus
 
 
+def create_order_from_cart(cart, user, userfield_entries=None):
+    """Place an order for the contents of the cart in a single transaction.
+
+    Lines and userfield entries are written with one query each, so the
+    number of queries does not depend on the size of the cart. The order
+    reuses the cart token, which is unique, so placing the same cart twice
+    raises `IntegrityError` and leaves no partial order behind. The cart is
+    marked as ordered, so it expires like other finished carts.
+
+    Lines keep the current product prices and the order stores its total,
+    so later price changes do not alter placed orders.
+    """
+    if userfield_entries is None:
+        userfield_entries = cart.userfields.all()
+    cart_lines = list(cart.lines.select_related('variant__product'))
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=user, company_id=user.company_id, token=cart.token,
+            total=sum(
+                (line.variant.product.price * line.quantity
+                 for line in cart_lines), Decimal(0)),
+            total_quantity=sum(line.quantity for line in cart_lines))
+        order.create_history_entry(
+            status=OrderStatus.NEW, user=user, comment='Order was placed')
+        OrderLine.objects.bulk_create([
+            OrderLine(
+                order=order, product=line.variant.product,
+                product_name=line.variant.product.name,
+                product_sku=line.variant.sku, quantity=line.quantity,
+                unit_price=line.variant.product.price)
+            for line in cart_lines])
+        OrderUserFieldEntry.objects.bulk_create([
+            OrderUserFieldEntry(
+                order=order, userfield_id=entry.userfield_id,
+                data=entry.data)
+            for entry in userfield_entries])
+        cart.change_status(CartStatus.ORDERED)
+    return order
+
+
 def cancel_order(order):
     """Cancells order by cancelling all associated shipment groups."""
     order.status = OrderStatus.CANCELLED
@@ -16,10 +59,18 @@ def cancel_order(order):
 
 
 def recalculate_order(order):
-    """Recalculates and assigns total price of order.
-    Total price is a sum of items and shippings in order shipment groups. """
-    order.total = 0
-    order.save()
+    """Store the total price and quantity of the order lines on the order.
+
+    Lines of unknown price do not count towards the total price.
+    """
+    totals = order.get_lines().aggregate(
+        total=Sum(
+            F('unit_price') * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)),
+        total_quantity=Sum('quantity'))
+    order.total = totals['total'] or 0
+    order.total_quantity = totals['total_quantity'] or 0
+    order.save(update_fields=['total', 'total_quantity'])
 
 
 def merge_duplicates_into_order_line(line):
@@ -37,11 +88,11 @@ def merge_duplicates_into_order_line(line):
 
 def change_order_line_quantity(line, new_quantity):
     """Change the quantity of ordered items in a order line."""
+    order = line.order
     line.quantity = new_quantity
     line.save()
 
     if not line.quantity:
-        order = line.order
         line.delete()
         if not order.get_lines():
             order.status = OrderStatus.CANCELLED
@@ -50,6 +101,7 @@ def change_order_line_quantity(line, new_quantity):
                 status=OrderStatus.CANCELLED, comment=pgettext_lazy(
                     'Order status history entry',
                     'Order cancelled. No items in order'))
+    recalculate_order(order)
 
 
 def remove_empty_groups(line):
@@ -61,6 +113,7 @@ def remove_empty_groups(line):
         line.save()
     else:
         line.delete()
+    recalculate_order(order)
 
     if not order.get_lines():
         order.status = OrderStatus.CANCELLED
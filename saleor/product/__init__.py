@@ -1,5 +1,7 @@
 from django.utils.translation import pgettext_lazy
 
+default_app_config = 'saleor.product.apps.ProductAppConfig'
+
 
 class ProductAvailabilityStatus:
     NOT_PUBLISHED = 'not-published'
@@ -0,0 +1,29 @@
+from django.apps import AppConfig
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete)
+
+
+class ProductAppConfig(AppConfig):
+    name = 'saleor.product'
+
+    def ready(self):
+        from . import signals
+        from .models import (
+            AttributeChoiceValue, Category, Product, ProductAttribute,
+            ProductImage, ProductVariant, VariantImage)
+
+        for model, handler in [
+                (Category, signals.category_changed),
+                (ProductVariant, signals.variant_changed),
+                (ProductImage, signals.product_image_changed),
+                (VariantImage, signals.variant_image_changed),
+                (ProductAttribute, signals.attribute_changed),
+                (AttributeChoiceValue, signals.attribute_value_changed)]:
+            post_save.connect(handler, sender=model)
+            post_delete.connect(handler, sender=model)
+        post_save.connect(signals.product_changed, sender=Product)
+        pre_delete.connect(signals.product_will_be_deleted, sender=Product)
+        post_delete.connect(signals.product_deleted, sender=Product)
+        m2m_changed.connect(
+            signals.product_categories_changed,
+            sender=Product.categories.through)
@@ -0,0 +1,100 @@
+"""Shared snapshot of product attributes and their choice values."""
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import smart_text
+
+ATTRIBUTES_VERSION_KEY = 'attributes:version'
+ATTRIBUTES_CATALOG_KEY = 'attributes:catalog:%s'
+
+_request_scope = threading.local()
+
+
+class AttributeCatalog:
+    """All product attributes with O(1) lookups of their choice values.
+
+    Lookups never touch the database, so display helpers can resolve
+    attribute values of any number of products and variants for free.
+    """
+
+    def __init__(self, attributes):
+        self.attributes = {attribute.pk: attribute for attribute in attributes}
+        self.values = {
+            attribute.pk: {
+                smart_text(value.pk): value
+                for value in attribute.values.all()}
+            for attribute in attributes}
+        self.values_by_slug = {
+            attribute.slug: {
+                value.slug: value for value in attribute.values.all()}
+            for attribute in attributes}
+
+    def get_attribute(self, pk):
+        return self.attributes.get(int(pk))
+
+    def get_value(self, attribute_pk, value_pk):
+        """Return the choice value with given pk or None."""
+        return self.values.get(int(attribute_pk), {}).get(
+            smart_text(value_pk))
+
+    def get_value_by_slug(self, attribute_slug, value_slug):
+        """Return the choice value with given slugs or None."""
+        return self.values_by_slug.get(attribute_slug, {}).get(value_slug)
+
+    def get_attributes(self, pks):
+        """Return attributes with given pks in their default order."""
+        attributes = [self.get_attribute(pk) for pk in pks]
+        return sorted(
+            [attribute for attribute in attributes if attribute is not None],
+            key=lambda attribute: attribute.slug)
+
+
+def get_attributes_version():
+    version = cache.get(ATTRIBUTES_VERSION_KEY)
+    if version is None:
+        cache.add(ATTRIBUTES_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(ATTRIBUTES_VERSION_KEY)
+    return version
+
+
+def invalidate_attribute_catalog():
+    """Make all processes load a fresh attribute catalog."""
+    cache.set(ATTRIBUTES_VERSION_KEY, uuid4().hex, None)
+    _request_scope.catalog = None
+
+
+def load_attribute_catalog():
+    """Return the attribute catalog from the cache or the database."""
+    from .models import ProductAttribute
+    key = ATTRIBUTES_CATALOG_KEY % (get_attributes_version(),)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = AttributeCatalog(
+            ProductAttribute.objects.prefetch_related('values'))
+        cache.set(key, catalog, settings.ATTRIBUTES_CACHE_TIMEOUT)
+    return catalog
+
+
+def get_attribute_catalog():
+    """Return the attribute catalog shared by the current request.
+
+    Inside a request scope the catalog is loaded at most once. Outside of
+    one it is loaded on every call, which normally is a single cache hit.
+    """
+    if not getattr(_request_scope, 'active', False):
+        return load_attribute_catalog()
+    if _request_scope.catalog is None:
+        _request_scope.catalog = load_attribute_catalog()
+    return _request_scope.catalog
+
+
+def enter_request_scope():
+    _request_scope.active = True
+    _request_scope.catalog = None
+
+
+def exit_request_scope():
+    _request_scope.active = False
+    _request_scope.catalog = None
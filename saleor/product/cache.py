@@ -0,0 +1,71 @@
+"""Versioned per-company cache of rendered catalog fragments."""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .utils import get_category_products_context
+
+CATALOG_VERSION_KEY = 'catalog:version:%s'
+CATALOG_FRAGMENTS_KEY = 'catalog:fragments:%s:%s:%s'
+CSRF_TOKEN_PLACEHOLDER = 'CATALOGCSRFTOKENPLACEHOLDER'
+PRODUCT_FRAGMENT_TEMPLATE = 'category/_product.html'
+
+
+def get_catalog_version(category_id):
+    """Return the current version of a company catalog.
+
+    Versions are random tokens rather than counters so a version key evicted
+    from the cache can never bring back fragments rendered before it.
+    """
+    key = CATALOG_VERSION_KEY % (category_id,)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_catalog(category_ids):
+    """Evict rendered fragments of the given companies."""
+    cache.set_many(
+        {CATALOG_VERSION_KEY % (category_id,): uuid4().hex
+         for category_id in set(category_ids)}, None)
+
+
+def render_catalog_fragments(category, cart=None):
+    """Render every product of a company catalog into an HTML fragment.
+
+    Fragments are rendered with a placeholder in place of the CSRF token, so
+    they can be shared by all users of the company. The token is the only
+    per-request part: the add-to-cart forms are unbound, and the cart is
+    only consulted when a submitted form is validated, which happens in
+    `product_add_to_cart` and shows errors on the uncached product page.
+    Fragments are therefore rendered without a cart.
+    """
+    return [
+        render_to_string(PRODUCT_FRAGMENT_TEMPLATE, {
+            'proddata': product_context,
+            'prices_enabled': category.prices,
+            'csrf_token': CSRF_TOKEN_PLACEHOLDER})
+        for product_context in get_category_products_context(category, cart)]
+
+
+def get_catalog_fragments(request, category):
+    """Return rendered catalog fragments for the given request.
+
+    Fragments are taken from the cache when the company catalog did not
+    change since they were rendered. Per-request state is filled in before
+    returning them.
+    """
+    version = get_catalog_version(category.pk)
+    key = CATALOG_FRAGMENTS_KEY % (category.pk, version, int(category.prices))
+    fragments = cache.get(key)
+    if fragments is None:
+        fragments = render_catalog_fragments(category)
+        cache.set(key, fragments, settings.CATALOG_CACHE_TIMEOUT)
+    csrf_token = get_token(request)
+    return [fragment.replace(CSRF_TOKEN_PLACEHOLDER, csrf_token)
+            for fragment in fragments]
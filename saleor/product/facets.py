@@ -0,0 +1,164 @@
+"""Filtering and counting products by the values of their attributes."""
+import functools
+import hashlib
+import json
+import operator
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils.encoding import smart_text
+
+from .attributes import get_attribute_catalog
+from .cache import get_catalog_version
+from .models import Product, ProductVariant
+
+
+def get_attribute_selection(pairs):
+    """Map `(attribute slug, value slug)` pairs to attribute and value pks.
+
+    Returns `{attribute pk: [value pks]}` with pks as HStore strings.
+    Unknown attributes and values are ignored.
+    """
+    catalog = get_attribute_catalog()
+    selection = {}
+    for attribute_slug, value_slug in pairs:
+        value = catalog.get_value_by_slug(attribute_slug, value_slug)
+        if value is None:
+            continue
+        selection.setdefault(smart_text(value.attribute_id), []).append(
+            smart_text(value.pk))
+    return selection
+
+
+def get_attribute_lookup(attribute_pk, value_pks):
+    """Return a lookup matching `attributes` holding any of the values.
+
+    HStore containment is used, so the lookup is served by GIN indexes.
+    """
+    return functools.reduce(operator.or_, [
+        Q(attributes__contains={attribute_pk: value_pk})
+        for value_pk in value_pks])
+
+
+def filter_products_by_attributes(queryset, selection):
+    """Narrow products to the ones matching the attribute selection.
+
+    A product matches when, for every selected attribute, the product or
+    one of its variants has one of the selected values. Variants are
+    checked with an `EXISTS` subquery, so no join or `DISTINCT` is needed.
+    """
+    for attribute_pk, value_pks in sorted(selection.items()):
+        lookup = get_attribute_lookup(attribute_pk, value_pks)
+        variants = ProductVariant.objects.filter(
+            lookup, product=OuterRef('pk'))
+        alias = 'has_variant_attribute_%s' % (attribute_pk,)
+        queryset = queryset.annotate(**{alias: Exists(variants)}).filter(
+            lookup | Q(**{alias: True}))
+    return queryset
+
+
+FACET_COUNTS_KEY = 'facets:%s:%s:%s'
+
+FACET_COUNTS_SQL = """
+    SELECT facets.key, facets.value, COUNT(DISTINCT facets.product_id)
+    FROM (
+        SELECT product.id AS product_id, attribute.key, attribute.value
+        FROM {product_table} product, each(product.attributes) attribute
+        UNION ALL
+        SELECT variant.product_id, attribute.key, attribute.value
+        FROM {variant_table} variant, each(variant.attributes) attribute
+    ) facets
+    JOIN {product_table} product ON product.id = facets.product_id
+    WHERE facets.product_id IN ({products}) AND {conditions}
+    GROUP BY facets.key, facets.value
+"""
+
+SELECTED_ATTRIBUTE_SQL = """(
+    facets.key = %s OR {in_product} OR EXISTS (
+        SELECT 1 FROM {variant_table} variant
+        WHERE variant.product_id = facets.product_id AND {in_variant}))
+"""
+
+
+def get_containment_sql(alias, attribute_pk, value_pks):
+    sql = ' OR '.join(
+        ['%s.attributes @> hstore(%%s, %%s)' % (alias,)] * len(value_pks))
+    params = []
+    for value_pk in value_pks:
+        params += [attribute_pk, value_pk]
+    return '(%s)' % (sql,), params
+
+
+def count_facets(products, selection):
+    """Count products having each attribute value, in a single query.
+
+    Returns `{attribute pk: {value pk: count}}`. Counts of an attribute
+    take into account the selected values of all other attributes but not
+    its own, so they tell how many products selecting a value would add.
+    """
+    variant_table = ProductVariant._meta.db_table
+    products_sql, params = products.order_by().values(
+        'pk').query.sql_with_params()
+    params = list(params)
+    conditions = ['TRUE']
+    for attribute_pk, value_pks in sorted(selection.items()):
+        in_product, product_params = get_containment_sql(
+            'product', attribute_pk, value_pks)
+        in_variant, variant_params = get_containment_sql(
+            'variant', attribute_pk, value_pks)
+        conditions.append(SELECTED_ATTRIBUTE_SQL.format(
+            in_product=in_product, in_variant=in_variant,
+            variant_table=variant_table))
+        params += [attribute_pk] + product_params + variant_params
+    sql = FACET_COUNTS_SQL.format(
+        product_table=Product._meta.db_table, variant_table=variant_table,
+        products=products_sql, conditions=' AND '.join(conditions))
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for attribute_pk, value_pk, count in cursor.fetchall():
+            if attribute_pk.isdigit() and value_pk and value_pk.isdigit():
+                counts.setdefault(int(attribute_pk), {})[int(value_pk)] = count
+    return counts
+
+
+def get_facet_counts(category, selection, published_only=True):
+    """Return facet counts of products in a category, see `count_facets`.
+
+    Counts are cached per category catalog version and selection, so any
+    change to the products of the category invalidates them.
+    """
+    signature = hashlib.md5(json.dumps(
+        [published_only, sorted(
+            (key, sorted(values)) for key, values in selection.items())]
+    ).encode('utf-8')).hexdigest()
+    key = FACET_COUNTS_KEY % (
+        category.pk, get_catalog_version(category.pk), signature)
+    counts = cache.get(key)
+    if counts is None:
+        products = Product.objects.filter(categories=category)
+        if published_only:
+            products = products.filter(is_published=True)
+        counts = count_facets(products, selection)
+        cache.set(key, counts, settings.CATALOG_CACHE_TIMEOUT)
+    return counts
+
+
+def get_attribute_facets(counts, selection=None):
+    """Return `(attribute, [(value, count)])` pairs for display.
+
+    Every attribute with a matching product or a selected value is listed
+    with all of its values, including the ones no product matches.
+    """
+    catalog = get_attribute_catalog()
+    attribute_pks = set(counts) | {int(pk) for pk in selection or {}}
+    facets = []
+    for attribute in catalog.get_attributes(attribute_pks):
+        attribute_counts = counts.get(attribute.pk, {})
+        values = sorted(
+            catalog.values[attribute.pk].values(), key=lambda value: value.pk)
+        facets.append((attribute, [
+            (value, attribute_counts.get(value.pk, 0)) for value in values]))
+    return facets
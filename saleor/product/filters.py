@@ -1,10 +1,13 @@
 from collections import OrderedDict
+from itertools import chain
 
 from django.forms import CheckboxSelectMultiple, ValidationError
+from django.utils.encoding import smart_text
 from django.utils.translation import pgettext_lazy
 from django_filters import MultipleChoiceFilter, OrderingFilter, RangeFilter
 
 from ..core.filters import SortedFilterSet
+from .facets import get_facet_counts
 from .models import Product, ProductAttribute
 
 SORT_BY_FIELDS = {
@@ -67,6 +70,27 @@ class ProductFilter(SortedFilterSet):
     def _get_attribute_choices(self, attribute):
         return [(choice.pk, choice.name) for choice in attribute.values.all()]
 
+    def get_attribute_selection(self):
+        """Return `{attribute pk: [value pks]}` of the checked choices."""
+        selection = {}
+        if not self.is_bound or not self.form.is_valid():
+            return selection
+        for attribute in chain(
+                self.product_attributes, self.variant_attributes):
+            value_pks = self.form.cleaned_data.get(attribute.slug)
+            if value_pks:
+                selection[smart_text(attribute.pk)] = [
+                    smart_text(pk) for pk in value_pks]
+        return selection
+
+    def get_facet_counts(self):
+        """Return the number of products matching every attribute choice.
+
+        Counts are `{attribute pk: {value pk: count}}`, taking the other
+        checked attributes into account, see `facets.count_facets`.
+        """
+        return get_facet_counts(self.category, self.get_attribute_selection())
+
     def validate_sort_by(self, value):
         if value.strip('-') not in SORT_BY_FIELDS:
             raise ValidationError(
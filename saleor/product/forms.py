@@ -21,9 +21,17 @@ class ProductForm(AddToCartForm):
         variant_field = self.fields['variant']
         variant_field.queryset = self.product.variants.all()
         variant_field.empty_label = None
-        images_map = {variant.pk: [vi.image.image.url
-                                   for vi in variant.variant_images.all()]
-                      for variant in self.product.variants.all()}
+        # build choices from the (possibly prefetched) variants instead of
+        # letting the field query for them again when rendered
+        variants = self.product.variants.all()
+        variant_field.choices = [
+            (variant.pk, variant_field.label_from_instance(variant))
+            for variant in variants]
+        images = {image.pk: image for image in self.product.images.all()}
+        images_map = {variant.pk: [images[vi.image_id].image.url
+                                   for vi in variant.variant_images.all()
+                                   if vi.image_id in images]
+                      for variant in variants}
         variant_field.widget.attrs['data-images'] = json.dumps(images_map)
 
     def get_variant(self, cleaned_data):
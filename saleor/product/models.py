@@ -2,7 +2,8 @@ import datetime
 from decimal import Decimal
 
 from django.conf import settings
-from django.contrib.postgres.fields import HStoreField
+from django.contrib.postgres.fields import HStoreField, JSONField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from django.db.models import F, Max, Q
@@ -110,11 +111,16 @@ class Product(models.Model, ItemRange):
         pgettext_lazy('Product field', 'attributes'), default={})
     updated_at = models.DateTimeField(
         pgettext_lazy('Product field', 'updated at'), auto_now=True, null=True)
+    display_data = JSONField(
+        pgettext_lazy('Product field', 'display data'), blank=True,
+        null=True, editable=False)
 
     objects = ProductManager()
 
     class Meta:
         app_label = 'product'
+        indexes = [
+            GinIndex(fields=['attributes'], name='product_attributes_gin')]
         permissions = (
             ('view_product',
              pgettext_lazy('Permission description', 'Can view products')),
@@ -182,6 +188,8 @@ class ProductVariant(models.Model, Item):
 
     class Meta:
         app_label = 'product'
+        indexes = [
+            GinIndex(fields=['attributes'], name='variant_attributes_gin')]
 
     def __str__(self):
         return self.name or self.display_variant()
@@ -202,13 +210,17 @@ class ProductVariant(models.Model, Item):
         self.attributes[smart_text(pk)] = smart_text(value_pk)
 
     def display_variant(self, attributes=None):
-        if attributes is None:
-            attributes = self.product.product_class.variant_attributes.all()
+        from .attributes import get_attribute_catalog
         from .utils import get_attributes_display_map
+        if attributes is None:
+            attributes = get_attribute_catalog().get_attributes(
+                self.attributes)
         values = get_attributes_display_map(self, attributes)
         if values:
+            attributes_map = {attribute.pk: attribute
+                              for attribute in attributes}
             return ', '.join(
-                ['%s: %s' % (smart_text(attributes.get(id=int(key))),
+                ['%s: %s' % (smart_text(attributes_map[key]),
                              smart_text(value))
                  for (key, value) in values.items()])
         else:
@@ -0,0 +1,93 @@
+"""Signal handlers keeping cached catalogs and product data up to date."""
+from django.db import transaction
+from django.db.models import Q
+
+from .attributes import invalidate_attribute_catalog
+from .cache import invalidate_catalog
+from .models import Category, Product
+from .tasks import rebuild_product_display_data
+
+
+def invalidate_categories(queryset):
+    invalidate_catalog(queryset.values_list('pk', flat=True))
+
+
+def invalidate_display_data(queryset):
+    """Mark display data of products stale and rebuild it after commit."""
+    product_ids = list(queryset.values_list('pk', flat=True).distinct())
+    if not product_ids:
+        return
+    Product.objects.filter(pk__in=product_ids).update(display_data=None)
+    transaction.on_commit(
+        lambda: rebuild_product_display_data.delay(product_ids))
+
+
+def category_changed(sender, instance, **kwargs):
+    invalidate_catalog([instance.pk])
+
+
+def product_changed(sender, instance, **kwargs):
+    invalidate_categories(Category.objects.filter(products=instance.pk))
+    instance.display_data = None
+    invalidate_display_data(Product.objects.filter(pk=instance.pk))
+
+
+def product_will_be_deleted(sender, instance, **kwargs):
+    # categories of a product are gone by the time post_delete is sent
+    instance._catalog_category_ids = list(
+        instance.categories.values_list('pk', flat=True))
+
+
+def product_deleted(sender, instance, **kwargs):
+    invalidate_catalog(getattr(instance, '_catalog_category_ids', []))
+
+
+def product_categories_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_catalog([instance.pk])
+    elif action == 'pre_clear':
+        product_changed(sender, instance)
+    else:
+        invalidate_catalog(pk_set)
+
+
+def variant_changed(sender, instance, **kwargs):
+    invalidate_categories(
+        Category.objects.filter(products=instance.product_id))
+    invalidate_display_data(Product.objects.filter(pk=instance.product_id))
+
+
+def product_image_changed(sender, instance, **kwargs):
+    invalidate_categories(
+        Category.objects.filter(products=instance.product_id))
+    invalidate_display_data(Product.objects.filter(pk=instance.product_id))
+
+
+def variant_image_changed(sender, instance, **kwargs):
+    invalidate_categories(
+        Category.objects.filter(products__variants=instance.variant_id))
+    invalidate_display_data(
+        Product.objects.filter(variants=instance.variant_id))
+
+
+def attribute_changed(sender, instance, **kwargs):
+    invalidate_attribute_catalog()
+    invalidate_categories(Category.objects.filter(
+        Q(products__product_class__product_attributes=instance.pk) |
+        Q(products__product_class__variant_attributes=instance.pk)))
+    invalidate_display_data(Product.objects.filter(
+        Q(product_class__product_attributes=instance.pk) |
+        Q(product_class__variant_attributes=instance.pk)))
+
+
+def attribute_value_changed(sender, instance, **kwargs):
+    invalidate_attribute_catalog()
+    invalidate_categories(Category.objects.filter(
+        Q(products__product_class__product_attributes=instance.attribute_id) |
+        Q(products__product_class__variant_attributes=instance.attribute_id)))
+    invalidate_display_data(Product.objects.filter(
+        Q(product_class__product_attributes=instance.attribute_id) |
+        Q(product_class__variant_attributes=instance.attribute_id)))
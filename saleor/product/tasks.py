@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from .models import Product
+from .utils import build_product_display_data, prefetch_display_data
+
+
+@shared_task
+def rebuild_product_display_data(product_ids):
+    """Store freshly computed display data on the given products."""
+    products = prefetch_display_data(
+        Product.objects.filter(pk__in=product_ids))
+    for product in products:
+        Product.objects.filter(pk=product.pk).update(
+            display_data=build_product_display_data(product))
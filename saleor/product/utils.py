@@ -1,14 +1,21 @@
+import json
 from collections import defaultdict, namedtuple
 from urllib.parse import urlencode
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db.models import Prefetch
 from django.utils.encoding import smart_text
 
 from . import ProductAvailabilityStatus, VariantAvailabilityStatus
+from .attributes import get_attribute_catalog
 from ..cart.utils import get_user_cart, get_or_create_user_cart
+from ..core.utils import serialize_decimal
 from .forms import ProductForm
 
+# bump when the shape of precomputed product display data changes
+PRODUCT_DISPLAY_DATA_VERSION = 1
+
 def fetch_all_products():
     from .models import Product
     products = Product.objects.all()
@@ -19,6 +26,41 @@ def fetch_all_products():
         'product_class__product_attributes__values')
     return products
 
+
+def fetch_category_products(category):
+    """Return published products of a company ready for the catalog page.
+
+    Everything the catalog page renders is loaded up front so the number of
+    queries does not depend on the number of products.
+    """
+    from .models import Product
+    products = (Product.objects.get_available_products()
+                .filter(categories=category)
+                .order_by('name'))
+    return prefetch_display_data(products)
+
+
+def prefetch_display_data(products):
+    """Prefetch everything needed to build product display data."""
+    from .models import ProductVariant
+    variants = ProductVariant.objects.prefetch_related('variant_images')
+    return products.select_related('product_class').prefetch_related(
+        'images', Prefetch('variants', queryset=variants),
+        'product_class__variant_attributes__values',
+        'product_class__product_attributes__values')
+
+
+def can_view_unpublished(user):
+    return user.is_authenticated() and user.is_active and user.is_staff
+
+
+def products_visible_to_user(user):
+    from .models import Product
+    if can_view_unpublished(user):
+        return Product.objects.all()
+    return Product.objects.get_available_products()
+
+
 def handle_cart_form(request, product, create_cart=False):
     if create_cart:
         cart = get_or_create_user_cart(request.user, request)
@@ -99,8 +141,8 @@ def get_variant_picker_data(product):
                 'slug': attribute.slug,
                 'values': [
                     {'pk': value.pk, 'name': value.name, 'slug': value.slug}
-                    for value in attribute.values.filter(
-                        pk__in=available_variants)]})
+                    for value in attribute.values.all()
+                    if value.pk in available_variants]})
 
     return data
 
@@ -114,12 +156,12 @@ def get_product_attributes_data(product):
 
 
 def get_attributes_display_map(obj, attributes):
+    catalog = get_attribute_catalog()
     display_map = {}
     for attribute in attributes:
         value = obj.attributes.get(smart_text(attribute.pk))
         if value:
-            choices = {smart_text(a.pk): a for a in attribute.values.all()}
-            choice_obj = choices.get(value)
+            choice_obj = catalog.get_value(attribute.pk, value)
             if choice_obj:
                 display_map[attribute.pk] = choice_obj
             else:
@@ -127,3 +169,63 @@ def get_attributes_display_map(obj, attributes):
     return display_map
 
 
+def build_product_display_data(product):
+    """Compute the variant picker and JSON-LD payloads of a product."""
+    product_attributes = get_product_attributes_data(product)
+    return {
+        'version': PRODUCT_DISPLAY_DATA_VERSION,
+        'variant_picker': get_variant_picker_data(product),
+        'json_ld': product_json_ld(product, product_attributes)}
+
+
+def get_product_display_data(product):
+    """Return the precomputed display data of a product.
+
+    The payload stored on the product is used unless it was invalidated or
+    built by an older version of the code, in which case it is computed on
+    the fly until the rebuild task catches up.
+    """
+    data = product.display_data
+    if not data or data.get('version') != PRODUCT_DISPLAY_DATA_VERSION:
+        data = build_product_display_data(product)
+    return data
+
+
+def get_product_context(product, form):
+    """Return the template context used to render a single product."""
+    product_images = list(product.images.all())
+    variants = product.variants.all()
+    display_data = get_product_display_data(product)
+    show_variant_picker = all([v.attributes for v in variants])
+
+    if product_images:
+        product_images[0].active = True
+
+    return {
+        'is_visible': True,
+        'form': form,
+        'product': product,
+        'slug': product.get_slug(),
+        'image_count': range(len(product_images)),
+        'product_images': product_images,
+        'show_variant_picker': show_variant_picker,
+        'variant_picker_data': json.dumps(
+            display_data['variant_picker'], default=serialize_decimal),
+        'json_ld_product_data': json.dumps(
+            display_data['json_ld'], default=serialize_decimal)}
+
+
+def get_category_products_context(category, cart):
+    """Return contexts of all products displayed on a company catalog page.
+
+    Products, variants, images, attributes and their values are fetched once
+    for the whole category and every product context is assembled from the
+    prefetched data, so the cost in queries stays flat as the catalog grows.
+    """
+    products_context = []
+    for index, product in enumerate(fetch_category_products(category)):
+        form = ProductForm(cart=cart, product=product)
+        product_context = get_product_context(product, form)
+        product_context['index'] = index
+        products_context.append(product_context)
+    return products_context
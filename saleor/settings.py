@@ -127,6 +127,7 @@ TEMPLATES = [{
 SECRET_KEY = "hOVfDdL2G4tldFJkqHEvm6xLBqZ4gh" #os.environ.get('SECRET_KEY')
 
 MIDDLEWARE = [
+    'saleor.core.middleware.request_metrics',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -134,6 +135,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'saleor.core.middleware.attribute_catalog',
 ]
 
 INSTALLED_APPS = [
@@ -229,10 +231,22 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'DEBUG',
             'propagate': True
+        },
+        'saleor.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False
         }
     }
 }
 
+# fraction of requests whose time, queries and cache lookups are recorded
+REQUEST_METRICS_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_METRICS_SAMPLE_RATE', 0.1))
+# queries repeated this many times in a request are reported as duplicates
+REQUEST_METRICS_MIN_DUPLICATES = int(
+    os.environ.get('REQUEST_METRICS_MIN_DUPLICATES', 3))
+
 AUTH_USER_MODEL = 'userprofile.User'
 
 LOGIN_URL = '/account/login/'
@@ -263,7 +277,21 @@ def get_host():
 #    'default': ('payments.dummy.DummyProvider', {})}
 
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
-SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# 'db' keeps every session in the database behind the cache, 'cache' only in
+# the cache and 'write-behind' in the cache, writing long-lived sessions to
+# the database now and then; the cache must be shared by all processes
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'write-behind': 'saleor.core.sessions'}
+SESSION_MODE = os.environ.get(
+    'SESSION_MODE', 'write-behind' if os.environ.get('REDIS_URL') else 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+# age in seconds after which write-behind sessions reach the database
+SESSION_PERSIST_AFTER = int(os.environ.get('SESSION_PERSIST_AFTER', 60 * 60))
+# least number of seconds between database writes of a write-behind session
+SESSION_PERSIST_INTERVAL = int(
+    os.environ.get('SESSION_PERSIST_INTERVAL', 15 * 60))
 
 CHECKOUT_PAYMENT_CHOICES = [
     ('default', 'Dummy provider')]
@@ -273,6 +301,24 @@ MESSAGE_TAGS = {
 
 LOW_STOCK_THRESHOLD = 10
 MAX_CART_LINE_QUANTITY = os.environ.get('MAX_CART_LINE_QUANTITY', 50)
+# the cart counter is cached only in a cache shared by all processes, a
+# process-local cache would keep showing counters changed by other processes
+CART_STATE_CACHED = CACHES['default']['BACKEND'] not in [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache']
+CART_STATE_TIMEOUT = 60 * 5
+# days after their last activity (line or status change) carts of a status
+# are deleted, carts of statuses left out are kept
+CART_EXPIRATION_DAYS = {
+    'open': 30, 'payment': 30, 'checkout': 30, 'ordered': 7, 'canceled': 7}
+# number of chunks of expired carts deleted by a single cleanup task run
+CART_CLEANUP_MAX_CHUNKS = 100
+
+CATALOG_CACHE_TIMEOUT = int(
+    os.environ.get('CATALOG_CACHE_TIMEOUT', 60 * 60 * 24))
+
+ATTRIBUTES_CACHE_TIMEOUT = int(
+    os.environ.get('ATTRIBUTES_CACHE_TIMEOUT', 60 * 60 * 24))
 
 PAGINATE_BY = 16
 DASHBOARD_PAGINATE_BY = 30
@@ -309,7 +355,8 @@ if AWS_MEDIA_BUCKET_NAME:
     DEFAULT_FILE_STORAGE = 'saleor.core.storages.S3MediaStorage'
     THUMBNAIL_DEFAULT_STORAGE = DEFAULT_FILE_STORAGE
 
-MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
+# messages go into a cookie and only those not fitting it into the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
 VERSATILEIMAGEFIELD_RENDITION_KEY_SETS = {
     'defaults': [
@@ -371,14 +418,26 @@ if ES_URL:
 
 
 GRAPHENE = {
+    # records every SQL query, so it is only enabled for development
     'MIDDLEWARE': [
         'graphene_django.debug.DjangoDebugMiddleware'
-    ],
+    ] if DEBUG else [],
     'SCHEMA': 'saleor.graphql.api.schema',
     'SCHEMA_OUTPUT': os.path.join(
         PROJECT_ROOT, 'saleor', 'static', 'schema.json')
 }
 
+GRAPHQL_MAX_QUERY_COST = int(os.environ.get('GRAPHQL_MAX_QUERY_COST', 50000))
+GRAPHQL_MAX_QUERY_DEPTH = int(os.environ.get('GRAPHQL_MAX_QUERY_DEPTH', 10))
+# assumed size of plain lists when estimating the cost of a query
+GRAPHQL_DEFAULT_LIST_SIZE = 10
+# number of parsed and validated documents kept by every process
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(
+    os.environ.get('GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+# JSON file mapping SHA-256 hashes to queries, loaded on startup
+GRAPHQL_PERSISTED_QUERIES_MANIFEST = os.environ.get(
+    'GRAPHQL_PERSISTED_QUERIES_MANIFEST')
+
 AUTHENTICATION_BACKENDS = [
 #    'saleor.registration.backends.facebook.CustomFacebookOAuth2',
 #    'saleor.registration.backends.google.CustomGoogleOAuth2',
@@ -410,6 +469,10 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = 'django-db'
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-carts': {
+        'task': 'saleor.cart.tasks.cleanup_carts',
+        'schedule': 60 * 60}}
 
 ## Impersonate module settings
 #IMPERSONATE_URI_EXCLUSIONS = [r'^dashboard/']
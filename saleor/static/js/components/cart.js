@@ -68,38 +68,59 @@ export default $(document).ready((e) => {
   $closeMsg.on('click', (e) => {
     $removeProductSuccess.addClass('d-none');
   });
+  let cartLinesUrl = $('.cart__total').data('update-url');
+  let pendingQuantities = {};
+  let pendingLines = {};
+  let flushTimeout = null;
+  const updateCartLines = () => {
+    let quantities = pendingQuantities;
+    let $lines = pendingLines;
+    pendingQuantities = {};
+    pendingLines = {};
+    $.ajax({
+      url: cartLinesUrl,
+      method: 'POST',
+      data: quantities,
+      success: (response) => {
+        if (response.cart.numLines === 0) {
+          $.cookie('alert', 'true', {path: '/cart'});
+          location.reload();
+          return;
+        }
+        $.each($lines, (variantId, $line) => {
+          $line.find('.cart__line__quantity-error').html('');
+          if (response.lines[variantId] === 0) {
+            $removeProductSuccess.removeClass('d-none');
+            $line.fadeOut();
+          } else if (response.lineTotals[variantId]) {
+            $line.find('.cart__line__total').html('$' + response.lineTotals[variantId]);
+          }
+        });
+        $('.cart__total__price').html('$' + response.total);
+        $('.cart__total__quantity').html(response.cart.numItems);
+        $cartBadge.html(response.cart.numItems);
+        $cartDropdown.load(summaryLink);
+      },
+      error: (response) => {
+        let errors = response.responseJSON ? response.responseJSON.error : {};
+        $.each($lines, (variantId, $line) => {
+          let lineErrors = errors['quantity-' + variantId] || [];
+          $line.find('.cart__line__quantity-error').html(lineErrors.join(' '));
+        });
+      }
+    });
+  };
   $cartLine.each(function () {
     let $quantityInput = $(this).find('#id_quantity');
     let cartFormUrl = $(this).find('.form-cart').attr('action');
-    let $qunatityError = $(this).find('.cart__line__quantity-error');
-    let $subtotal = $(this).find('.cart-item-price p');
+    let variantId = $(this).data('variant-id');
     let $deleteIcon = $(this).find('.cart-item-delete');
     $(this).on('change', $quantityInput, (e) => {
-      let newQuantity = $quantityInput.val();
-      $.ajax({
-        url: cartFormUrl,
-        method: 'POST',
-        data: {quantity: newQuantity},
-        success: (response) => {
-          if (newQuantity === 0) {
-            if (response.cart.numLines === 0) {
-              $.cookie('alert', 'true', {path: '/cart'});
-              location.reload();
-            } else {
-              $removeProductSuccess.removeClass('d-none');
-              $(this).fadeOut();
-            }
-          } else {
-            $subtotal.html(response.subtotal);
-          }
-          $cartBadge.html(response.cart.numItems);
-          $qunatityError.html('');
-          $cartDropdown.load(summaryLink);
-        },
-        error: (response) => {
-          $qunatityError.html(getAjaxError(response));
-        }
-      });
+      // edits made in quick succession are sent as one request
+      pendingQuantities['quantity-' + variantId] = parseInt($quantityInput.val(), 10);
+      pendingLines[variantId] = $(this);
+      clearTimeout(flushTimeout);
+      flushTimeout = setTimeout(updateCartLines, 500);
     });
     $deleteIcon.on('click', (e) => {
       $.ajax({
@@ -4,11 +4,11 @@ from django.conf.urls.static import static
 from django.contrib.sitemaps.views import sitemap
 from django.contrib.staticfiles.views import serve
 from django.views.i18n import JavaScriptCatalog
-from graphene_django.views import GraphQLView
 
 from .cart.urls import urlpatterns as cart_urls
 from .core.urls import urlpatterns as core_urls
 from .dashboard.urls import urlpatterns as dashboard_urls
+from .graphql.views import GraphQLView
 from .product.urls import urlpatterns as product_urls
 from .registration.urls import urlpatterns as registration_urls
 
@@ -0,0 +1,42 @@
+import timeit
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class BenchmarkReport:
+    """Collects query counts and wall time of benchmarked callables."""
+
+    def __init__(self, name):
+        self.name = name
+        self.results = []
+
+    def __call__(self, label, func, repeat=5):
+        # warm up so one-off work (sessions, carts) is not measured
+        func()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        timings = timeit.repeat(func, number=1, repeat=repeat)
+        result = {
+            'label': label, 'queries': len(queries),
+            'time': min(timings) * 1000}
+        self.results.append(result)
+        return result
+
+    def format(self):
+        lines = ['', self.name]
+        lines += [
+            '  %-30s %6d queries %10.2f ms' % (
+                result['label'], result['queries'], result['time'])
+            for result in self.results]
+        return '\n'.join(lines)
+
+
+@pytest.fixture
+def benchmark(request, capsys):
+    """Run callables, measure them and print a report after the test."""
+    report = BenchmarkReport(request.node.name)
+    yield report
+    with capsys.disabled():
+        print(report.format())
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import pytest
+
+from saleor.cart.models import Cart, CartLine
+from saleor.product.models import Product, ProductClass, ProductVariant
+
+CART_SIZES = [1, 100, 1000]
+LOOKUPS = 10
+
+
+@pytest.fixture
+def cart_factory(db):
+    product_class = ProductClass.objects.create(name='Default')
+    product = Product.objects.create(
+        name='Product', price=Decimal('10.00'), product_class=product_class)
+
+    def create_cart(size):
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, sku='cart-%d' % (index,))
+            for index in range(size)])
+        variants = list(product.variants.all())
+        cart = Cart.objects.create()
+        CartLine.objects.bulk_create([
+            CartLine(cart=cart, variant=variant, quantity=1, data={})
+            for variant in variants])
+        return cart, variants
+    return create_cart
+
+
+def lookup_lines(cart_pk, variants):
+    cart = Cart.objects.get(pk=cart_pk)
+    for variant in variants:
+        assert cart.get_line(variant) is not None
+
+
+@pytest.mark.parametrize('size', CART_SIZES)
+def test_get_line_benchmark(benchmark, cart_factory, size):
+    cart, variants = cart_factory(size)
+    # the lines looked up last are the worst case of a linear scan
+    looked_up = variants[-LOOKUPS:]
+
+    result = benchmark(
+        '%d lines, %d lookups' % (size, len(looked_up)),
+        lambda: lookup_lines(cart.pk, looked_up))
+
+    # one query for the cart and one to build the line index
+    assert result['queries'] == 2
@@ -0,0 +1,40 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+CATALOG_SIZES = [1, 10, 100]
+
+
+def get_uncached(client, url):
+    cache.clear()
+    return client.get(url)
+
+
+@pytest.mark.parametrize('size', CATALOG_SIZES)
+def test_category_index_benchmark(
+        benchmark, catalog_factory, company_client, size):
+    catalog_factory(size)
+    url = reverse('product:category')
+
+    uncached = benchmark(
+        '%d products, uncached' % (size,),
+        lambda: get_uncached(company_client, url))
+    cached = benchmark(
+        '%d products, cached' % (size,), lambda: company_client.get(url))
+
+    assert cached['queries'] < uncached['queries']
+
+
+def test_category_index_query_count_is_flat(
+        benchmark, catalog_factory, company_client):
+    url = reverse('product:category')
+    added = 0
+    for size in CATALOG_SIZES:
+        catalog_factory(size - added)
+        added = size
+        benchmark(
+            '%d products' % (size,),
+            lambda: get_uncached(company_client, url))
+
+    query_counts = {result['queries'] for result in benchmark.results}
+    assert len(query_counts) == 1
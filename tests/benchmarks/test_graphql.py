@@ -0,0 +1,58 @@
+import timeit
+
+from graphene_django.settings import graphene_settings
+from graphql import Source, parse, validate
+from graphql.validation.rules import specified_rules
+
+from saleor.graphql.documents import DocumentCache
+
+QUERY = """
+    query Category($pk: Int!, $first: Int) {
+        category(pk: $pk) {
+            name
+            products(first: $first) {
+                edges {
+                    node {
+                        name
+                        thumbnailUrl
+                        images { url }
+                        variants { sku name }
+                        ...Availability
+                    }
+                }
+            }
+        }
+        attributes { slug name values { slug name } }
+    }
+
+    fragment Availability on ProductType {
+        availability { available }
+    }
+"""
+
+
+def measure(func, number=100):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def test_document_cache_benchmark(capsys):
+    schema = graphene_settings.SCHEMA
+    cache = DocumentCache(maxsize=10)
+
+    def parse_and_validate():
+        document = parse(Source(QUERY))
+        assert not validate(schema, document, specified_rules)
+
+    def cached():
+        document, errors = cache.compile(schema, QUERY, specified_rules)
+        assert not errors
+
+    cached()
+    uncached_time = measure(parse_and_validate)
+    cached_time = measure(cached)
+    with capsys.disabled():
+        print('\ntest_document_cache_benchmark')
+        print('  %-30s %10.3f ms' % ('parse and validate', uncached_time))
+        print('  %-30s %10.3f ms' % ('document cache hit', cached_time))
+
+    assert cached_time < uncached_time
@@ -0,0 +1,30 @@
+from django.test.client import Client
+from django.urls import reverse
+
+from saleor.order.models import Order
+
+MESSAGE_STORAGES = {
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+    'cookie': 'django.contrib.messages.storage.fallback.FallbackStorage'}
+
+
+def test_session_modes_benchmark(benchmark, admin_user, settings):
+    order = Order.objects.create()
+    url = reverse('dashboard:order-add-note', kwargs={'order_pk': order.pk})
+    results = {}
+    for mode, engine in sorted(settings.SESSION_ENGINES.items()):
+        for storage_name, storage in sorted(MESSAGE_STORAGES.items()):
+            settings.SESSION_ENGINE = engine
+            settings.MESSAGE_STORAGE = storage
+            # middleware reads the session engine when the client loads it
+            client = Client()
+            assert client.login(
+                username=admin_user.username, password='password')
+            label = '%s sessions, %s messages' % (mode, storage_name)
+            results[label] = benchmark(
+                label, lambda: client.post(url, {'content': 'Note'}))
+
+    # messages in the session make every POST write it to the database
+    assert (
+        results['write-behind sessions, cookie messages']['queries'] <
+        results['db sessions, session messages']['queries'])
@@ -23,6 +23,8 @@ from saleor.shipping.models import ShippingMethod
 from saleor.site.models import AuthorizationKey, SiteSettings
 from saleor.userprofile.models import Address, User
 
+pytest_plugins = ['tests.query_budget']
+
 
 @pytest.fixture(autouse=True)
 def site_settings(db, settings):
@@ -82,7 +84,7 @@ def admin_client(admin_user):
     """A Django test client logged in as an admin user."""
     from django.test.client import Client
     client = Client()
-    client.login(username=admin_user.email, password='password')
+    client.login(username=admin_user.username, password='password')
     return client
 
 
@@ -534,3 +536,57 @@ def permission_edit_settings():
 @pytest.fixture
 def permission_impersonate_user():
     return Permission.objects.get(codename='impersonate_user')
+
+
+@pytest.fixture
+def company(db):  # pylint: disable=W0613
+    return Category.objects.create(name='Company', slug='company')
+
+
+@pytest.fixture
+def company_user(company):
+    return User.objects.create_user(
+        'company_user', 'password', company=company)
+
+
+@pytest.fixture
+def company_client(client, company_user):
+    """A Django test client logged in as a user of the company."""
+    client.login(username=company_user.username, password='password')
+    return client
+
+
+@pytest.fixture
+def company_product_class(color_attribute, size_attribute):
+    product_class = ProductClass.objects.create(name='Company Class')
+    product_class.product_attributes.add(color_attribute)
+    product_class.variant_attributes.add(size_attribute)
+    return product_class
+
+
+@pytest.fixture
+def catalog_factory(company, company_product_class):
+    """Return a function filling the company catalog with given number of
+    products, each having a variant per size and an image."""
+    product_attr = company_product_class.product_attributes.get()
+    variant_attr = company_product_class.variant_attributes.get()
+
+    def create_catalog(size):
+        start = Product.objects.count()
+        for index in range(start, start + size):
+            product = Product.objects.create(
+                name='Product %d' % (index,), price=Decimal('10.00'),
+                product_class=company_product_class,
+                attributes={
+                    smart_text(product_attr.pk): smart_text(
+                        product_attr.values.first().pk)})
+            product.categories.add(company)
+            image = product.images.create(image='products/product.jpg')
+            for value in variant_attr.values.all():
+                variant = ProductVariant.objects.create(
+                    product=product, sku='%d-%s' % (index, value.slug),
+                    attributes={
+                        smart_text(variant_attr.pk): smart_text(value.pk)})
+                variant.variant_images.create(image=image)
+        return company
+    return create_catalog
@@ -1,17 +1,24 @@
+import csv
+import io
 from decimal import Decimal
+from functools import partial
 
+from django.db import DatabaseError
 from django.urls import reverse
 import pytest
 from tests.utils import get_redirect_location, get_url_path
 
 from saleor.dashboard.order.forms import ChangeQuantityForm, MoveLinesForm
-from saleor.order import OrderStatus
+from saleor.order import OrderStatus, tasks
+from saleor.order.export import OrderExport
 from saleor.order.models import (
-    DeliveryGroup, Order, OrderHistoryEntry, OrderLine)
+    DeliveryGroup, Order, OrderHistoryEntry, OrderLine, OrderUserFieldEntry)
 from saleor.order.utils import (
     add_variant_to_existing_lines, change_order_line_quantity,
-    fill_group_with_partition, remove_empty_groups)
-from saleor.product.models import ProductVariant, Stock, StockLocation
+    fill_group_with_partition, recalculate_order, remove_empty_groups)
+from saleor.product.models import (
+    Product, ProductClass, ProductVariant, Stock, StockLocation, UserField)
+from saleor.userprofile.models import User
 
 
 @pytest.mark.integration
@@ -524,3 +531,156 @@ def test_view_add_variant_to_delivery_group(
     assert get_redirect_location(response) == reverse(
         'dashboard:order-details', kwargs={'order_pk': order.pk})
     assert line.quantity == 4
+
+
+@pytest.fixture
+def export_staff_client(client, db):
+    User.objects.create_user('export_staff', 'password', is_staff=True)
+    client.login(username='export_staff', password='password')
+    return client
+
+
+@pytest.fixture
+def company_orders(company, company_user, catalog_factory):
+    catalog_factory(2)
+    userfield = UserField.objects.create(name='Department', company=company)
+    deleted_product = Product.objects.create(
+        name='Deleted product', price=Decimal('5.00'),
+        product_class=ProductClass.objects.get())
+    variants = list(ProductVariant.objects.order_by('pk'))
+    orders = []
+    for index in range(3):
+        order = Order.objects.create(user=company_user, company=company)
+        for variant in variants:
+            OrderLine.objects.create(
+                order=order, product=variant.product,
+                product_name=variant.product.name, product_sku=variant.sku,
+                quantity=index + 1, unit_price=variant.product.price)
+        OrderLine.objects.create(
+            order=order, product=deleted_product, product_name='Deleted',
+            product_sku='OLD-SKU', quantity=1,
+            unit_price=deleted_product.price)
+        OrderUserFieldEntry.objects.create(
+            order=order, userfield=userfield, data='Sales %d' % (index,))
+        recalculate_order(order)
+        orders.append(order)
+    deleted_product.delete()
+    return orders
+
+
+def test_order_export(export_staff_client, company, company_orders):
+    url = reverse('dashboard:order-export', kwargs={'company_id': company.pk})
+    response = export_staff_client.get(url)
+    assert response.status_code == 200
+    content = b''.join(response.streaming_content).decode()
+    rows = list(csv.reader(io.StringIO(content)))
+
+    skus = list(ProductVariant.objects.order_by(
+        'product_id', 'pk').values_list('sku', flat=True))
+    assert rows[0] == (
+        ['Order ID', 'Date', 'Status', 'Total Price', 'Department'] + skus +
+        ['DELETED:OLD-SKU'])
+    assert len(rows) == len(company_orders) + 1
+    first_row = rows[1]
+    assert first_row[0] == str(company_orders[0].pk)
+    # deleted products count at the price they were ordered for
+    assert first_row[3] == str(Decimal('10.00') * len(skus) + Decimal('5.00'))
+    assert first_row[4] == 'Sales 0'
+    assert first_row[5:] == ['1'] * (len(skus) + 1)
+
+
+def test_order_export_ignores_price_changes(
+        export_staff_client, company, company_orders):
+    Product.objects.update(price=Decimal('99.00'))
+    url = reverse('dashboard:order-export', kwargs={'company_id': company.pk})
+    response = export_staff_client.get(url)
+    content = b''.join(response.streaming_content).decode()
+    rows = list(csv.reader(io.StringIO(content)))
+    assert rows[1][3] == str(company_orders[0].total)
+
+
+def test_order_export_keeps_orders_of_deleted_users(
+        company, company_user, company_orders):
+    company_user.delete()
+    rows = list(OrderExport(company.pk).get_rows())
+    assert len(rows) == len(company_orders) + 1
+
+
+def test_change_order_line_quantity_updates_totals(company_orders):
+    order = company_orders[0]
+    line = order.get_lines().exclude(product=None).first()
+
+    change_order_line_quantity(line, 3)
+
+    order.refresh_from_db()
+    lines = list(order.get_lines())
+    assert order.total == sum(
+        line.unit_price * line.quantity for line in lines)
+    assert order.total_quantity == sum(line.quantity for line in lines)
+
+
+def test_order_export_query_count_does_not_depend_on_orders(
+        company, company_orders, django_assert_num_queries):
+    with django_assert_num_queries(7):
+        rows = list(OrderExport(company.pk).get_rows())
+    assert len(rows) == len(company_orders) + 1
+
+
+def test_order_export_job(
+        export_staff_client, company, company_orders, settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    url = reverse('dashboard:order-export-list')
+    response = export_staff_client.post(url, {'company': company.pk})
+    assert response.status_code == 302
+
+    job_url = get_redirect_location(response)
+    response = export_staff_client.get(job_url)
+    assert response.context['job']['state'] == 'SUCCESS'
+    assert response.context['job']['processed'] == len(company_orders)
+
+    download_url = reverse(
+        'dashboard:order-export-download',
+        kwargs={'job_id': response.context['job_id']})
+    response = export_staff_client.get(download_url)
+    assert response.status_code == 200
+    content = b''.join(response.streaming_content)
+
+    url = reverse('dashboard:order-export', kwargs={'company_id': company.pk})
+    response = export_staff_client.get(url)
+    assert content == b''.join(response.streaming_content)
+
+
+def test_order_export_job_resumes_after_retry(
+        company, company_orders, monkeypatch, settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    monkeypatch.setattr(
+        tasks, 'OrderExport', partial(OrderExport, chunk_size=1))
+    written = []
+    write_file = tasks.write_file
+
+    def recording_write_file(name, content):
+        written.append(name)
+        return write_file(name, content)
+
+    monkeypatch.setattr(tasks, 'write_file', recording_write_file)
+    get_chunk_rows = OrderExport.get_chunk_rows
+    calls = []
+
+    def failing_get_chunk_rows(export, chunk):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise DatabaseError('connection lost')
+        return get_chunk_rows(export, chunk)
+
+    monkeypatch.setattr(OrderExport, 'get_chunk_rows', failing_get_chunk_rows)
+
+    result = tasks.export_orders.apply(args=[company.pk])
+
+    manifest = tasks.get_export_manifest(result.id)
+    assert manifest['rows'] == len(company_orders)
+    parts = [name for name in written if name.endswith('.csv')]
+    # the header and every order were written once, across both runs
+    assert len(parts) == len(set(parts)) == len(company_orders) + 1
+    assert len([name for name in written if 'columns' in name]) == 1
+    assert tasks.get_export_progress(result.id)['last_pk'] == (
+        company_orders[-1].pk)
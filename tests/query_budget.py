@@ -0,0 +1,148 @@
+"""Per-view budgets of SQL queries, checked against `query_budgets.json`.
+
+The budget file maps view names to the most queries a request may run
+(`max_queries`) and the most times a single query, with its values
+ignored, may repeat within it (`max_duplicates`). Budgets do not depend
+on the size of the data, so views whose queries grow with it fail.
+"""
+import json
+import os
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from django.db.backends.utils import CursorWrapper
+
+from saleor.core.instrumentation import get_fingerprint
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+# frames of these files are left out of query origins
+IGNORED_ORIGINS = [os.path.join('django', ''), os.path.join('tests', '')]
+MAX_ORIGIN_FRAMES = 3
+MAX_REPORTED_QUERIES = 5
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path) as budgets_file:
+        return json.load(budgets_file)
+
+
+def get_origin():
+    """Return the innermost frames of the project code running a query."""
+    frames = [
+        '%s:%d in %s' % (frame[0], frame[1], frame[2])
+        for frame in traceback.extract_stack()[:-3]
+        if os.path.join('site-packages', '') not in frame[0] and
+        not any(ignored in frame[0] for ignored in IGNORED_ORIGINS)]
+    return frames[-MAX_ORIGIN_FRAMES:]
+
+
+class RecordedQueries:
+    """Queries of a request grouped by their fingerprints."""
+
+    def __init__(self):
+        self.queries = OrderedDict()
+        self.count = 0
+
+    def add(self, sql, duration):
+        self.count += 1
+        fingerprint = get_fingerprint(sql)
+        if fingerprint not in self.queries:
+            self.queries[fingerprint] = {
+                'count': 0, 'time': 0.0, 'origins': []}
+        query = self.queries[fingerprint]
+        query['count'] += 1
+        query['time'] += duration
+        origin = get_origin()
+        if origin not in query['origins']:
+            query['origins'].append(origin)
+
+    def get_duplicates(self):
+        """Return `[(fingerprint, query)]` of repeated queries, most
+        frequent first."""
+        duplicates = [
+            (fingerprint, query) for fingerprint, query
+            in self.queries.items() if query['count'] > 1]
+        duplicates.sort(key=lambda item: item[1]['count'], reverse=True)
+        return duplicates
+
+    @property
+    def max_duplicates(self):
+        duplicates = self.get_duplicates()
+        return duplicates[0][1]['count'] if duplicates else 1
+
+
+@contextmanager
+def record_queries():
+    """Record queries of all database connections run within the block."""
+    recorded = RecordedQueries()
+
+    def wrap(method):
+        def wrapped(cursor, sql, params=None):
+            start = time.perf_counter()
+            try:
+                return method(cursor, sql, params)
+            finally:
+                recorded.add(sql, time.perf_counter() - start)
+        return wrapped
+
+    with patch.object(CursorWrapper, 'execute', wrap(CursorWrapper.execute)), \
+            patch.object(
+                CursorWrapper, 'executemany',
+                wrap(CursorWrapper.executemany)):
+        yield recorded
+
+
+def format_report(view_name, budget, recorded):
+    lines = [
+        '%s ran %d queries, a query repeated up to %d times '
+        '(budget: %d queries, %d repeats)' % (
+            view_name, recorded.count, recorded.max_duplicates,
+            budget['max_queries'], budget['max_duplicates'])]
+    for fingerprint, query in recorded.get_duplicates()[
+            :MAX_REPORTED_QUERIES]:
+        lines.append('')
+        lines.append('%dx %s' % (query['count'], fingerprint))
+        for origin in query['origins']:
+            lines.append('  from ' + ' <- '.join(reversed(origin)))
+    return '\n'.join(lines)
+
+
+class QueryBudget:
+    """Runs requests with the test client and checks their queries
+    against the budget of the view that handled them."""
+
+    def __init__(self, budgets):
+        self.budgets = budgets
+
+    def __call__(self, client, method, path, *args, **kwargs):
+        with record_queries() as recorded:
+            response = getattr(client, method)(path, *args, **kwargs)
+            if getattr(response, 'streaming', False):
+                # streamed responses query while their content is read
+                response.streaming_content = [
+                    b''.join(response.streaming_content)]
+        view_name = response.resolver_match.view_name
+        budget = self.budgets.get(view_name)
+        if budget is None:
+            pytest.fail(
+                'View %s has no query budget in %s.' % (
+                    view_name, BUDGETS_PATH), pytrace=False)
+        if (recorded.count > budget['max_queries'] or
+                recorded.max_duplicates > budget['max_duplicates']):
+            pytest.fail(
+                format_report(view_name, budget, recorded), pytrace=False)
+        return response
+
+
+@pytest.fixture
+def query_budget():
+    """Return a function making a request with a test client and failing
+    the test if it exceeds the query budget of its view.
+
+    Used as `query_budget(client, 'get', url)`.
+    """
+    return QueryBudget(load_budgets())
@@ -12,3 +12,8 @@ if 'sqlite' in DATABASES['default']['ENGINE']:
         'SERIALIZE': False,
         'NAME': ':memory:',
         'MIRROR': None}
+
+REQUEST_METRICS_SAMPLE_RATE = 0
+
+# tests run in a single process, so the local memory cache is shared
+CART_STATE_CACHED = True
@@ -1,23 +1,39 @@
 import json
+import threading
+from decimal import Decimal
 from uuid import uuid4
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import MagicMock, Mock
 
 from django.contrib.auth.models import AnonymousUser
 from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, connection
 from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.timezone import now
 from django_babel.templatetags.babel import currencyfmt
 from prices import Price
 import pytest
 from satchless.item import InsufficientStock
 
 from saleor.cart import CartStatus, forms, utils
+from saleor.cart.cleanup import delete_expired_carts
 from saleor.cart.context_processors import cart_counter
-from saleor.cart.models import Cart, ProductGroup, find_open_cart_for_user
+from saleor.cart.models import (
+    CART_STATE_CACHE_KEY, Cart, CartLine, ProductGroup,
+    find_open_cart_for_user)
+from saleor.cart.tasks import cleanup_carts
 from saleor.cart.views import update
 from saleor.discount.models import Sale
-from saleor.product.models import Category
+from saleor.order.models import Order
+from saleor.order.utils import create_order_from_cart
+from saleor.product.models import (
+    Category, Product, ProductClass, ProductVariant)
 from saleor.shipping.utils import get_shipment_options
 
 
@@ -749,3 +765,348 @@ def test_get_cart_data_no_shipping(request_cart_with_item):
     cart_total = cart_data['cart_total']
     assert cart_total == Price(net=10, currency='USD')
     assert cart_data['total_with_shipping'].min_price == cart_total
+
+
+def test_cart_counter_does_not_create_cart(
+        rf, company_user, django_assert_num_queries):
+    request = rf.get('/')
+    request.user = company_user
+    request.session = Mock(session_key='session-key')
+
+    with django_assert_num_queries(1):
+        assert cart_counter(request) == {'cart_counter': 0}
+    with django_assert_num_queries(0):
+        assert cart_counter(request) == {'cart_counter': 0}
+    assert not Cart.objects.exists()
+
+
+def test_cart_counter_follows_cart_quantity(
+        rf, company_user, catalog_factory, django_assert_num_queries):
+    catalog_factory(1)
+    request = rf.get('/')
+    request.user = company_user
+    request.session = Mock(session_key='session-key')
+    cart = Cart.objects.create(user=company_user, token='session-key')
+    variant = ProductVariant.objects.first()
+
+    cart.add(variant, 3)
+
+    with django_assert_num_queries(0):
+        assert cart_counter(request) == {'cart_counter': 3}
+    state = utils.get_cart_state(company_user, request)
+    assert state == {'cart_id': cart.pk, 'quantity': 3}
+
+    cart.change_status(CartStatus.CANCELED)
+    with django_assert_num_queries(1):
+        assert cart_counter(request) == {'cart_counter': 0}
+
+
+def test_cart_counter_without_shared_cache(
+        rf, company_user, catalog_factory, settings,
+        django_assert_num_queries):
+    settings.CART_STATE_CACHED = False
+    cache.clear()
+    catalog_factory(1)
+    request = rf.get('/')
+    request.user = company_user
+    request.session = Mock(session_key='session-key')
+    cart = Cart.objects.create(user=company_user, token='session-key')
+    cart.add(ProductVariant.objects.first(), 3)
+
+    for dummy in range(2):
+        with django_assert_num_queries(1):
+            assert cart_counter(request) == {'cart_counter': 3}
+    assert cache.get(CART_STATE_CACHE_KEY % ('session-key',)) is None
+
+
+def test_checkout_query_count_does_not_depend_on_cart_size(
+        company_user, catalog_factory):
+    catalog_factory(25)
+    variants = list(ProductVariant.objects.all())
+    small_cart = Cart.objects.create(user=company_user, token=str(uuid4()))
+    small_cart.add(variants[0], 1)
+    large_cart = Cart.objects.create(user=company_user, token=str(uuid4()))
+    for variant in variants:
+        large_cart.add(variant, 2)
+    assert len(variants) >= 50
+
+    with CaptureQueriesContext(connection) as small_queries:
+        create_order_from_cart(small_cart, company_user)
+    with CaptureQueriesContext(connection) as large_queries:
+        order = create_order_from_cart(large_cart, company_user)
+    assert len(large_queries) == len(small_queries)
+    assert order.get_lines().count() == len(variants)
+
+
+def test_checkout_same_cart_twice(company_client, company_user,
+                                  catalog_factory, monkeypatch):
+    catalog_factory(1)
+    session_key = company_client.session.session_key
+    cart = Cart.objects.create(user=company_user, token=session_key)
+    cart.add(ProductVariant.objects.first(), 1)
+    order = create_order_from_cart(cart, company_user)
+
+    with pytest.raises(IntegrityError):
+        create_order_from_cart(cart, company_user)
+    assert order.get_lines().count() == 1
+
+    # a concurrent submit loaded the cart before the first one committed
+    Cart.objects.filter(pk=cart.pk).update(status=CartStatus.OPEN)
+    messages = Mock()
+    monkeypatch.setattr('saleor.cart.views.messages', messages)
+    response = company_client.get(reverse('cart:cart-checkout'))
+    assert response.status_code == 302
+    assert Order.objects.filter(token=session_key).count() == 1
+    message = messages.success.call_args[0][1]
+    assert 'already checked out' in message
+    assert str(order.pk) in message
+
+
+def test_checkout_reraises_other_integrity_errors(
+        company_client, company_user, catalog_factory, monkeypatch):
+    catalog_factory(1)
+    session_key = company_client.session.session_key
+    cart = Cart.objects.create(user=company_user, token=session_key)
+    cart.add(ProductVariant.objects.first(), 1)
+    monkeypatch.setattr(
+        'saleor.cart.views.create_order_from_cart',
+        Mock(side_effect=IntegrityError('duplicate userfield entry')))
+
+    with pytest.raises(IntegrityError):
+        company_client.get(reverse('cart:cart-checkout'))
+
+
+def test_adding_variant_with_different_data(cart, product_in_stock):
+    variant = product_in_stock.variants.get()
+    cart.add(variant, 1)
+    cart.add(variant, 2, data={'gift-wrap': True})
+    cart.add(variant, 3, data={'gift-wrap': True})
+
+    assert cart.get_line(variant).quantity == 1
+    assert cart.get_line(variant, data={'gift-wrap': True}).quantity == 5
+    assert cart.quantity == 6
+    cart.refresh_from_db()
+    assert cart.quantity == 6
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='needs concurrent connections')
+def test_concurrent_adds_do_not_lose_updates(transactional_db):
+    product_class = ProductClass.objects.create(name='Default')
+    product = Product.objects.create(
+        name='Product', price=Decimal('10.00'), product_class=product_class)
+    variant = ProductVariant.objects.create(product=product, sku='123')
+    cart = Cart.objects.create()
+    workers, adds = 4, 10
+
+    def add_to_cart():
+        try:
+            for dummy_i in range(adds):
+                Cart.objects.get(pk=cart.pk).add(variant, 1)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=add_to_cart) for dummy_i in range(
+        workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    cart.refresh_from_db()
+    assert cart.quantity == workers * adds
+    assert cart.lines.get().quantity == workers * adds
+
+
+def test_add_insufficient_stock_keeps_quantity(cart, catalog_factory):
+    catalog_factory(1)
+    variant = ProductVariant.objects.first()
+    cart.add(variant, 1)
+    variant.check_quantity = Mock(side_effect=InsufficientStock(variant))
+
+    with pytest.raises(InsufficientStock):
+        cart.add(variant, 2)
+
+    assert cart.quantity == 1
+    cart.refresh_from_db()
+    assert cart.quantity == 1
+
+
+def test_update_lines(cart, catalog_factory):
+    catalog_factory(2)
+    first, second, third, fourth = ProductVariant.objects.order_by('pk')
+    cart.add(first, 1)
+    cart.add(second, 2)
+    cart.add(third, 3)
+
+    quantity = cart.update_lines({first: 5, second: 0, fourth: 4, third: 3})
+
+    assert quantity == cart.quantity == 12
+    assert {line.variant: line.quantity for line in cart.lines.all()} == {
+        first: 5, third: 3, fourth: 4}
+    cart.refresh_from_db()
+    assert cart.quantity == 12
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='needs INSERT ... ON CONFLICT')
+def test_update_lines_query_count_does_not_depend_on_lines(
+        cart, catalog_factory):
+    catalog_factory(10)
+    variants = list(ProductVariant.objects.all())
+    for variant in variants:
+        cart.add(variant, 1)
+
+    with CaptureQueriesContext(connection) as few_queries:
+        cart.update_lines({variants[0]: 2, variants[1]: 0})
+    with CaptureQueriesContext(connection) as many_queries:
+        cart.update_lines(dict(
+            [(variant, 3) for variant in variants[2:12]] +
+            [(variant, 0) for variant in variants[12:]]))
+    assert len(many_queries) == len(few_queries)
+    assert cart.quantity == 2 + 3 * 10
+
+
+def test_view_update_cart_lines(company_client, company_user, catalog_factory):
+    catalog_factory(1)
+    first, second = ProductVariant.objects.order_by('pk')
+    session_key = company_client.session.session_key
+    cart = Cart.objects.create(user=company_user, token=session_key)
+    cart.add(first, 1)
+
+    response = company_client.post(
+        reverse('cart:update-lines'),
+        {'quantity-%d' % first.pk: 0, 'quantity-%d' % second.pk: 4},
+        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    assert response.status_code == 200
+    content = json.loads(response.content.decode('utf8'))
+    line_total = second.product.price * 4
+    assert content == {
+        'lines': {str(first.pk): 0, str(second.pk): 4},
+        'lineTotals': {str(second.pk): '%.2f' % (line_total,)},
+        'total': '%.2f' % (line_total,),
+        'cart': {'numItems': 4, 'numLines': 1}}
+
+
+def test_view_update_cart_lines_invalid(
+        company_client, company_user, catalog_factory):
+    catalog_factory(1)
+    variant = ProductVariant.objects.first()
+    session_key = company_client.session.session_key
+    cart = Cart.objects.create(user=company_user, token=session_key)
+    cart.add(variant, 1)
+
+    response = company_client.post(
+        reverse('cart:update-lines'),
+        {'quantity-%d' % variant.pk: 3, 'quantity-0': 1},
+        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    assert response.status_code == 400
+    content = json.loads(response.content.decode('utf8'))
+    assert list(content['error']) == ['quantity-0']
+    cart.refresh_from_db()
+    assert cart.quantity == 1
+
+
+@pytest.fixture
+def aged_cart(catalog_factory):
+    catalog_factory(1)
+    variant = ProductVariant.objects.first()
+
+    def create_cart(status, days):
+        cart = Cart.objects.create(status=status, token=str(uuid4()))
+        cart.add(variant, 1, check_quantity=False)
+        Cart.objects.filter(pk=cart.pk).update(
+            last_activity=now() - timedelta(days=days))
+        return cart
+    return create_cart
+
+
+def test_delete_expired_carts(aged_cart):
+    expired = aged_cart(CartStatus.OPEN, 31)
+    fresh = aged_cart(CartStatus.OPEN, 1)
+    saved = aged_cart(CartStatus.SAVED, 365)
+    ordered = aged_cart(CartStatus.ORDERED, 8)
+    expiration_days = {CartStatus.OPEN: 30, CartStatus.ORDERED: 7}
+
+    deleted = list(delete_expired_carts(expiration_days))
+
+    assert deleted == [(CartStatus.OPEN, 1), (CartStatus.ORDERED, 1)]
+    assert set(Cart.objects.all()) == {fresh, saved}
+    assert not CartLine.objects.filter(cart__in=[expired, ordered]).exists()
+
+
+def test_delete_expired_carts_in_chunks(aged_cart):
+    for dummy in range(5):
+        aged_cart(CartStatus.CANCELED, 10)
+    expiration_days = {CartStatus.CANCELED: 7}
+
+    deleted = list(delete_expired_carts(
+        expiration_days, chunk_size=2, max_chunks=2))
+    assert deleted == [(CartStatus.CANCELED, 2), (CartStatus.CANCELED, 2)]
+    assert Cart.objects.count() == 1
+
+    deleted = list(delete_expired_carts(expiration_days, chunk_size=2))
+    assert deleted == [(CartStatus.CANCELED, 1)]
+    assert not Cart.objects.exists()
+
+
+def test_cart_activity_postpones_expiration(aged_cart, catalog_factory):
+    cart = aged_cart(CartStatus.OPEN, 31)
+    cart.add(ProductVariant.objects.first(), 1, check_quantity=False)
+
+    assert not list(delete_expired_carts({CartStatus.OPEN: 30}))
+    assert Cart.objects.filter(pk=cart.pk).exists()
+
+
+def test_cleanup_carts(aged_cart, settings):
+    settings.CART_EXPIRATION_DAYS = {CartStatus.OPEN: 30}
+    aged_cart(CartStatus.OPEN, 31)
+    aged_cart(CartStatus.OPEN, 1)
+
+    out = StringIO()
+    call_command('cleanup_carts', dry_run=True, stdout=out)
+    assert 'open: 1 carts' in out.getvalue()
+    assert Cart.objects.count() == 2
+
+    assert cleanup_carts() == {CartStatus.OPEN: 1}
+    assert Cart.objects.count() == 1
+
+
+def test_user_cart_belongs_to_user_company(company_user, rf):
+    request = rf.get('/')
+    request.session = Mock(session_key='session')
+    cart = utils.get_or_create_user_cart(company_user, request)
+    assert cart.company_id == company_user.company_id
+
+
+def test_checkout_marks_cart_as_ordered(company_user, catalog_factory):
+    catalog_factory(1)
+    cart = Cart.objects.create(user=company_user, token=str(uuid4()))
+    cart.add(ProductVariant.objects.first(), 1)
+
+    create_order_from_cart(cart, company_user)
+
+    cart.refresh_from_db()
+    assert cart.status == CartStatus.ORDERED
+
+
+def test_checkout_stores_prices_and_totals(company_user, catalog_factory):
+    catalog_factory(2)
+    first, second = ProductVariant.objects.select_related('product')[:2]
+    cart = Cart.objects.create(user=company_user, token=str(uuid4()))
+    cart.add(first, 2)
+    cart.add(second, 1)
+
+    order = create_order_from_cart(cart, company_user)
+    Product.objects.update(price=Decimal('99.00'))
+
+    order.refresh_from_db()
+    assert order.company_id == company_user.company_id
+    assert order.total_quantity == 3
+    assert order.total == (
+        first.product.price * 2 + second.product.price)
+    assert {
+        line.product_sku: line.unit_price for line in order.get_lines()} == {
+            first.sku: first.product.price, second.sku: second.product.price}
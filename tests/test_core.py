@@ -1,51 +1,30 @@
+from importlib import import_module
+from io import StringIO
 from unittest.mock import Mock
 
 import pytest
 
-from saleor.core.utils import (
-    Country, create_superuser, get_country_by_ip, get_currency_for_country,
-    random_data)
-from saleor.discount.models import Sale, Voucher
-from saleor.order.models import Order
-from saleor.product.models import Product
-from saleor.shipping.models import ShippingMethod
-from saleor.userprofile.models import Address, User
-
-
-class_schema = {'Vegetable': {
-                   'category': 'Food',
-                   'product_attributes': {
-                       'Sweetness': ['Sweet', 'Sour'],
-                       'Healthiness': ['Healthy', 'Not really']
-                   },
-                   'variant_attributes': {
-                       'GMO': ['Yes', 'No']
-                   },
-                   'images_dir': 'candy/',
-                   'is_shipping_required': True}}
-
-
-@pytest.mark.parametrize('ip_data, expected_country', [
-    ({'country': {'iso_code': 'PL'}}, Country('PL')),
-    ({'country': {'iso_code': 'UNKNOWN'}}, None),
-    (None, None),
-    ({}, None),
-    ({'country': {}}, None)])
-def test_get_country_by_ip(ip_data, expected_country, monkeypatch):
-    monkeypatch.setattr(
-        'saleor.core.utils.georeader.get',
-        Mock(return_value=ip_data))
-    country = get_country_by_ip('127.0.0.1')
-    assert country == expected_country
-
-
-@pytest.mark.parametrize('country, expected_currency', [
-    (Country('PL'), 'PLN'),
-    (Country('US'), 'USD'),
-    (Country('GB'), 'GBP')])
-def test_get_currency_for_country(country, expected_currency, monkeypatch):
-    currency = get_currency_for_country(country)
-    assert currency == expected_currency
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from saleor.cart.models import Cart, CartLine
+from saleor.core.instrumentation import (
+    RequestMetrics, get_fingerprint, histogram)
+from saleor.core.management.commands.populatedb import count
+from saleor.core.sessions import SessionStore
+from saleor.core.utils import create_superuser, random_data
+from saleor.core.utils.pagination import (
+    KeysetPaginator, get_keyset_ordering, get_keyset_page)
+from saleor.order.models import Order, OrderLine, OrderUserFieldEntry
+from saleor.product.models import Category, Product, ProductVariant
+from saleor.userprofile.models import User
 
 
 def test_create_superuser(db, client):
@@ -55,7 +34,7 @@ def test_create_superuser(db, client):
     create_superuser(credentials)
     assert User.objects.all().count() == 1
     admin = User.objects.all().first()
-    assert admin.is_superuser
+    assert admin.is_staff
     # Test duplicating
     create_superuser(credentials)
     assert User.objects.all().count() == 1
@@ -67,80 +46,287 @@ def test_create_superuser(db, client):
     assert response.context['request'].user == admin
 
 
-def test_create_shipping_methods(db):
-    assert ShippingMethod.objects.all().count() == 0
-    for _ in random_data.create_shipping_methods():
+def test_create_companies(db):
+    Category.objects.create(name='Existing', slug='existing')
+    companies = random_data.create_companies(3)
+    assert Category.tree.root_nodes().count() == 4
+    for company in companies:
+        assert list(company.get_descendants(include_self=True)) == [company]
+
+
+def populate_shop(companies=2, products_per_company=4, carts=5, orders=5):
+    companies = random_data.create_companies(companies)
+    random_data.create_userfields(companies, 2)
+    product_classes = random_data.create_product_classes()
+    for dummy_msg in random_data.create_products(
+            companies, products_per_company, product_classes,
+            variants_per_product=2):
+        pass
+    for dummy_msg in random_data.create_users(companies, 2):
+        pass
+    for dummy_msg in random_data.create_carts(carts, companies):
+        pass
+    for dummy_msg in random_data.create_orders(orders, companies):
         pass
-    assert ShippingMethod.objects.all().count() == 2
+    return companies
 
 
-def test_create_fake_user(db):
-    assert User.objects.all().count() == 0
-    random_data.create_fake_user()
-    assert User.objects.all().count() == 1
-    user = User.objects.all().first()
-    assert not user.is_superuser
+def test_populate_shop(db):
+    companies = populate_shop()
+    assert Product.objects.count() == 8
+    assert ProductVariant.objects.count() == 16
+    for company in companies:
+        assert company.products.count() == 4
+        assert User.objects.filter(company=company).count() == 2
+    assert Cart.objects.count() == 5
+    assert CartLine.objects.count() == 15
+    for cart in Cart.objects.prefetch_related('lines'):
+        assert cart.quantity == sum(line.quantity for line in cart.lines.all())
+    assert Order.objects.count() == 5
+    assert OrderLine.objects.count() == 15
+    assert OrderUserFieldEntry.objects.count() == 10
+    for order in Order.objects.prefetch_related('orderline_set'):
+        lines = order.orderline_set.all()
+        assert order.total == sum(
+            line.unit_price * line.quantity for line in lines)
+        assert order.total_quantity == sum(line.quantity for line in lines)
+    product = Product.objects.first()
+    attributes = product.product_class.product_attributes.all()
+    assert set(product.attributes) == {
+        str(attribute.pk) for attribute in attributes}
 
 
-def test_create_fake_users(db):
-    how_many = 5
-    for _ in random_data.create_users(how_many):
-        pass
-    assert User.objects.all().count() == 5
+def test_populatedb(db):
+    call_command(
+        'populatedb', companies=2, products_per_company=3, orders=7,
+        withoutimages=True, stdout=StringIO())
+    assert Category.objects.count() == 2
+    assert Product.objects.count() == 6
+    assert Order.objects.count() == 7
 
 
-def test_create_address(db):
-    assert Address.objects.all().count() == 0
-    random_data.create_address()
-    assert Address.objects.all().count() == 1
+def test_populatedb_count_accepts_scientific_notation():
+    assert count('1e6') == 1000000
+    assert count('200') == 200
 
 
-def test_create_attribute(db):
-    data = {'slug': 'best_attribute', 'name': 'Best attribute'}
-    attribute = random_data.create_attribute(**data)
-    assert attribute.name == data['name']
-    assert attribute.slug == data['slug']
+def test_benchmark_requests(db):
+    populate_shop(companies=1, carts=0, orders=2)
+    out = StringIO()
+    call_command('benchmark_requests', requests=2, stdout=out)
+    output = out.getvalue()
+    for name in ['category page', 'cart update', 'checkout', 'export']:
+        assert name in output
+    # replayed requests are rolled back
+    assert Order.objects.count() == 2
 
 
-def test_create_product_classes_by_schema(db):
-    p_class = random_data.create_product_classes_by_schema(class_schema)[0][0]
-    assert p_class.name == 'Vegetable'
-    assert p_class.product_attributes.count() == 2
-    assert p_class.variant_attributes.count() == 1
-    assert p_class.is_shipping_required
+def test_benchmark_requests_without_requests(db):
+    populate_shop(companies=1, carts=0, orders=0)
+    out = StringIO()
+    call_command('benchmark_requests', requests=0, stdout=out)
+    assert 'category page  no requests' in out.getvalue()
 
 
-def test_create_products_by_class(db):
-    assert Product.objects.all().count() == 0
-    how_many = 5
-    p_class = random_data.create_product_classes_by_schema(class_schema)[0][0]
-    random_data.create_products_by_class(p_class, class_schema['Vegetable'],
-                                         '/', how_many=how_many,
-                                         create_images=False)
-    assert Product.objects.all().count() == how_many
+def walk_pages(paginator):
+    pages = [paginator.page()]
+    while pages[-1].has_next():
+        pages.append(paginator.page(after=pages[-1].next_cursor))
+    return pages
 
 
-def test_create_fake_order(db):
-    for _ in random_data.create_shipping_methods():
-        pass
-    for _ in random_data.create_users(3):
-        pass
-        random_data.create_products_by_schema('/', 10, False)
-    how_many = 5
-    for _ in random_data.create_orders(how_many):
-        pass
-    Order.objects.all().count() == 5
+@pytest.mark.parametrize('ordering', [
+    ['-last_status_change'], ['user__username', '-pk'], ['-user__username'],
+    ['status', 'created']])
+def test_keyset_pagination(db, ordering):
+    users = [
+        User.objects.create_user('%s@example.com' % (name,))
+        for name in ['a', 'b', 'c']]
+    for index in range(11):
+        Order.objects.create(
+            user=users[index % 4] if index % 4 < 3 else None,
+            status=['new', 'shipped'][index % 2])
+    queryset = Order.objects.order_by(*ordering)
+    expected = list(queryset.order_by(*[
+        ('-' if descending else '') + path
+        for path, descending, dummy_nullable in get_keyset_ordering(
+            queryset)]))
 
+    paginator = KeysetPaginator(queryset, 3)
+    pages = walk_pages(paginator)
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [order for page in pages for order in page] == expected
+    assert not pages[0].has_previous()
 
-def test_create_product_sales(db):
-    how_many = 5
-    for _ in random_data.create_product_sales(how_many):
-        pass
-    assert Sale.objects.all().count() == 5
+    previous = paginator.page(before=pages[2].previous_cursor)
+    assert list(previous) == list(pages[1])
+    assert previous.has_previous()
+    first = paginator.page(before=pages[1].previous_cursor)
+    assert list(first) == list(pages[0])
+    assert not first.has_previous()
 
 
-def test_create_vouchers(db):
-    assert Voucher.objects.all().count() == 0
-    for _ in random_data.create_vouchers():
-        pass
-    assert Voucher.objects.all().count() == 2
+def test_keyset_ordering_ends_with_pk(db):
+    assert get_keyset_ordering(Order.objects.all()) == [
+        ('last_status_change', True, False), ('pk', True, False)]
+    assert get_keyset_ordering(Product.objects.order_by('product_class')) == [
+        ('product_class__pk', False, False), ('pk', False, False)]
+    assert get_keyset_ordering(Order.objects.order_by('-pk', 'status')) == [
+        ('pk', True, False)]
+
+
+def test_keyset_page_rejects_invalid_cursor(db):
+    with pytest.raises(Http404):
+        get_keyset_page(Order.objects.all(), 10, {'after': 'invalid'})
+
+
+def test_keyset_pagination_count(db):
+    for dummy in range(3):
+        Order.objects.create()
+    paginator = KeysetPaginator(Order.objects.all(), 2, exact_count=True)
+    assert paginator.count == 3
+    # small estimates are replaced with exact counts
+    paginator = KeysetPaginator(Order.objects.filter(status='new'), 2)
+    assert paginator.count == 3
+
+
+def test_order_list_pagination(admin_client, settings):
+    settings.DASHBOARD_PAGINATE_BY = 2
+    orders = [Order.objects.create() for dummy in range(3)]
+    url = reverse('dashboard:orders')
+    response = admin_client.get(url)
+    page = response.context['orders']
+    assert list(page) == orders[:0:-1]
+
+    response = admin_client.get(url, {'after': page.next_cursor})
+    assert list(response.context['orders']) == orders[:1]
+
+
+def test_explain_queries_rolls_back_dataset(db):
+    out = StringIO()
+    call_command('explain_queries', size=50, min_rows=0, stdout=out)
+    output = out.getvalue()
+    assert 'open user cart:' in output
+    assert 'products by attribute:' in output
+    assert not Product.objects.exists()
+
+
+def test_query_fingerprint_ignores_values():
+    first = get_fingerprint(
+        "SELECT * FROM product WHERE id = 1 AND name = 'it''s'")
+    second = get_fingerprint(
+        "SELECT * FROM product WHERE id = 22 AND name = 'other'")
+    assert first == second
+    assert get_fingerprint('WHERE id IN (%s, %s, %s)') == 'WHERE id IN (...)'
+
+
+def test_request_metrics_duplicates():
+    metrics = RequestMetrics()
+    for pk in range(3):
+        metrics.record_query(
+            'SELECT * FROM product WHERE id = %d' % (pk,), 0.001)
+    metrics.record_query('SELECT * FROM category', 0.001)
+    assert metrics.sql_count == 4
+    assert metrics.get_duplicates(3) == [
+        ('SELECT * FROM product WHERE id = ?', 3)]
+
+
+def test_request_metrics_middleware(admin_client, settings):
+    settings.REQUEST_METRICS_SAMPLE_RATE = 1
+    histogram.reset()
+    response = admin_client.get(reverse('dashboard:orders'))
+    assert 'sql;desc=' in response['Server-Timing']
+    stats = histogram.snapshot()['dashboard:orders']
+    assert stats['requests'] == 1
+    assert stats['avg_sql_count'] > 0
+
+    response = admin_client.get(reverse('dashboard:request-metrics'))
+    assert 'dashboard:orders' in response.context['views']
+
+
+def test_request_metrics_sampling(admin_client, settings):
+    settings.REQUEST_METRICS_SAMPLE_RATE = 0
+    response = admin_client.get(reverse('dashboard:orders'))
+    assert not response.has_header('Server-Timing')
+
+
+def test_write_behind_session_stays_in_cache(db, settings):
+    settings.SESSION_PERSIST_AFTER = 60 * 60
+    session = SessionStore()
+    session['key'] = 'value'
+    session.save()
+    assert not Session.objects.exists()
+    assert SessionStore(session.session_key)['key'] == 'value'
+
+
+def test_write_behind_session_persists_long_lived(db, settings):
+    settings.SESSION_PERSIST_AFTER = 0
+    settings.SESSION_PERSIST_INTERVAL = 60 * 60
+    session = SessionStore()
+    session['key'] = 'value'
+    session.save()
+    stored = Session.objects.get(session_key=session.session_key)
+    assert stored.get_decoded() == {'key': 'value'}
+
+    session['key'] = 'changed'
+    session.save()
+    stored = Session.objects.get(session_key=session.session_key)
+    assert stored.get_decoded() == {'key': 'value'}
+    assert SessionStore(session.session_key)['key'] == 'changed'
+
+    cache.clear()
+    assert SessionStore(session.session_key)['key'] == 'value'
+
+
+def test_write_behind_session_flush(db, settings):
+    settings.SESSION_PERSIST_AFTER = 0
+    session = SessionStore()
+    session['key'] = 'value'
+    session.save()
+    session_key = session.session_key
+    session.flush()
+    assert not Session.objects.exists()
+    assert not session.exists(session_key)
+
+
+def test_dashboard_post_does_not_write_session(admin_user, order, settings):
+    settings.SESSION_ENGINE = 'saleor.core.sessions'
+    client = Client()
+    assert client.login(
+        username=admin_user.username, password='password')
+    url = reverse('dashboard:order-add-note', kwargs={'order_pk': order.pk})
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(url, {'content': 'Note'})
+    assert response.status_code == 200
+    assert 'messages' in response.cookies
+    assert not [
+        query for query in queries if 'django_session' in query['sql']]
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='needs UPDATE ... FROM')
+def test_company_backfills_use_user_company(company, company_user):
+    other_company = Category.objects.create(name='Other', slug='other')
+    order = Order.objects.create(user=company_user)
+    kept_order = Order.objects.create(
+        user=company_user, company=other_company)
+    anonymous_order = Order.objects.create()
+    cart = Cart.objects.create(user=company_user, token='user-cart')
+    anonymous_cart = Cart.objects.create(token='anonymous-cart')
+    schema_editor = Mock(connection=connection)
+
+    import_module(
+        'saleor.order.migrations.0006_backfill_order_company'
+    ).backfill_order_company(apps, schema_editor)
+    import_module(
+        'saleor.cart.migrations.0005_backfill_cart_company'
+    ).backfill_cart_company(apps, schema_editor)
+
+    companies = dict(Order.objects.values_list('pk', 'company_id'))
+    assert companies == {
+        order.pk: company_user.company_id,
+        kept_order.pk: other_company.pk,
+        anonymous_order.pk: None}
+    companies = dict(Cart.objects.values_list('pk', 'company_id'))
+    assert companies == {
+        cart.pk: company_user.company_id, anonymous_cart.pk: None}
@@ -1,6 +1,8 @@
 import json
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from saleor.product.models import Category, ProductAttribute
 
@@ -127,6 +129,33 @@ def test_filter_product_by_attributes(client, product_in_stock):
     assert product_data['name'] == product_in_stock.name
 
 
+@pytest.mark.django_db()
+@pytest.mark.parametrize('filter_by, count', [
+    (['color:red'], 1), (['color:blue'], 0), (['color:blue', 'color:red'], 1),
+    (['color:red', 'size:big'], 0), (['color:red', 'size:small'], 1),
+    (['color:green', 'missing:value'], 1)])
+def test_filter_products_by_attribute_slugs(
+        client, product_in_stock, filter_by, count):
+    category = Category.objects.first()
+    query = """
+        query Products($pk: Int!, $attributes: [AttributesFilterScalar]) {
+            category(pk: $pk) {
+                products(attributes: $attributes) {
+                    edges { node { name } }
+                }
+            }
+        }
+    """
+    variables = {'pk': category.pk, 'attributes': filter_by}
+    response = client.post(
+        '/graphql/', json.dumps({'query': query, 'variables': variables}),
+        content_type='application/json')
+    content = get_content(response)
+    assert_success(content)
+    edges = content['data']['category']['products']['edges']
+    assert len(edges) == count
+
+
 @pytest.mark.django_db()
 def test_attributes_query(client, product_in_stock):
     attributes = ProductAttribute.objects.prefetch_related('values')
@@ -171,3 +200,221 @@ def test_attributes_in_category_query(client, product_in_stock):
     response = client.post('/graphql/', {'query': query})
     content = get_content(response)
     assert_success(content)
+
+
+CATEGORY_PRODUCTS_QUERY = """
+    query {
+        category(pk: %(category_pk)s) {
+            products {
+                edges {
+                    node {
+                        name
+                        images { url }
+                        variants { sku }
+                    }
+                }
+            }
+        }
+    }
+"""
+
+
+def test_category_products_query_count_is_flat(
+        client, company, catalog_factory):
+    query = CATEGORY_PRODUCTS_QUERY % {'category_pk': company.pk}
+    query_counts = []
+    added = 0
+    for size in [1, 10]:
+        catalog_factory(size - added)
+        added = size
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/graphql/', {'query': query})
+        content = get_content(response)
+        assert_success(content)
+        edges = content['data']['category']['products']['edges']
+        assert len(edges) == size
+        assert all(len(edge['node']['variants']) == 2 for edge in edges)
+        assert all(len(edge['node']['images']) == 1 for edge in edges)
+        query_counts.append(len(queries))
+    assert query_counts[0] == query_counts[1]
+
+
+def test_attribute_values_are_batched(
+        client, color_attribute, size_attribute, django_assert_num_queries):
+    query = """
+        query {
+            attributes {
+                slug
+                values { slug }
+            }
+        }
+    """
+    # one query for the attributes and one for all their values
+    with django_assert_num_queries(2):
+        response = client.post('/graphql/', {'query': query})
+    content = get_content(response)
+    assert_success(content)
+    values = {
+        attribute['slug']: {value['slug'] for value in attribute['values']}
+        for attribute in content['data']['attributes']}
+    assert values == {'color': {'red', 'blue'}, 'size': {'small', 'big'}}
+
+
+def test_query_cost_is_reported(client, db, settings):
+    settings.GRAPHQL_DEFAULT_LIST_SIZE = 10
+    query = 'query { attributes { slug values { slug } } }'
+    response = client.post('/graphql/', {'query': query})
+    content = get_content(response)
+    assert_success(content)
+    cost = content['extensions']['cost']
+    # attributes, 10 slugs, 10 value lists and 10 * 10 value slugs
+    assert cost['requestedQueryCost'] == 1 + 10 + 10 + 100
+    assert cost['requestedQueryDepth'] == 3
+
+
+def test_too_deep_query_is_rejected(client, db, settings):
+    settings.GRAPHQL_MAX_QUERY_DEPTH = 5
+    query = 'query { %s attributes { slug } %s }' % (
+        'root { ' * 5, '} ' * 5)
+    response = client.post('/graphql/', {'query': query})
+    assert response.status_code == 400
+    content = get_content(response)
+    assert 'data' not in content
+    assert 'Query depth 7 exceeds' in content['errors'][0]['message']
+
+
+def test_too_expensive_query_is_rejected(client, db, settings):
+    settings.GRAPHQL_MAX_QUERY_COST = 1000
+    query = """
+        query Products($first: Int) {
+            category(pk: 1) {
+                products(first: $first) {
+                    edges { node { name variants { sku } } }
+                }
+            }
+        }
+    """
+    response = client.post(
+        '/graphql/', json.dumps({'query': query, 'variables': {'first': 10}}),
+        content_type='application/json')
+    assert response.status_code == 200
+
+    response = client.post(
+        '/graphql/', json.dumps({'query': query, 'variables': {'first': 100}}),
+        content_type='application/json')
+    assert response.status_code == 400
+    content = get_content(response)
+    assert 'Query cost' in content['errors'][0]['message']
+    assert content['extensions']['cost']['requestedQueryCost'] > 1000
+
+
+@pytest.fixture
+def document_cache(settings):
+    from saleor.graphql.documents import get_document_cache
+    cache = get_document_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def persisted_query(query_hash):
+    return {'extensions': {'persistedQuery': {'sha256Hash': query_hash}}}
+
+
+def test_persisted_query_by_hash(client, db, document_cache):
+    from saleor.graphql.documents import get_query_hash
+    query = 'query { attributes { slug } }'
+    query_hash = get_query_hash(query)
+
+    data = persisted_query(query_hash)
+    response = client.post(
+        '/graphql/', json.dumps(data), content_type='application/json')
+    assert response.status_code == 400
+    content = get_content(response)
+    assert content['errors'][0]['message'] == 'PersistedQueryNotFound'
+
+    data['query'] = query
+    response = client.post(
+        '/graphql/', json.dumps(data), content_type='application/json')
+    assert_success(get_content(response))
+    assert document_cache.get(query_hash) is not None
+
+    response = client.post(
+        '/graphql/', json.dumps(persisted_query(query_hash)),
+        content_type='application/json')
+    content = get_content(response)
+    assert_success(content)
+    assert 'cost' in content['extensions']
+
+
+def test_persisted_query_hash_mismatch(client, db, document_cache):
+    data = persisted_query('0' * 64)
+    data['query'] = 'query { attributes { slug } }'
+    response = client.post(
+        '/graphql/', json.dumps(data), content_type='application/json')
+    assert response.status_code == 400
+    assert 'does not match' in get_content(response)['errors'][0]['message']
+
+
+def test_document_cache_evicts_least_recently_used():
+    from graphene_django.settings import graphene_settings
+    from graphql.validation.rules import specified_rules
+    from saleor.graphql.documents import DocumentCache, get_query_hash
+    schema = graphene_settings.SCHEMA
+    cache = DocumentCache(maxsize=2)
+    queries = ['{ attributes { slug } }', '{ attributes { name } }',
+               '{ attributes { pk } }']
+    cache.compile(schema, queries[0], specified_rules)
+    cache.compile(schema, queries[1], specified_rules)
+    cache.get(get_query_hash(queries[0]))
+    cache.compile(schema, queries[2], specified_rules)
+    assert cache.get(get_query_hash(queries[0])) is not None
+    assert cache.get(get_query_hash(queries[1])) is None
+    assert len(cache) == 2
+
+    document, errors = cache.compile(
+        schema, '{ attributes { missing } }', specified_rules)
+    assert errors
+    assert len(cache) == 2
+
+
+def test_document_cache_loads_manifest(tmpdir):
+    from graphene_django.settings import graphene_settings
+    from graphql.validation.rules import specified_rules
+    from saleor.graphql.documents import DocumentCache, get_query_hash
+    schema = graphene_settings.SCHEMA
+    valid = '{ attributes { slug } }'
+    invalid = '{ attributes { missing } }'
+    manifest = tmpdir.join('manifest.json')
+    manifest.write(json.dumps({
+        get_query_hash(valid): valid, get_query_hash(invalid): invalid,
+        '0' * 64: valid}))
+    cache = DocumentCache(maxsize=0)
+    cache.load_manifest(schema, str(manifest), specified_rules)
+    assert len(cache) == 1
+    assert cache.get(get_query_hash(valid)) is not None
+
+
+def test_category_facets(client, product_in_stock, default_category):
+    query = """
+        query Facets($pk: Int!, $attributes: [AttributesFilterScalar]) {
+            category(pk: $pk) {
+                facets(attributes: $attributes) {
+                    attribute { slug }
+                    values { value { slug } count }
+                }
+            }
+        }
+    """
+    variables = {'pk': default_category.pk, 'attributes': ['size:big']}
+    response = client.post(
+        '/graphql/', json.dumps({'query': query, 'variables': variables}),
+        content_type='application/json')
+    content = get_content(response)
+    assert_success(content)
+    facets = {
+        facet['attribute']['slug']: {
+            value['value']['slug']: value['count']
+            for value in facet['values']}
+        for facet in content['data']['category']['facets']}
+    assert facets == {'size': {'small': 1, 'big': 0}}
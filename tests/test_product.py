@@ -1,20 +1,31 @@
 import datetime
 import json
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.encoding import smart_text
 from tests.utils import filter_products_by_attribute
 
 from saleor.cart import CartStatus, utils
-from saleor.cart.models import Cart
+from saleor.cart.models import Cart, CartLine
 from saleor.product import (
     ProductAvailabilityStatus, VariantAvailabilityStatus, models)
+from saleor.product.attributes import get_attribute_catalog
+from saleor.product.cache import (
+    CSRF_TOKEN_PLACEHOLDER, get_catalog_version, render_catalog_fragments)
+from saleor.product.facets import (
+    filter_products_by_attributes, get_attribute_facets,
+    get_attribute_selection, get_facet_counts)
+from saleor.product.filters import ProductFilter
+from saleor.product.tasks import rebuild_product_display_data
 from saleor.product.utils import (
-    get_attributes_display_map, get_availability,
-    get_product_availability_status, get_variant_availability_status,
-    get_variant_picker_data)
+    PRODUCT_DISPLAY_DATA_VERSION, get_attributes_display_map,
+    get_availability, get_product_availability_status, get_product_context,
+    get_variant_availability_status, get_variant_picker_data,
+    prefetch_display_data)
 
 
 @pytest.fixture()
@@ -137,6 +148,100 @@ def test_filtering_by_attribute(db, color_attribute):
     assert product_b not in list(filtered)
 
 
+def test_filtering_by_attribute_selection(
+        db, color_attribute, size_attribute):
+    product_class = models.ProductClass.objects.create(
+        name='New class', has_variants=True)
+    red, blue = color_attribute.values.order_by('pk')
+    small, big = size_attribute.values.order_by('pk')
+    red_product = models.Product.objects.create(
+        name='Red', price=10, product_class=product_class,
+        attributes={smart_text(color_attribute.pk): smart_text(red.pk)})
+    blue_product = models.Product.objects.create(
+        name='Blue', price=10, product_class=product_class)
+    for index, size in enumerate([small, big]):
+        models.ProductVariant.objects.create(
+            product=blue_product, sku='blue-%d' % (index,), attributes={
+                smart_text(color_attribute.pk): smart_text(blue.pk),
+                smart_text(size_attribute.pk): smart_text(size.pk)})
+    products = models.Product.objects.all()
+
+    def get_filtered(*pairs):
+        selection = get_attribute_selection(pairs)
+        return set(filter_products_by_attributes(products, selection))
+
+    assert get_filtered(('color', 'red')) == {red_product}
+    assert get_filtered(('color', 'blue')) == {blue_product}
+    assert get_filtered(('color', 'red'), ('color', 'blue')) == {
+        red_product, blue_product}
+    assert get_filtered(('color', 'red'), ('size', 'big')) == set()
+    assert get_filtered(('color', 'blue'), ('size', 'big')) == {blue_product}
+    # matching two variants does not duplicate the product
+    assert list(filter_products_by_attributes(
+        products, get_attribute_selection([
+            ('size', 'small'), ('size', 'big')]))) == [blue_product]
+
+
+def test_attribute_selection_ignores_unknown_slugs(db, color_attribute):
+    red = color_attribute.values.get(slug='red')
+    selection = get_attribute_selection([
+        ('color', 'red'), ('color', 'green'), ('weight', 'heavy')])
+    assert selection == {smart_text(color_attribute.pk): [smart_text(red.pk)]}
+
+
+def test_facet_counts(
+        db, default_category, color_attribute, size_attribute,
+        django_assert_num_queries):
+    product_class = models.ProductClass.objects.create(
+        name='New class', has_variants=True)
+    red, blue = color_attribute.values.order_by('pk')
+    small, big = size_attribute.values.order_by('pk')
+    for index, (color, sizes) in enumerate([
+            (red, [small]), (red, [small, big]), (blue, [big])]):
+        product = models.Product.objects.create(
+            name='Product %d' % (index,), price=10,
+            product_class=product_class, attributes={
+                smart_text(color_attribute.pk): smart_text(color.pk)})
+        product.categories.add(default_category)
+        for size in sizes:
+            models.ProductVariant.objects.create(
+                product=product, sku='%d-%s' % (index, size.slug),
+                attributes={
+                    smart_text(size_attribute.pk): smart_text(size.pk)})
+    get_attribute_catalog()
+
+    with django_assert_num_queries(1):
+        counts = get_facet_counts(default_category, {})
+    assert counts == {
+        color_attribute.pk: {red.pk: 2, blue.pk: 1},
+        size_attribute.pk: {small.pk: 2, big.pk: 2}}
+
+    selection = get_attribute_selection([('color', 'red')])
+    counts = get_facet_counts(default_category, selection)
+    # counts of the selected attribute ignore its own selection
+    assert counts == {
+        color_attribute.pk: {red.pk: 2, blue.pk: 1},
+        size_attribute.pk: {small.pk: 2, big.pk: 1}}
+
+    with django_assert_num_queries(0):
+        assert get_facet_counts(default_category, selection) == counts
+
+    facets = dict(get_attribute_facets(counts, selection))
+    assert facets[size_attribute] == [(small, 2), (big, 1)]
+
+
+def test_product_filter_facet_counts(db, product_in_stock, default_category):
+    color = product_in_stock.product_class.product_attributes.first()
+    red, blue = color.values.order_by('pk')
+    product_filter = ProductFilter(
+        {'color': [smart_text(blue.pk)]},
+        queryset=models.Product.objects.all(), category=default_category)
+    assert product_filter.get_attribute_selection() == {
+        smart_text(color.pk): [smart_text(blue.pk)]}
+    # the only product is red, so it matches no other attribute value
+    assert product_filter.get_facet_counts() == {color.pk: {red.pk: 1}}
+
+
 def test_view_invalid_add_to_cart(client, product_in_stock, request_cart):
     variant = product_in_stock.variants.get()
     request_cart.add(variant, 2)
@@ -479,3 +584,129 @@ def test_view_ajax_available_products_list(admin_client, product_in_stock):
 
     assert response.status_code == 200
     assert resp_decoded == {'results': products_list}
+
+
+def test_catalog_fragments_are_cached(
+        catalog_factory, company_client):
+    company = catalog_factory(2)
+    version = get_catalog_version(company.pk)
+    url = reverse('product:category')
+    response = company_client.get(url)
+    assert len(response.context['products']) == 2
+    assert CSRF_TOKEN_PLACEHOLDER not in response.content.decode()
+
+    with patch('saleor.product.cache.render_catalog_fragments') as render:
+        response = company_client.get(url)
+    assert not render.called
+    assert len(response.context['products']) == 2
+    assert get_catalog_version(company.pk) == version
+
+
+def test_catalog_fragments_do_not_depend_on_cart(catalog_factory):
+    company = catalog_factory(2)
+    cart = Cart.objects.create()
+    cart.add(models.ProductVariant.objects.first(), 2, check_quantity=False)
+    assert render_catalog_fragments(company, cart) == (
+        render_catalog_fragments(company))
+
+
+def test_catalog_invalidated_only_for_affected_company(
+        catalog_factory, default_category):
+    company = catalog_factory(1)
+    company_version = get_catalog_version(company.pk)
+    other_version = get_catalog_version(default_category.pk)
+
+    product = models.Product.objects.get()
+    product.name = 'Renamed product'
+    product.save()
+    assert get_catalog_version(company.pk) != company_version
+    assert get_catalog_version(default_category.pk) == other_version
+
+    company_version = get_catalog_version(company.pk)
+    models.ProductVariant.objects.first().delete()
+    assert get_catalog_version(company.pk) != company_version
+    assert get_catalog_version(default_category.pk) == other_version
+
+
+def test_catalog_invalidated_by_attribute_value_change(catalog_factory):
+    company = catalog_factory(1)
+    version = get_catalog_version(company.pk)
+    value = models.AttributeChoiceValue.objects.filter(
+        attribute__slug='size').first()
+    value.name = 'Tiny'
+    value.save()
+    assert get_catalog_version(company.pk) != version
+
+
+def test_product_display_data_rebuild(catalog_factory):
+    catalog_factory(1)
+    product = models.Product.objects.get()
+    assert product.display_data is None
+
+    rebuild_product_display_data([product.pk])
+    product.refresh_from_db()
+    assert product.display_data['version'] == PRODUCT_DISPLAY_DATA_VERSION
+    assert len(product.display_data['variant_picker']['variants']) == 2
+    assert product.display_data['json_ld']['name'] == product.name
+
+    models.ProductVariant.objects.first().save()
+    product.refresh_from_db()
+    assert product.display_data is None
+
+
+def test_product_context_reads_stored_display_data(catalog_factory):
+    catalog_factory(1)
+    product = models.Product.objects.get()
+    models.Product.objects.filter(pk=product.pk).update(display_data={
+        'version': PRODUCT_DISPLAY_DATA_VERSION,
+        'variant_picker': {'stored': True}, 'json_ld': {'stored': True}})
+    product = prefetch_display_data(models.Product.objects.all()).get()
+
+    context = get_product_context(product, form=None)
+    assert json.loads(context['variant_picker_data']) == {'stored': True}
+    assert json.loads(context['json_ld_product_data']) == {'stored': True}
+
+
+def test_attribute_catalog_lookups_do_not_query(
+        catalog_factory, django_assert_num_queries):
+    catalog_factory(2)
+    variants = list(models.ProductVariant.objects.all())
+    get_attribute_catalog()
+
+    with django_assert_num_queries(0):
+        names = [variant.display_variant() for variant in variants]
+    assert set(names) == {'Size: Small', 'Size: Big'}
+
+
+def test_attribute_catalog_invalidated_by_value_change(catalog_factory):
+    catalog_factory(1)
+    variant = models.ProductVariant.objects.first()
+    assert variant.display_variant() == 'Size: Small'
+
+    value = models.AttributeChoiceValue.objects.get(slug='small')
+    value.name = 'Tiny'
+    value.save()
+    assert variant.display_variant() == 'Size: Tiny'
+
+
+def test_cart_summary_makes_no_attribute_queries(
+        company_client, company_user, catalog_factory):
+    catalog_factory(100)
+    session_key = company_client.session.session_key
+    cart = Cart.objects.create(
+        user=company_user, token=session_key, quantity=200)
+    CartLine.objects.bulk_create([
+        CartLine(cart=cart, variant=variant, quantity=1, data={})
+        for variant in models.ProductVariant.objects.all()])
+    url = reverse('cart:cart-summary')
+    company_client.get(url)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = company_client.get(url)
+    assert len(response.context['lines']) == 200
+    attribute_tables = [
+        models.ProductAttribute._meta.db_table,
+        models.AttributeChoiceValue._meta.db_table]
+    assert not [
+        query for query in queries.captured_queries
+        if any(table in query['sql'] for table in attribute_tables)]
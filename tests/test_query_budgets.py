@@ -0,0 +1,99 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from saleor.cart.models import Cart
+from saleor.order.models import Order, OrderLine, OrderUserFieldEntry
+from saleor.product.models import ProductVariant, UserField
+
+from .query_budget import record_queries
+
+DATASET_SIZES = [1, 10, 25]
+
+
+@pytest.fixture
+def company_cart(company_client, company_user, catalog_factory):
+    def create_cart(size):
+        catalog_factory(size)
+        cart = Cart.objects.create(
+            user=company_user, token=company_client.session.session_key)
+        for variant in ProductVariant.objects.all()[:size]:
+            cart.add(variant, 1, check_quantity=False)
+        return cart
+    return create_cart
+
+
+@pytest.fixture
+def company_orders(company, company_user, catalog_factory):
+    def create_orders(size):
+        catalog_factory(1)
+        variant = ProductVariant.objects.select_related('product').first()
+        userfield = UserField.objects.create(name='PO', company=company)
+        orders = []
+        for dummy in range(size):
+            order = Order.objects.create(user=company_user, company=company)
+            OrderLine.objects.bulk_create([
+                OrderLine(
+                    order=order, product=variant.product,
+                    product_name=variant.product.name,
+                    product_sku=variant.sku, quantity=1)
+                for dummy_line in range(size)])
+            OrderUserFieldEntry.objects.create(
+                order=order, userfield=userfield, data='123')
+            orders.append(order)
+        return orders
+    return create_orders
+
+
+@pytest.mark.parametrize('size', DATASET_SIZES)
+def test_category_index_query_budget(
+        query_budget, company_client, catalog_factory, size):
+    catalog_factory(size)
+    cache.clear()
+    query_budget(company_client, 'get', reverse('product:category'))
+
+
+@pytest.mark.parametrize('size', DATASET_SIZES)
+def test_cart_index_query_budget(
+        query_budget, company_client, company_cart, size):
+    company_cart(size)
+    query_budget(company_client, 'get', reverse('cart:index'))
+
+
+@pytest.mark.parametrize('size', DATASET_SIZES)
+def test_cart_summary_query_budget(
+        query_budget, company_client, company_cart, size):
+    company_cart(size)
+    query_budget(company_client, 'get', reverse('cart:cart-summary'))
+
+
+@pytest.mark.parametrize('size', DATASET_SIZES)
+def test_order_details_query_budget(
+        query_budget, admin_client, company_orders, size):
+    order = company_orders(size)[0]
+    query_budget(
+        admin_client, 'get',
+        reverse('dashboard:order-details', kwargs={'order_pk': order.pk}))
+
+
+@pytest.mark.parametrize('size', DATASET_SIZES)
+def test_order_export_query_budget(
+        query_budget, admin_client, company, company_orders, size):
+    company_orders(size)
+    response = query_budget(
+        admin_client, 'get',
+        reverse('dashboard:order-export', kwargs={'company_id': company.pk}))
+    content = b''.join(response.streaming_content).decode('utf-8')
+    assert len(content.splitlines()) == size + 1
+
+
+def test_recorded_queries_report_duplicates(db):
+    with record_queries() as recorded:
+        for variant_pk in range(3):
+            list(ProductVariant.objects.filter(pk=variant_pk))
+        list(Order.objects.all())
+    assert recorded.count == 4
+    assert recorded.max_duplicates == 3
+    fingerprint, query = recorded.get_duplicates()[0]
+    assert 'product_productvariant' in fingerprint
+    assert query['count'] == 3